@@ -4,6 +4,7 @@ Sistema de Autenticación con Supabase
 import streamlit as st
 from typing import Optional, Dict
 from utils.supabase_client import get_supabase_client
+from utils.cache_datos import invalidar_tabla
 
 
 def inicializar_sesion():
@@ -112,6 +113,7 @@ def registrar_usuario(email: str, password: str, nombre_completo: str,
             usuario_creado = supabase.crear_usuario(datos_usuario)
             
             if usuario_creado:
+                invalidar_tabla("usuarios")
                 st.success("Usuario registrado exitosamente. Por favor inicia sesión.")
                 return True
             else:
@@ -1,6 +1,7 @@
 """
 Configuración del Sistema SST Perú
 """
+from functools import lru_cache
 import os
 from dotenv import load_dotenv
 import streamlit as st
@@ -8,18 +9,28 @@ import streamlit as st
 # Cargar variables de entorno
 load_dotenv()
 
-# Configuración de Supabase
-SUPABASE_URL = st.secrets["SUPABASE_URL"]
-SUPABASE_KEY = st.secrets["SUPABASE_KEY"]
-SUPABASE_SERVICE_KEY = st.secrets["SUPABASE_SERVICE_KEY"]
+# Secretos: se leen de st.secrets solo cuando se usan por primera vez
+# (ver __getattr__ al final del módulo), no al importar la configuración
+SECRETOS_REQUERIDOS = (
+    "SUPABASE_URL",
+    "SUPABASE_KEY",
+    "SUPABASE_SERVICE_KEY",
+    "N8N_WEBHOOK_URL",
+    "APP_NAME",
+    "APP_VERSION",
+    "ENVIRONMENT"
+)
 
-# Configuración de n8n
-N8N_WEBHOOK_URL = st.secrets["N8N_WEBHOOK_URL"]
-
-# Configuración de la aplicación
-APP_NAME = st.secrets["APP_NAME"]
-APP_VERSION = st.secrets["APP_VERSION"]
-ENVIRONMENT = st.secrets["ENVIRONMENT"]
+# Secretos opcionales y su valor por defecto
+SECRETOS_OPCIONALES = {
+    # Backend de almacenamiento: "supabase" o "local" (pruebas sin Supabase)
+    "STORAGE_BACKEND": "supabase",
+    "STORAGE_LOCAL_PATH": "storage_local",
+    # Archivo SQLite del espejo local que consultan reportes y análisis
+    "ESPEJO_LOCAL_PATH": "espejo_local/sst.sqlite",
+    # Archivo SQLite de las inspecciones capturadas sin conexión
+    "CAPTURA_OFFLINE_PATH": "espejo_local/captura.sqlite"
+}
 
 # Configuración de Streamlit
 PAGE_TITLE = "Sistema Integral SST - Ley 29783"
@@ -31,16 +42,23 @@ STORAGE_BUCKETS = {
     "evidencias": "evidencias-sst",
     "documentos": "documentos-sst",
     "capacitaciones": "capacitaciones-sst",
-    "incidentes": "incidentes-sst"
+    "incidentes": "incidentes-sst",
+    "reportes": "reportes-sst"
 }
 
-# Webhooks de n8n
-N8N_WEBHOOKS = {
-    "incidente_registrado": f"{N8N_WEBHOOK_URL}/incidente-registrado",
-    "alerta_epp": f"{N8N_WEBHOOK_URL}/alerta-epp-vencimiento",
-    "recordatorio_capacitacion": f"{N8N_WEBHOOK_URL}/recordatorio-capacitacion",
-    "documento_revision": f"{N8N_WEBHOOK_URL}/documento-revision",
-    "riesgo_critico": f"{N8N_WEBHOOK_URL}/riesgo-critico"
+# Vigencia de los enlaces de descarga firmados (segundos)
+URL_FIRMADA_EXPIRACION = 3600
+
+# Buckets sin acceso público (evidencias de lesiones): se sirven con URLs firmadas
+BUCKETS_PRIVADOS = {STORAGE_BUCKETS["incidentes"], STORAGE_BUCKETS["evidencias"]}
+
+# Webhooks de n8n (rutas relativas a N8N_WEBHOOK_URL)
+RUTAS_WEBHOOKS = {
+    "incidente_registrado": "incidente-registrado",
+    "alerta_epp": "alerta-epp-vencimiento",
+    "recordatorio_capacitacion": "recordatorio-capacitacion",
+    "documento_revision": "documento-revision",
+    "riesgo_critico": "riesgo-critico"
 }
 
 # Configuración de reportes
@@ -99,16 +117,34 @@ TIPOS_CAPACITACION = [
     'Otro'
 ]
 
+@lru_cache(maxsize=None)
+def obtener_secreto(nombre: str):
+    """Lee un secreto de st.secrets (una sola vez por proceso)"""
+    if nombre in SECRETOS_OPCIONALES:
+        return st.secrets.get(nombre, SECRETOS_OPCIONALES[nombre])
+    return st.secrets[nombre]
+
+
+def __getattr__(nombre: str):
+    """Resuelve SUPABASE_URL, N8N_WEBHOOKS, etc. al primer acceso"""
+    if nombre in SECRETOS_REQUERIDOS or nombre in SECRETOS_OPCIONALES:
+        return obtener_secreto(nombre)
+    if nombre == "N8N_WEBHOOKS":
+        url_base = obtener_secreto("N8N_WEBHOOK_URL")
+        return {clave: f"{url_base}/{ruta}" for clave, ruta in RUTAS_WEBHOOKS.items()}
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
+
+
 # Validación de configuración
 def validar_configuracion():
     """Valida que las variables de entorno estén configuradas"""
     errores = []
     
-    if not SUPABASE_URL:
+    if not obtener_secreto("SUPABASE_URL"):
         errores.append("SUPABASE_URL no está configurada")
-    if not SUPABASE_KEY:
+    if not obtener_secreto("SUPABASE_KEY"):
         errores.append("SUPABASE_KEY no está configurada")
-    if not N8N_WEBHOOK_URL:
+    if not obtener_secreto("N8N_WEBHOOK_URL"):
         errores.append("N8N_WEBHOOK_URL no está configurada")
     
     return errores
@@ -116,9 +152,9 @@ def validar_configuracion():
 def obtener_info_sistema():
     """Retorna información del sistema"""
     return {
-        "nombre": APP_NAME,
-        "version": APP_VERSION,
-        "ambiente": ENVIRONMENT,
-        "supabase_configurado": bool(SUPABASE_URL and SUPABASE_KEY),
-        "n8n_configurado": bool(N8N_WEBHOOK_URL)
+        "nombre": obtener_secreto("APP_NAME"),
+        "version": obtener_secreto("APP_VERSION"),
+        "ambiente": obtener_secreto("ENVIRONMENT"),
+        "supabase_configurado": bool(obtener_secreto("SUPABASE_URL") and obtener_secreto("SUPABASE_KEY")),
+        "n8n_configurado": bool(obtener_secreto("N8N_WEBHOOK_URL"))
     }
@@ -5,13 +5,15 @@ Ley 29783 - Perú
 
 
 import streamlit as st
+import importlib
 import sys
 import os
 
 # Configurar path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from config.settings import PAGE_TITLE, PAGE_ICON, LAYOUT, APP_NAME, APP_VERSION
+from config import settings
+from config.settings import PAGE_TITLE, PAGE_ICON, LAYOUT
 from auth import (
     requerir_autenticacion,
     mostrar_info_usuario,
@@ -20,16 +22,17 @@ from auth import (
     es_supervisor
 )
 
-# Importar módulos
-from modules import (
-    riesgos,
-    inspecciones,
-    capacitaciones,
-    incidentes,
-    epp,
-    documental,
-    reportes
-)
+# Páginas: (módulo, función principal). El módulo se importa al abrir la
+# página, así el login y el inicio no cargan pandas, plotly ni reportlab
+PAGINAS_MODULOS = {
+    "riesgos": ("riesgos", "modulo_riesgos"),
+    "inspecciones": ("inspecciones", "modulo_inspecciones"),
+    "capacitaciones": ("capacitaciones", "modulo_capacitaciones"),
+    "incidentes": ("incidentes", "modulo_incidentes"),
+    "epp": ("epp", "modulo_epp"),
+    "documental": ("documental", "modulo_documental"),
+    "reportes": ("reportes", "modulo_reportes")
+}
 
 
 # Configuración de la página
@@ -90,8 +93,8 @@ def mostrar_dashboard_principal():
     
     with col1:
         st.info(f"""
-        **📋 Sistema:** {APP_NAME}  
-        **🔢 Versión:** {APP_VERSION}  
+        **📋 Sistema:** {settings.APP_NAME}  
+        **🔢 Versión:** {settings.APP_VERSION}  
         **👤 Rol:** {usuario.get('rol', 'usuario').title()}
         """)
     
@@ -229,7 +232,7 @@ def menu_navegacion():
         
         # Información del sistema
         st.markdown("### ℹ️ Información")
-        st.caption(f"Versión: {APP_VERSION}")
+        st.caption(f"Versión: {settings.APP_VERSION}")
         st.caption("Ley 29783 - Perú")
 
 
@@ -250,20 +253,10 @@ def main():
     # Renderizar página correspondiente
     if pagina == "inicio":
         mostrar_dashboard_principal()
-    elif pagina == "riesgos":
-        riesgos.modulo_riesgos()
-    elif pagina == "inspecciones":
-        inspecciones.modulo_inspecciones()
-    elif pagina == "capacitaciones":
-        capacitaciones.modulo_capacitaciones()
-    elif pagina == "incidentes":
-        incidentes.modulo_incidentes()
-    elif pagina == "epp":
-        epp.modulo_epp()
-    elif pagina == "documental":
-        documental.modulo_documental()
-    elif pagina == "reportes":
-        reportes.modulo_reportes()
+    elif pagina in PAGINAS_MODULOS:
+        nombre_modulo, funcion = PAGINAS_MODULOS[pagina]
+        modulo = importlib.import_module(f"modules.{nombre_modulo}")
+        getattr(modulo, funcion)()
 
 
 if __name__ == "__main__":
@@ -1,13 +1,10 @@
 """
 Módulos del Sistema SST
+
+Los módulos se importan bajo demanda (PEP 562): cada uno arrastra pandas,
+plotly y otras dependencias pesadas que no hacen falta para el login.
 """
-from . import riesgos
-from . import inspecciones
-from . import capacitaciones
-from . import incidentes
-from . import epp
-from . import documental
-from . import reportes
+import importlib
 
 __all__ = [
     'riesgos',
@@ -18,3 +15,9 @@ __all__ = [
     'documental',
     'reportes'
 ]
+
+
+def __getattr__(nombre: str):
+    if nombre in __all__:
+        return importlib.import_module(f"{__name__}.{nombre}")
+    raise AttributeError(f"module {__name__!r} has no attribute {nombre!r}")
@@ -5,12 +5,18 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime, date
+from typing import Optional
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.supabase_client import get_supabase_client
+from utils.navegacion import subvistas
+from utils.cache_datos import usuarios_activos, invalidar_tabla
+from utils.figuras import datos_dashboard
+from utils.listados import listado_paginado
 from utils.n8n_client import get_n8n_client
+from utils.contenido import subir_contenido
 from config.settings import TIPOS_CAPACITACION, STORAGE_BUCKETS
 from auth import obtener_usuario_actual
 
@@ -47,7 +53,7 @@ def formulario_registro_capacitacion():
         descripcion = st.text_area("Descripción")
         
         # Selección de participantes
-        usuarios = supabase.listar_usuarios()
+        usuarios = usuarios_activos()
         participantes_seleccionados = st.multiselect(
             "Participantes",
             options=[u["nombre_completo"] for u in usuarios]
@@ -67,11 +73,8 @@ def formulario_registro_capacitacion():
                 # Subir material si existe
                 material_url = None
                 if material:
-                    ruta = f"capacitaciones/{datetime.now().strftime('%Y%m')}/{material.name}"
-                    material_url = supabase.subir_archivo(
-                        STORAGE_BUCKETS["capacitaciones"],
-                        ruta,
-                        material.getvalue()
+                    material_url = subir_contenido(
+                        STORAGE_BUCKETS["capacitaciones"], material, material.name, material.type
                     )
                 
                 datos_capacitacion = {
@@ -92,6 +95,7 @@ def formulario_registro_capacitacion():
                 capacitacion_creada = supabase.crear_capacitacion(datos_capacitacion)
                 
                 if capacitacion_creada:
+                    invalidar_tabla("capacitaciones")
                     # Registrar participantes
                     usuarios_dict = {u["nombre_completo"]: u["id"] for u in usuarios}
                     asistentes_data = []
@@ -118,6 +122,29 @@ def formulario_registro_capacitacion():
                     st.rerun()
 
 
+def detalle_capacitacion(cap: dict):
+    """Panel de detalle de la capacitación seleccionada"""
+    st.markdown(f"#### 📚 {cap['codigo']} - {cap['titulo']}")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown(f"**Tipo:** {cap['tipo']}")
+        st.markdown(f"**Instructor:** {cap['instructor']}")
+        st.markdown(f"**Fecha:** {cap['fecha_programada']}")
+        st.markdown(f"**Duración:** {cap.get('duracion_horas', 0)} horas")
+    
+    with col2:
+        st.markdown(f"**Modalidad:** {cap.get('modalidad', 'N/A')}")
+        st.markdown(f"**Lugar:** {cap.get('lugar', 'N/A')}")
+        st.markdown(f"**Estado:** {cap['estado']}")
+    
+    if cap.get('descripcion'):
+        st.markdown(f"**Descripción:** {cap['descripcion']}")
+    
+    if cap.get('material_url'):
+        st.markdown(f"[📎 Descargar Material]({cap['material_url']})")
+
+
 def listar_capacitaciones():
     """Lista capacitaciones registradas"""
     st.subheader("📋 Listado de Capacitaciones")
@@ -140,85 +167,139 @@ def listar_capacitaciones():
     if filtro_tipo != "Todos":
         filtros["tipo"] = filtro_tipo
     
-    capacitaciones = supabase.listar_capacitaciones(filtros)
-    
     if filtro_modalidad != "Todos":
-        capacitaciones = [c for c in capacitaciones if c.get("modalidad") == filtro_modalidad]
+        filtros["modalidad"] = filtro_modalidad
     
-    if capacitaciones:
-        st.info(f"Total de capacitaciones: {len(capacitaciones)}")
-        
-        for cap in capacitaciones:
-            with st.expander(f"📚 {cap['codigo']} - {cap['titulo']}"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown(f"**Tipo:** {cap['tipo']}")
-                    st.markdown(f"**Instructor:** {cap['instructor']}")
-                    st.markdown(f"**Fecha:** {cap['fecha_programada']}")
-                    st.markdown(f"**Duración:** {cap.get('duracion_horas', 0)} horas")
-                
-                with col2:
-                    st.markdown(f"**Modalidad:** {cap.get('modalidad', 'N/A')}")
-                    st.markdown(f"**Lugar:** {cap.get('lugar', 'N/A')}")
-                    st.markdown(f"**Estado:** {cap['estado']}")
-                
-                if cap.get('descripcion'):
-                    st.markdown(f"**Descripción:** {cap['descripcion']}")
-                
-                if cap.get('material_url'):
-                    st.markdown(f"[📎 Descargar Material]({cap['material_url']})")
-    else:
-        st.warning("No se encontraron capacitaciones")
+    listado_paginado(
+        "capacitaciones",
+        lambda pagina, tamano: supabase.listar_capacitaciones_paginado(filtros, pagina, tamano),
+        {
+            "codigo": "Código",
+            "titulo": "Título",
+            "tipo": "Tipo",
+            "fecha_programada": "Fecha",
+            "modalidad": "Modalidad",
+            "estado": "Estado"
+        },
+        detalle_capacitacion,
+        filtros,
+        mensaje_vacio="No se encontraron capacitaciones"
+    )
+
+
+def construir_dashboard_capacitaciones() -> Optional[dict]:
+    """Métricas y figuras del dashboard de capacitaciones"""
+    capacitaciones = get_supabase_client().listar_capacitaciones()
+    
+    if not capacitaciones:
+        return None
+    
+    df = pd.DataFrame(capacitaciones)
+    
+    fig_tipo = px.pie(df, names="tipo", title="Capacitaciones por Tipo")
+    fig_estado = px.bar(
+        df["estado"].value_counts().reset_index(),
+        x="estado", y="count",
+        title="Capacitaciones por Estado",
+        labels={"estado": "Estado", "count": "Cantidad"}
+    )
+    
+    return {
+        "metricas": {
+            "total": len(df),
+            "realizadas": len(df[df["estado"] == "realizada"]),
+            "programadas": len(df[df["estado"] == "programada"]),
+            "horas_totales": float(df["duracion_horas"].sum())
+        },
+        "figuras": {
+            "tipo": fig_tipo,
+            "estado": fig_estado
+        }
+    }
 
 
 def dashboard_capacitaciones():
     """Dashboard de capacitaciones"""
     st.subheader("📊 Dashboard de Capacitaciones")
     
-    supabase = get_supabase_client()
-    capacitaciones = supabase.listar_capacitaciones()
+    datos = datos_dashboard("capacitaciones", ["capacitaciones"], construir_dashboard_capacitaciones)
     
-    if not capacitaciones:
+    if not datos:
         st.warning("No hay capacitaciones registradas")
         return
     
-    df = pd.DataFrame(capacitaciones)
+    metricas, figuras = datos["metricas"], datos["figuras"]
     
     # Métricas
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total = len(df)
-        st.metric("Total Capacitaciones", total)
+        st.metric("Total Capacitaciones", metricas["total"])
     
     with col2:
-        realizadas = len(df[df["estado"] == "realizada"])
-        st.metric("Realizadas", realizadas)
+        st.metric("Realizadas", metricas["realizadas"])
     
     with col3:
-        programadas = len(df[df["estado"] == "programada"])
-        st.metric("Programadas", programadas)
+        st.metric("Programadas", metricas["programadas"])
     
     with col4:
-        horas_totales = df["duracion_horas"].sum()
-        st.metric("Horas Totales", f"{horas_totales:.1f}")
+        st.metric("Horas Totales", f"{metricas['horas_totales']:.1f}")
     
     # Gráficos
     col1, col2 = st.columns(2)
     
     with col1:
-        fig_tipo = px.pie(df, names="tipo", title="Capacitaciones por Tipo")
-        st.plotly_chart(fig_tipo, width='stretch')
+        st.plotly_chart(figuras["tipo"], width='stretch')
     
     with col2:
-        fig_estado = px.bar(
-            df["estado"].value_counts().reset_index(),
-            x="estado", y="count",
-            title="Capacitaciones por Estado",
-            labels={"estado": "Estado", "count": "Cantidad"}
+        st.plotly_chart(figuras["estado"], width='stretch')
+
+
+def certificados_capacitacion():
+    """Generación masiva de certificados de asistencia"""
+    # reportlab se carga solo al abrir esta sub-vista
+    from utils.pdf_lotes import descargar_lote, nombre_archivo_seguro
+    
+    st.subheader("🎓 Certificados de Capacitación")
+    
+    supabase = get_supabase_client()
+    
+    capacitaciones = supabase.listar_capacitaciones()
+    opciones = {"Todas las capacitaciones": None}
+    opciones.update({f"{c['codigo']} - {c['titulo']}": c["id"] for c in capacitaciones})
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        seleccion = st.selectbox("Capacitación", list(opciones.keys()), key="cert_capacitacion")
+    with col2:
+        solo_asistentes = st.checkbox("Solo asistentes confirmados", value=True, key="cert_solo_asistio")
+    
+    filtros = {}
+    if opciones[seleccion]:
+        filtros["capacitacion_id"] = opciones[seleccion]
+    if solo_asistentes:
+        filtros["asistio"] = True
+    
+    asistentes = supabase.listar_asistentes_capacitacion(filtros)
+    
+    if not asistentes:
+        st.warning("No hay asistentes para certificar")
+        return
+    
+    st.info(f"Certificados a generar: {len(asistentes)}")
+    
+    documentos = [
+        (
+            # El id va fuera del texto normalizado: el recorte a 80 caracteres no lo alcanza
+            nombre_archivo_seguro(
+                f"certificado_{(a.get('capacitacion') or {}).get('codigo', '')}_"
+                f"{(a.get('usuario') or {}).get('nombre_completo', '')}"
+            ) + f"_{a['id'][:8]}.pdf",
+            {"asistente": a}
         )
-        st.plotly_chart(fig_estado, width='stretch')
+        for a in asistentes
+    ]
+    descargar_lote("cert", "certificado_capacitacion", documentos, "certificados_capacitacion")
 
 
 def modulo_capacitaciones():
@@ -226,16 +307,12 @@ def modulo_capacitaciones():
     st.title("📚 Gestión de Capacitaciones")
     st.markdown("**Capacitación y Entrenamiento - Art. 27, 35 Ley 29783**")
     
-    tabs = st.tabs(["📊 Dashboard", "📋 Listado", "➕ Registrar"])
-    
-    with tabs[0]:
-        dashboard_capacitaciones()
-    
-    with tabs[1]:
-        listar_capacitaciones()
-    
-    with tabs[2]:
-        formulario_registro_capacitacion()
+    subvistas("capacitaciones", {
+        "📊 Dashboard": dashboard_capacitaciones,
+        "📋 Listado": listar_capacitaciones,
+        "➕ Registrar": formulario_registro_capacitacion,
+        "🎓 Certificados": certificados_capacitacion
+    })
 
 
 if __name__ == "__main__":
@@ -9,7 +9,13 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.supabase_client import get_supabase_client
+from utils.navegacion import subvistas
+from utils.cache_datos import usuarios_activos
+from utils.listados import listado_paginado
 from utils.n8n_client import get_n8n_client
+from utils.contenido import subir_contenido
+from utils.versiones_documentos import archivar_version, guardar_version, reconstruir_version
+from utils.indexacion_documentos import indexar_documento, indexar_pendientes
 from config.settings import STORAGE_BUCKETS
 from auth import obtener_usuario_actual
 
@@ -25,7 +31,7 @@ def formulario_registro_documento():
     
     supabase = get_supabase_client()
     usuario = obtener_usuario_actual()
-    usuarios = supabase.listar_usuarios()
+    usuarios = usuarios_activos()
     usuarios_dict = {u["nombre_completo"]: u["id"] for u in usuarios}
     
     with st.form("form_documento"):
@@ -66,12 +72,9 @@ def formulario_registro_documento():
             if not all([titulo, tipo, fecha_emision, archivo]):
                 st.error("Completa todos los campos obligatorios")
             else:
-                # Subir archivo
-                ruta = f"documentos/{datetime.now().strftime('%Y%m')}/{archivo.name}"
-                archivo_url = supabase.subir_archivo(
-                    STORAGE_BUCKETS["documentos"],
-                    ruta,
-                    archivo.getvalue()
+                # Subir archivo (si el mismo contenido ya existe, se reutiliza)
+                archivo_url = subir_contenido(
+                    STORAGE_BUCKETS["documentos"], archivo, archivo.name, archivo.type
                 )
                 
                 if archivo_url:
@@ -94,9 +97,132 @@ def formulario_registro_documento():
                         "dias_antes_alerta": dias_antes_alerta if requiere_revision else 30
                     }
                     
-                    if supabase.crear_documento(datos):
-                        st.success("✅ Documento registrado")
-                        st.rerun()
+                    documento = supabase.crear_documento(datos)
+                    if documento:
+                        indexar_documento(documento["id"], archivo.getvalue(), archivo.name)
+                        if guardar_version(
+                            documento["id"], archivo, archivo.name, version, archivo_url, archivo.type,
+                            "Versión inicial", usuario.get("id")
+                        ):
+                            st.success("✅ Documento registrado")
+                            st.rerun()
+                        else:
+                            # Sin rerun para que el aviso quede visible
+                            st.warning(
+                                f"⚠️ Documento {documento['codigo']} registrado, pero su versión inicial "
+                                "no quedó en el historial; se registrará al cargar la próxima versión"
+                            )
+
+
+def detalle_documento(doc: dict):
+    """Panel de detalle del documento seleccionado"""
+    st.markdown(f"#### 📄 {doc['codigo']} - {doc['titulo']} (v{doc['version']})")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown(f"**Tipo:** {doc['tipo']}")
+        st.markdown(f"**Estado:** {doc['estado']}")
+        st.markdown(f"**Fecha Emisión:** {doc['fecha_emision']}")
+    
+    with col2:
+        if doc.get('categoria'):
+            st.markdown(f"**Categoría:** {doc['categoria']}")
+        if doc.get('fecha_revision'):
+            st.markdown(f"**Fecha Revisión:** {doc['fecha_revision']}")
+    
+    if doc.get('descripcion'):
+        st.markdown(f"**Descripción:** {doc['descripcion']}")
+    
+    st.markdown(f"[📥 Descargar Documento]({doc['archivo_url']})")
+    
+    with st.expander("🕘 Historial de Versiones"):
+        historial_versiones(doc)
+    
+    with st.expander("⬆️ Nueva Versión"):
+        formulario_nueva_version(doc)
+
+
+def historial_versiones(doc: dict):
+    """Versiones registradas del documento, con descarga de cualquiera de ellas"""
+    supabase = get_supabase_client()
+    versiones = supabase.listar_versiones_documento(doc["id"])
+    if not versiones:
+        st.info("El documento no tiene versiones registradas")
+        return
+    
+    df = pd.DataFrame([{
+        "Versión": v["version"],
+        "Fecha": v["fecha_modificacion"],
+        "Cambios": v.get("cambios_realizados") or "-",
+        "Tamaño (KB)": round((v.get("tamano_bytes") or 0) / 1024, 1),
+        "Modificado por": (v.get("modificador") or {}).get("nombre_completo", "-")
+    } for v in versiones])
+    st.dataframe(df, width='stretch', hide_index=True)
+    
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        version_sel = st.selectbox("Versión", [v["version"] for v in versiones], key=f"ver_sel_{doc['id']}")
+    with col2:
+        recuperar = st.button("📥 Recuperar", key=f"ver_btn_{doc['id']}")
+    
+    if recuperar:
+        with st.spinner("Reconstruyendo versión..."):
+            resultado = reconstruir_version(doc["id"], version_sel)
+        if resultado:
+            registro, contenido = resultado
+            st.download_button(
+                f"⬇️ Descargar v{registro['version']}",
+                contenido,
+                file_name=registro.get("nombre_archivo") or f"{doc['codigo']}_v{registro['version']}",
+                mime=registro.get("tipo_contenido") or "application/octet-stream",
+                key=f"ver_descarga_{doc['id']}"
+            )
+        else:
+            st.error("No se pudo recuperar la versión")
+
+
+def formulario_nueva_version(doc: dict):
+    """Registra una nueva versión; la vigente pasa al historial como fragmentos"""
+    supabase = get_supabase_client()
+    usuario = obtener_usuario_actual()
+    
+    with st.form(f"form_version_{doc['id']}"):
+        version = st.text_input("Versión *")
+        cambios = st.text_area("Cambios realizados *")
+        archivo = st.file_uploader("Archivo *", type=["pdf", "docx", "xlsx"], key=f"ver_archivo_{doc['id']}")
+        
+        submitted = st.form_submit_button("💾 Registrar Versión")
+        
+        if submitted:
+            if not all([version, cambios, archivo]):
+                st.error("Completa todos los campos obligatorios")
+            elif version == doc["version"]:
+                st.error("La versión debe ser distinta de la vigente")
+            else:
+                # La versión vigente se archiva primero: si algo falla después, sigue intacta
+                archivado = archivar_version(doc)
+                archivo_url = subir_contenido(
+                    STORAGE_BUCKETS["documentos"], archivo, archivo.name, archivo.type
+                ) if archivado else None
+                registro = guardar_version(
+                    doc["id"], archivo, archivo.name, version, archivo_url, archivo.type,
+                    cambios, usuario.get("id")
+                ) if archivo_url else None
+                
+                if registro and supabase.actualizar_documento(doc["id"], {
+                    "version": version,
+                    "archivo_url": archivo_url,
+                    "fecha_emision": date.today().isoformat()
+                }):
+                    # La versión anterior ya está en el historial por fragmentos; su archivo
+                    # completo pierde la referencia (trigger) y se purga cuando nadie lo usa
+                    indexar_documento(doc["id"], archivo.getvalue(), archivo.name)
+                    st.success(
+                        f"✅ Versión {version} registrada; la v{doc['version']} se archivó con "
+                        f"{archivado['fragmentos_nuevos']} fragmentos nuevos "
+                        f"({archivado['bytes_nuevos'] / 1024:.1f} KB)"
+                    )
+                    st.rerun()
 
 
 def listar_documentos():
@@ -118,32 +244,58 @@ def listar_documentos():
     if filtro_estado != "Todos":
         filtros["estado"] = filtro_estado
     
-    documentos = supabase.listar_documentos(filtros)
+    listado_paginado(
+        "documentos",
+        lambda pagina, tamano: supabase.listar_documentos_paginado(filtros, pagina, tamano),
+        {
+            "codigo": "Código",
+            "titulo": "Título",
+            "tipo": "Tipo",
+            "version": "Versión",
+            "fecha_emision": "Emisión",
+            "estado": "Estado"
+        },
+        detalle_documento,
+        filtros,
+        mensaje_vacio="No hay documentos registrados"
+    )
+
+
+def buscar_documentos():
+    """Búsqueda por contenido en títulos, descripciones y texto de los archivos"""
+    st.subheader("🔎 Buscar en Documentos")
     
-    if documentos:
-        st.info(f"Total: {len(documentos)}")
-        
-        for doc in documentos:
-            with st.expander(f"📄 {doc['codigo']} - {doc['titulo']} (v{doc['version']})"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown(f"**Tipo:** {doc['tipo']}")
-                    st.markdown(f"**Estado:** {doc['estado']}")
-                    st.markdown(f"**Fecha Emisión:** {doc['fecha_emision']}")
-                
-                with col2:
-                    if doc.get('categoria'):
-                        st.markdown(f"**Categoría:** {doc['categoria']}")
-                    if doc.get('fecha_revision'):
-                        st.markdown(f"**Fecha Revisión:** {doc['fecha_revision']}")
-                
-                if doc.get('descripcion'):
-                    st.markdown(f"**Descripción:** {doc['descripcion']}")
-                
-                st.markdown(f"[📥 Descargar Documento]({doc['archivo_url']})")
-    else:
-        st.warning("No hay documentos registrados")
+    supabase = get_supabase_client()
+    
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        consulta = st.text_input(
+            "Buscar",
+            placeholder='Ej.: trabajo en altura arnés, "bloqueo y etiquetado", -eléctrico'
+        )
+    with col2:
+        if st.button("🔄 Indexar pendientes"):
+            encolados = indexar_pendientes()
+            st.toast(f"{encolados} documentos en indexación" if encolados else "No hay documentos pendientes")
+    
+    if not consulta:
+        st.caption("La búsqueda admite frases entre comillas, OR y exclusiones con -")
+        return
+    
+    resultados = supabase.buscar_documentos(consulta)
+    if not resultados:
+        st.info("Sin resultados")
+        return
+    
+    st.caption(f"{len(resultados)} resultados")
+    for doc in resultados:
+        with st.container(border=True):
+            st.markdown(
+                f"**[{doc['codigo']} - {doc['titulo']}]({doc['archivo_url']})** · "
+                f"{doc['tipo']} · v{doc['version']} · {doc['estado']}"
+            )
+            if doc.get("fragmento"):
+                st.markdown(doc["fragmento"])
 
 
 def documentos_por_revisar():
@@ -186,16 +338,12 @@ def modulo_documental():
     st.title("📁 Gestión Documental")
     st.markdown("**Control de Documentos del Sistema SST - Art. 28, 32 Ley 29783**")
     
-    tabs = st.tabs(["📋 Documentos", "⏰ Por Revisar", "➕ Registrar"])
-    
-    with tabs[0]:
-        listar_documentos()
-    
-    with tabs[1]:
-        documentos_por_revisar()
-    
-    with tabs[2]:
-        formulario_registro_documento()
+    subvistas("documental", {
+        "📋 Documentos": listar_documentos,
+        "🔎 Buscar": buscar_documentos,
+        "⏰ Por Revisar": documentos_por_revisar,
+        "➕ Registrar": formulario_registro_documento
+    })
 
 
 if __name__ == "__main__":
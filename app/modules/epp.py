@@ -11,6 +11,9 @@ import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.supabase_client import get_supabase_client
+from utils.navegacion import subvistas
+from utils.cache_datos import usuarios_activos, catalogo_epp, invalidar_tabla
+from utils.figuras import datos_dashboard
 from utils.n8n_client import get_n8n_client
 from config.settings import TIPOS_EPP
 from auth import obtener_usuario_actual
@@ -72,6 +75,7 @@ def formulario_registro_epp():
                 epp_creado = supabase.crear_epp(datos_epp)
                 
                 if epp_creado:
+                    invalidar_tabla("epp_catalogo")
                     st.success(f"✅ EPP registrado: {epp_creado['codigo']}")
                     st.rerun()
 
@@ -84,8 +88,8 @@ def formulario_asignacion_epp():
     usuario_actual = obtener_usuario_actual()
     
     # Obtener listas
-    epps = supabase.listar_epp()
-    usuarios = supabase.listar_usuarios()
+    epps = catalogo_epp()
+    usuarios = usuarios_activos()
     
     if not epps:
         st.warning("No hay EPPs registrados en el catálogo")
@@ -142,6 +146,8 @@ def formulario_asignacion_epp():
                 asignacion_creada = supabase.asignar_epp(datos_asignacion)
                 
                 if asignacion_creada:
+                    invalidar_tabla("epp_asignaciones")
+                    invalidar_tabla("epp_catalogo")
                     st.success("✅ EPP asignado correctamente")
                     st.info(f"Stock actualizado: {epp_data['stock_actual']} → {epp_data['stock_actual'] - cantidad}")
                     st.rerun()
@@ -151,8 +157,6 @@ def listar_catalogo_epp():
     """Lista el catálogo de EPPs"""
     st.subheader("📋 Catálogo de EPPs")
     
-    supabase = get_supabase_client()
-    
     # Filtros
     col1, col2, col3 = st.columns(3)
     
@@ -163,7 +167,7 @@ def listar_catalogo_epp():
     with col3:
         filtro_activos = st.checkbox("Solo activos", value=True)
     
-    epps = supabase.listar_epp(activos_solo=filtro_activos)
+    epps = catalogo_epp(activos_solo=filtro_activos)
     
     if filtro_tipo != "Todos":
         epps = [e for e in epps if e.get("tipo") == filtro_tipo]
@@ -257,84 +261,137 @@ def listar_epp_vencimientos():
         st.success("✅ No hay EPPs próximos a vencer")
 
 
+def construir_dashboard_epp() -> Optional[dict]:
+    """Métricas y figuras del dashboard de EPPs"""
+    epps = catalogo_epp()
+    
+    if not epps:
+        return None
+    
+    df = pd.DataFrame(epps)
+    
+    # Distribución por tipo
+    fig_tipo = px.pie(
+        df,
+        names="tipo",
+        title="Distribución por Tipo de EPP"
+    )
+    
+    # Stock por tipo
+    stock_por_tipo = df.groupby("tipo")["stock_actual"].sum().reset_index()
+    fig_stock = px.bar(
+        stock_por_tipo,
+        x="tipo",
+        y="stock_actual",
+        title="Stock por Tipo de EPP",
+        labels={"tipo": "Tipo", "stock_actual": "Stock"}
+    )
+    
+    return {
+        "metricas": {
+            "total_epps": len(df),
+            "stock_total": int(df["stock_actual"].sum()),
+            "stock_bajo": len(df[df["stock_actual"] <= df["stock_minimo"]]),
+            "valor_inventario": float((df["stock_actual"] * df["costo_unitario"]).sum())
+        },
+        "figuras": {
+            "tipo": fig_tipo,
+            "stock": fig_stock
+        }
+    }
+
+
 def dashboard_epp():
     """Dashboard de EPPs"""
     st.subheader("📊 Dashboard de EPPs")
     
-    supabase = get_supabase_client()
-    epps = supabase.listar_epp()
+    datos = datos_dashboard("epp", ["epp_catalogo"], construir_dashboard_epp)
     
-    if not epps:
+    if not datos:
         st.warning("No hay EPPs registrados")
         return
     
-    df = pd.DataFrame(epps)
+    metricas, figuras = datos["metricas"], datos["figuras"]
     
     # Métricas principales
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_epps = len(df)
-        st.metric("Total EPPs", total_epps)
+        st.metric("Total EPPs", metricas["total_epps"])
     
     with col2:
-        stock_total = df["stock_actual"].sum()
-        st.metric("Stock Total", int(stock_total))
+        st.metric("Stock Total", metricas["stock_total"])
     
     with col3:
-        stock_bajo = len(df[df["stock_actual"] <= df["stock_minimo"]])
+        stock_bajo = metricas["stock_bajo"]
         st.metric("Stock Bajo", stock_bajo, delta="⚠️" if stock_bajo > 0 else None)
     
     with col4:
-        valor_inventario = (df["stock_actual"] * df["costo_unitario"]).sum()
-        st.metric("Valor Inventario", f"S/ {valor_inventario:,.2f}")
+        st.metric("Valor Inventario", f"S/ {metricas['valor_inventario']:,.2f}")
     
     # Gráficos
     col1, col2 = st.columns(2)
     
     with col1:
-        # Distribución por tipo
-        fig_tipo = px.pie(
-            df,
-            names="tipo",
-            title="Distribución por Tipo de EPP"
-        )
-        st.plotly_chart(fig_tipo, width='stretch')
+        st.plotly_chart(figuras["tipo"], width='stretch')
     
     with col2:
-        # Stock por tipo
-        stock_por_tipo = df.groupby("tipo")["stock_actual"].sum().reset_index()
-        fig_stock = px.bar(
-            stock_por_tipo,
-            x="tipo",
-            y="stock_actual",
-            title="Stock por Tipo de EPP",
-            labels={"tipo": "Tipo", "stock_actual": "Stock"}
-        )
-        st.plotly_chart(fig_stock, width='stretch')
+        st.plotly_chart(figuras["stock"], width='stretch')
 
 
-def modulo_epp():
-    """Módulo principal de gestión de EPP"""
-    st.title("🦺 Gestión de Equipos de Protección Personal (EPP)")
-    st.markdown("**Control de EPPs y Asignaciones**")
+def actas_entrega_epp():
+    """Generación masiva de actas de entrega de EPP"""
+    # reportlab se carga solo al abrir esta sub-vista
+    from utils.pdf_lotes import descargar_lote, nombre_archivo_seguro
+    
+    st.subheader("📄 Actas de Entrega de EPP")
+    
+    supabase = get_supabase_client()
+    
+    asignaciones = supabase.listar_epp_asignaciones({"estado": "activo"})
     
-    tabs = st.tabs(["📊 Dashboard", "📋 Catálogo", "⏰ Vencimientos", "➕ Registrar EPP", "➕ Asignar EPP"])
+    if not asignaciones:
+        st.warning("No hay asignaciones activas")
+        return
     
-    with tabs[0]:
-        dashboard_epp()
+    areas = sorted({(a.get("usuario") or {}).get("area") or "Sin área" for a in asignaciones})
+    filtro_area = st.selectbox("Área", ["Todas"] + areas, key="actas_area")
     
-    with tabs[1]:
-        listar_catalogo_epp()
+    if filtro_area != "Todas":
+        asignaciones = [
+            a for a in asignaciones
+            if ((a.get("usuario") or {}).get("area") or "Sin área") == filtro_area
+        ]
     
-    with tabs[2]:
-        listar_epp_vencimientos()
+    st.info(f"Actas a generar: {len(asignaciones)}")
     
-    with tabs[3]:
-        formulario_registro_epp()
+    documentos = [
+        (
+            # El id va fuera del texto normalizado: el recorte a 80 caracteres no lo alcanza
+            nombre_archivo_seguro(
+                f"acta_epp_{(a.get('usuario') or {}).get('nombre_completo', '')}_"
+                f"{(a.get('epp') or {}).get('codigo', '')}"
+            ) + f"_{a['id'][:8]}.pdf",
+            {"asignacion": a}
+        )
+        for a in asignaciones
+    ]
+    descargar_lote("actas", "acta_entrega_epp", documentos, "actas_entrega_epp")
+
+
+def modulo_epp():
+    """Módulo principal de gestión de EPP"""
+    st.title("🦺 Gestión de Equipos de Protección Personal (EPP)")
+    st.markdown("**Control de EPPs y Asignaciones**")
     
-    with tabs[4]:
-        formulario_asignacion_epp()
+    subvistas("epp", {
+        "📊 Dashboard": dashboard_epp,
+        "📋 Catálogo": listar_catalogo_epp,
+        "⏰ Vencimientos": listar_epp_vencimientos,
+        "➕ Registrar EPP": formulario_registro_epp,
+        "➕ Asignar EPP": formulario_asignacion_epp,
+        "📄 Actas de Entrega": actas_entrega_epp
+    })
 
 
 if __name__ == "__main__":
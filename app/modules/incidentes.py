@@ -5,13 +5,21 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from datetime import datetime, date
-from typing import Optional
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.supabase_client import get_supabase_client
+from utils.navegacion import subvistas
+from utils.cache_datos import usuarios_activos, invalidar_tabla
+from utils.figuras import memorizar_figuras
+from utils.incremental import get_incidentes_en_vivo, INTERVALO_SONDEO
+from utils.listados import listado_paginado
 from utils.n8n_client import get_n8n_client
+from utils.almacenamiento import subir_varios, publicar_exportacion, boton_descarga
+from utils.imagenes import adjuntar_evidencias, es_imagen
+from utils.contenido import subir_contenido
+from utils.urls_firmadas import firmar
 from config.settings import TIPOS_INCIDENTE, STORAGE_BUCKETS
 from auth import obtener_usuario_actual
 
@@ -32,7 +40,7 @@ def formulario_registro_incidente():
     
     # Si no hay usuario en sesión, obtener el primer usuario admin de la BD
     if not usuario:
-        usuarios = supabase.listar_usuarios()
+        usuarios = usuarios_activos()
         usuario = usuarios[0] if usuarios else {"id": None}
     
     with st.form("form_incidente"):
@@ -99,20 +107,6 @@ def formulario_registro_incidente():
             else:
                 # Combinar fecha y hora
                 fecha_hora = datetime.combine(fecha_incidente, hora_incidente)
-                # Subir evidencias si existen
-                evidencias_urls = []
-                if evidencias:
-                    with st.spinner("Subiendo evidencias..."):
-                        for evidencia in evidencias:
-                            ruta = f"incidentes/{datetime.now().strftime('%Y%m')}/{evidencia.name}"
-                            url = supabase.subir_archivo(
-                                STORAGE_BUCKETS["incidentes"],
-                                ruta,
-                                evidencia.getvalue()
-                            )
-                            if url:
-                                evidencias_urls.append(url)
-
                 datos_incidente = {
                     "codigo": generar_codigo_incidente(),
                     "tipo": tipo,
@@ -132,18 +126,49 @@ def formulario_registro_incidente():
                     "analisis_causa_raiz": analisis_causa_raiz,
                     "medidas_inmediatas": medidas_inmediatas,
                     "requiere_investigacion": requiere_investigacion,
-                    "evidencias_url": evidencias_urls if evidencias_urls else None,
                     "notificado_sunafil": notificado_sunafil,
                     "fecha_notificacion_sunafil": fecha_notificacion.isoformat() if notificado_sunafil else None,
                     "reportado_por": usuario["id"],
                     "estado": "reportado"
                 }
                 
+                # Videos y documentos se suben por streaming (reanudable si son grandes)
+                # con el avance de cada archivo; las fotos se procesan después, en segundo plano
+                fotos = [a for a in evidencias or [] if es_imagen(a.name)]
+                otros = [a for a in evidencias or [] if not es_imagen(a.name)]
+                evidencias_urls, fallidas = [], []
+                if otros:
+                    st.markdown("**Subiendo evidencias...**")
+                    urls = subir_varios([
+                        {"bucket": STORAGE_BUCKETS["incidentes"], "origen": a,
+                         "tipo_contenido": a.type, "nombre": a.name}
+                        for a in otros
+                    ], mostrar_progreso=True)
+                    evidencias_urls = [url for url in urls if url]
+                    fallidas = [a.name for a, url in zip(otros, urls) if not url]
+                if evidencias_urls:
+                    datos_incidente["evidencias_url"] = evidencias_urls
+                    datos_incidente["evidencias_miniaturas"] = [None] * len(evidencias_urls)
+                if evidencias:
+                    # Queda en el incidente: el resultado de las fotos llega después del rerun
+                    datos_incidente["estado_evidencias"] = (
+                        "procesando" if fotos else "incompletas" if fallidas else "completas"
+                    )
+                    datos_incidente["evidencias_fallidas"] = fallidas or None
+                
                 incidente_creado = supabase.crear_incidente(datos_incidente)
                 
                 if incidente_creado:
+                    invalidar_tabla("incidentes")
                     st.success(f"✅ Incidente registrado: {incidente_creado['codigo']}")
                     
+                    # Fotos re-codificadas sin EXIF + miniatura, subidas y deduplicadas por
+                    # contenido en segundo plano; se agregan al incidente al terminar
+                    if fotos:
+                        adjuntar_evidencias(incidente_creado["id"], fotos, STORAGE_BUCKETS["incidentes"],
+                                            evidencias_urls, fallidas)
+                        st.info(f"📎 {len(fotos)} fotos en proceso; aparecerán en el incidente al terminar")
+                    
                     # Enviar notificación a n8n
                     with st.spinner("Enviando notificaciones..."):
                         n8n.notificar_incidente_registrado(incidente_creado)
@@ -157,7 +182,7 @@ def formulario_accion_correctiva(incidente_id: str):
     st.subheader("➕ Registrar Acción Correctiva")
     
     supabase = get_supabase_client()
-    usuarios = supabase.listar_usuarios()
+    usuarios = usuarios_activos()
     usuarios_dict = {u["nombre_completo"]: u["id"] for u in usuarios}
     
     with st.form("form_accion_correctiva"):
@@ -186,11 +211,8 @@ def formulario_accion_correctiva(incidente_id: str):
                 # Subir evidencia si existe
                 evidencia_url = None
                 if evidencia:
-                    ruta = f"acciones_correctivas/{datetime.now().strftime('%Y%m')}/{evidencia.name}"
-                    evidencia_url = supabase.subir_archivo(
-                        STORAGE_BUCKETS["incidentes"],
-                        ruta,
-                        evidencia.getvalue()
+                    evidencia_url = subir_contenido(
+                        STORAGE_BUCKETS["incidentes"], evidencia, evidencia.name, evidencia.type
                     )
                 
                 datos_accion = {
@@ -212,6 +234,70 @@ def formulario_accion_correctiva(incidente_id: str):
                     st.rerun()
 
 
+def detalle_incidente(inc: dict):
+    """Panel de detalle del incidente seleccionado"""
+    st.markdown(f"#### 🔴 {inc['codigo']} - {inc['tipo']} - {inc['area']}")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown(f"**Fecha:** {inc['fecha_hora']}")
+        st.markdown(f"**Área:** {inc['area']}")
+        st.markdown(f"**Ubicación:** {inc.get('ubicacion_especifica', 'N/A')}")
+        st.markdown(f"**Estado:** {inc['estado']}")
+    
+    with col2:
+        if inc.get('afectado_nombre'):
+            st.markdown(f"**Afectado:** {inc['afectado_nombre']}")
+            st.markdown(f"**Cargo:** {inc.get('afectado_cargo', 'N/A')}")
+            st.markdown(f"**Días descanso:** {inc.get('dias_descanso_medico', 0)}")
+    
+    st.markdown(f"**Descripción:** {inc['descripcion']}")
+    
+    if inc.get('medidas_inmediatas'):
+        st.markdown(f"**Medidas Inmediatas:** {inc['medidas_inmediatas']}")
+    
+    # Evidencias (bucket privado): miniaturas y originales se firman en una sola llamada
+    evidencias = inc.get('evidencias_url') or []
+    miniaturas = inc.get('evidencias_miniaturas') or [None] * len(evidencias)
+    firmadas = firmar(evidencias + miniaturas)
+    if inc.get('estado_evidencias') == 'procesando':
+        st.info("⏳ Fotos en proceso: aparecerán aquí al terminar. Si no aparecen en unos minutos, "
+                "el procesamiento se interrumpió y las fotos no se adjuntaron.")
+    elif inc.get('estado_evidencias') == 'incompletas':
+        st.warning(f"⚠️ Evidencias que no se pudieron adjuntar: {', '.join(inc.get('evidencias_fallidas') or [])}")
+    if evidencias:
+        st.markdown("**Evidencias:**")
+        columnas = st.columns(min(len(evidencias), 4))
+        for i, (original, miniatura) in enumerate(zip(evidencias, miniaturas)):
+            with columnas[i % len(columnas)]:
+                if firmadas.get(miniatura):
+                    st.image(firmadas[miniatura], width='stretch')
+                if firmadas.get(original):
+                    st.markdown(f"[Ver original]({firmadas[original]})")
+    
+    if st.button("📄 Reporte PDF", key=f"btn_pdf_inc_{inc['id']}"):
+        from utils.pdf_reportes import generar_reporte
+        
+        datos_pdf = {"incidente": {
+            **inc, "evidencias_miniaturas": [firmadas.get(m) for m in miniaturas if m]
+        }}
+        with st.spinner("Generando PDF..."):
+            url = publicar_exportacion(
+                generar_reporte("reporte_incidente", datos_pdf),
+                f"incidente_{inc['codigo']}.pdf",
+                "application/pdf"
+            )
+        if url:
+            boton_descarga("⬇️ Descargar PDF", url)
+    
+    # Botón para agregar acción correctiva
+    if st.button(f"➕ Agregar Acción Correctiva", key=f"btn_accion_{inc['id']}"):
+        st.session_state[f"mostrar_form_accion_{inc['id']}"] = True
+    
+    if st.session_state.get(f"mostrar_form_accion_{inc['id']}", False):
+        formulario_accion_correctiva(inc['id'])
+
+
 def listar_incidentes():
     """Lista y filtra incidentes registrados"""
     st.subheader("📋 Listado de Incidentes")
@@ -238,111 +324,105 @@ def listar_incidentes():
         filtros["estado"] = filtro_estado
     if filtro_area:
         filtros["area"] = filtro_area
+    if filtro_fecha_desde:
+        filtros["fecha_desde"] = filtro_fecha_desde.isoformat()
     
-    incidentes = supabase.listar_incidentes(filtros)
+    listado_paginado(
+        "incidentes",
+        lambda pagina, tamano: supabase.listar_incidentes_paginado(filtros, pagina, tamano),
+        {
+            "codigo": "Código",
+            "fecha_hora": "Fecha",
+            "tipo": "Tipo",
+            "area": "Área",
+            "afectado_nombre": "Afectado",
+            "estado": "Estado"
+        },
+        detalle_incidente,
+        filtros,
+        mensaje_vacio="No se encontraron incidentes"
+    )
+
+
+def construir_figuras_incidentes(df: pd.DataFrame) -> dict:
+    """Figuras del dashboard de incidentes"""
+    # Distribución por tipo
+    fig_tipo = px.pie(
+        df,
+        names="tipo",
+        title="Distribución por Tipo de Incidente"
+    )
     
-    if incidentes:
-        st.info(f"Total de incidentes: {len(incidentes)}")
-        
-        # Mostrar incidentes
-        for inc in incidentes:
-            with st.expander(f"🔴 {inc['codigo']} - {inc['tipo']} - {inc['area']}"):
-                col1, col2 = st.columns(2)
-                
-                with col1:
-                    st.markdown(f"**Fecha:** {inc['fecha_hora']}")
-                    st.markdown(f"**Área:** {inc['area']}")
-                    st.markdown(f"**Ubicación:** {inc.get('ubicacion_especifica', 'N/A')}")
-                    st.markdown(f"**Estado:** {inc['estado']}")
-                
-                with col2:
-                    if inc.get('afectado_nombre'):
-                        st.markdown(f"**Afectado:** {inc['afectado_nombre']}")
-                        st.markdown(f"**Cargo:** {inc.get('afectado_cargo', 'N/A')}")
-                        st.markdown(f"**Días descanso:** {inc.get('dias_descanso_medico', 0)}")
-                
-                st.markdown(f"**Descripción:** {inc['descripcion']}")
-                
-                if inc.get('medidas_inmediatas'):
-                    st.markdown(f"**Medidas Inmediatas:** {inc['medidas_inmediatas']}")
-                
-                # Botón para agregar acción correctiva
-                if st.button(f"➕ Agregar Acción Correctiva", key=f"btn_accion_{inc['id']}"):
-                    st.session_state[f"mostrar_form_accion_{inc['id']}"] = True
-                
-                if st.session_state.get(f"mostrar_form_accion_{inc['id']}", False):
-                    formulario_accion_correctiva(inc['id'])
-    else:
-        st.warning("No se encontraron incidentes")
+    # Incidentes por área
+    fig_area = px.bar(
+        df["area"].value_counts().reset_index(),
+        x="area",
+        y="count",
+        title="Incidentes por Área",
+        labels={"area": "Área", "count": "Cantidad"}
+    )
+    
+    # Tendencia temporal
+    fecha = pd.to_datetime(df["fecha_hora"]).dt.date
+    incidentes_por_fecha = fecha.value_counts().sort_index().rename_axis("fecha").reset_index(name="cantidad")
+    
+    fig_tendencia = px.line(
+        incidentes_por_fecha,
+        x="fecha",
+        y="cantidad",
+        title="Tendencia de Incidentes en el Tiempo",
+        labels={"fecha": "Fecha", "cantidad": "Cantidad de Incidentes"}
+    )
+    
+    return {
+        "tipo": fig_tipo,
+        "area": fig_area,
+        "tendencia": fig_tendencia
+    }
 
 
+@st.fragment(run_every=INTERVALO_SONDEO)
 def dashboard_incidentes():
-    """Dashboard con estadísticas de incidentes"""
+    """Dashboard con estadísticas de incidentes (se actualiza solo, por deltas)"""
     st.subheader("📊 Dashboard de Incidentes")
     
-    supabase = get_supabase_client()
-    incidentes = supabase.listar_incidentes()
+    incidentes = get_incidentes_en_vivo()
+    incidentes.actualizar()
+    df = incidentes.df
     
-    if not incidentes:
+    if df.empty:
         st.warning("No hay incidentes registrados")
         return
     
-    df = pd.DataFrame(incidentes)
+    contadores = incidentes.contadores
+    figuras = memorizar_figuras("incidentes", incidentes.version, lambda: construir_figuras_incidentes(df))
     
     # Métricas principales
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total = len(df)
-        st.metric("Total Incidentes", total)
+        st.metric("Total Incidentes", int(contadores.get("total", 0)))
     
     with col2:
-        accidentes = len(df[df["tipo"].str.contains("Accidente")])
-        st.metric("Accidentes", accidentes)
+        st.metric("Accidentes", int(contadores.get("accidentes", 0)))
     
     with col3:
-        dias_perdidos = df["dias_descanso_medico"].sum()
-        st.metric("Días Perdidos", int(dias_perdidos))
+        st.metric("Días Perdidos", int(contadores.get("dias_perdidos", 0)))
     
     with col4:
-        investigacion = len(df[df["requiere_investigacion"] == True])
-        st.metric("En Investigación", investigacion)
+        st.metric("En Investigación", int(contadores.get("investigacion", 0)))
     
     # Gráficos
     col1, col2 = st.columns(2)
     
     with col1:
-        # Distribución por tipo
-        fig_tipo = px.pie(
-            df,
-            names="tipo",
-            title="Distribución por Tipo de Incidente"
-        )
-        st.plotly_chart(fig_tipo, width='stretch')
+        st.plotly_chart(figuras["tipo"], width='stretch')
     
     with col2:
-        # Incidentes por área
-        fig_area = px.bar(
-            df["area"].value_counts().reset_index(),
-            x="area",
-            y="count",
-            title="Incidentes por Área",
-            labels={"area": "Área", "count": "Cantidad"}
-        )
-        st.plotly_chart(fig_area, width='stretch')
-    
-    # Tendencia temporal
-    df["fecha"] = pd.to_datetime(df["fecha_hora"]).dt.date
-    incidentes_por_fecha = df.groupby("fecha").size().reset_index(name="cantidad")
+        st.plotly_chart(figuras["area"], width='stretch')
     
-    fig_tendencia = px.line(
-        incidentes_por_fecha,
-        x="fecha",
-        y="cantidad",
-        title="Tendencia de Incidentes en el Tiempo",
-        labels={"fecha": "Fecha", "cantidad": "Cantidad de Incidentes"}
-    )
-    st.plotly_chart(fig_tendencia, width='stretch')
+    st.plotly_chart(figuras["tendencia"], width='stretch')
+    st.caption(f"🔄 Actualización automática cada {INTERVALO_SONDEO} s")
 
 
 def modulo_incidentes():
@@ -350,16 +430,11 @@ def modulo_incidentes():
     st.title("🚨 Gestión de Incidentes y Accidentes")
     st.markdown("**Registro e Investigación de Incidentes - Art. 82-88 Ley 29783**")
     
-    tabs = st.tabs(["📊 Dashboard", "📋 Listado", "➕ Registrar"])
-    
-    with tabs[0]:
-        dashboard_incidentes()
-    
-    with tabs[1]:
-        listar_incidentes()
-    
-    with tabs[2]:
-        formulario_registro_incidente()
+    subvistas("incidentes", {
+        "📊 Dashboard": dashboard_incidentes,
+        "📋 Listado": listar_incidentes,
+        "➕ Registrar": formulario_registro_incidente
+    })
 
 
 if __name__ == "__main__":
@@ -3,13 +3,20 @@ Módulo de Gestión de Inspecciones
 """
 import streamlit as st
 import pandas as pd
-from datetime import datetime, date
+import plotly.express as px
+from datetime import datetime, date, timedelta
 import json
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.supabase_client import get_supabase_client
+from utils.navegacion import subvistas
+from utils.cache_datos import usuarios_activos, checklists_activos, invalidar_tabla
+from utils.almacenamiento import publicar_exportacion, boton_descarga
+from utils.espejo_local import get_espejo_local
+from utils.captura_offline import get_captura_offline, hay_conexion
+from utils.ejecucion_checklist import PESO_CRITICO, PESO_NORMAL, calcular_puntaje, hallazgos_no_conformes, pesos_items
 from auth import obtener_usuario_actual
 
 
@@ -37,18 +44,22 @@ def formulario_checklist():
         num_items = st.number_input("Número de items", min_value=1, max_value=50, value=5)
         
         items = []
+        st.caption(f"Peso 0 = automático ({PESO_CRITICO:g} si es crítico, {PESO_NORMAL:g} si no)")
         for i in range(num_items):
-            col1, col2 = st.columns([3, 1])
+            col1, col2, col3 = st.columns([3, 1, 1])
             with col1:
                 pregunta = st.text_input(f"Item {i+1}", key=f"item_{i}")
             with col2:
                 critico = st.checkbox("Crítico", key=f"critico_{i}")
+            with col3:
+                peso = st.number_input("Peso", min_value=0.0, max_value=10.0, value=0.0, step=0.5, key=f"peso_{i}")
             
             if pregunta:
                 items.append({
                     "pregunta": pregunta,
                     "tipo_respuesta": "si_no",
-                    "es_critico": critico
+                    "es_critico": critico,
+                    "peso": peso or None
                 })
         
         submitted = st.form_submit_button("💾 Crear Checklist")
@@ -67,6 +78,7 @@ def formulario_checklist():
                 }
                 
                 if supabase.crear_checklist(datos):
+                    invalidar_tabla("checklists")
                     st.success("✅ Checklist creado")
                     st.rerun()
 
@@ -78,12 +90,12 @@ def formulario_inspeccion():
     supabase = get_supabase_client()
     usuario = obtener_usuario_actual()
     
-    checklists = supabase.listar_checklists()
+    checklists = checklists_activos()
     if not checklists:
         st.warning("No hay checklists disponibles. Crea uno primero.")
         return
     
-    usuarios = supabase.listar_usuarios()
+    usuarios = usuarios_activos()
     
     with st.form("form_inspeccion"):
         col1, col2 = st.columns(2)
@@ -142,24 +154,301 @@ def listar_inspecciones():
         
         df = pd.DataFrame(inspecciones)
         st.dataframe(df[["codigo", "area", "fecha_programada", "estado"]], width='stretch', hide_index=True)
+        
+        # PDF de resultados
+        inspecciones_dict = {i["codigo"]: i for i in inspecciones}
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            codigo_sel = st.selectbox("Inspección", list(inspecciones_dict.keys()), key="insp_pdf_sel")
+        with col2:
+            generar = st.button("📄 Generar PDF", key="insp_pdf_btn")
+        
+        if generar:
+            from utils.pdf_reportes import generar_reporte
+            
+            inspeccion = inspecciones_dict[codigo_sel]
+            with st.spinner("Generando PDF..."):
+                datos_pdf = {
+                    "inspeccion": inspeccion,
+                    "hallazgos": supabase.listar_hallazgos(inspeccion["id"])
+                }
+                url = publicar_exportacion(
+                    generar_reporte("resultado_inspeccion", datos_pdf),
+                    f"inspeccion_{codigo_sel}.pdf",
+                    "application/pdf"
+                )
+            if url:
+                boton_descarga("⬇️ Descargar PDF", url)
     else:
         st.warning("No hay inspecciones registradas")
 
 
-def modulo_inspecciones():
-    """Módulo principal de inspecciones"""
-    st.title("🔍 Gestión de Inspecciones")
+# Inspecciones por ejecutar con su checklist, leídas del espejo local (disponible sin conexión)
+CONSULTA_INSPECCIONES_CAMPO = """
+    SELECT i.id, i.codigo, i.area, i.fecha_programada, i.estado, i.fecha_actualizacion,
+           c.nombre AS checklist, c.items
+    FROM inspecciones i
+    JOIN checklists c ON c.id = i.checklist_id
+    WHERE i.estado IN ('programada', 'en_proceso')
+    ORDER BY i.fecha_programada
+"""
+
+
+def items_checklist(valor) -> list:
+    """Ítems de un checklist (el espejo guarda el JSONB como texto)"""
+    while isinstance(valor, str):
+        valor = json.loads(valor)
+    return valor or []
+
+
+def captura_en_campo():
+    """
+    Ejecución de inspecciones con captura local: funciona sin conexión
+
+    Requiere una sesión iniciada antes de perder la conexión (el login usa
+    Supabase Auth); ver utils.captura_offline.
+    """
+    st.subheader("📲 Captura en Campo")
     
-    tabs = st.tabs(["📋 Inspecciones", "➕ Nueva Inspección", "📝 Crear Checklist"])
+    captura = get_captura_offline()
+    conectado = hay_conexion()
     
-    with tabs[0]:
-        listar_inspecciones()
+    # Las capturas pendientes se envían solas al recuperar la conexión
+    resultado = captura.sincronizar()
+    if resultado and resultado["sincronizadas"]:
+        invalidar_tabla("inspecciones")
+        invalidar_tabla("hallazgos")
+        st.toast(f"✅ {resultado['sincronizadas']} inspecciones sincronizadas")
+    
+    if conectado:
+        st.caption("🟢 Conectado")
+    else:
+        st.caption("🔴 Sin conexión: las capturas se guardan en este equipo y se envían al reconectar. "
+                   "No cierres sesión: iniciarla de nuevo requiere conexión")
     
-    with tabs[1]:
-        formulario_inspeccion()
+    inspecciones = get_espejo_local(sincronizar=conectado).consultar(CONSULTA_INSPECCIONES_CAMPO)
+    if inspecciones.empty:
+        st.warning("No hay inspecciones programadas disponibles en este equipo")
+    else:
+        inspecciones_dict = {
+            f"{i['codigo']} - {i['area']} ({i['checklist']})": i
+            for i in inspecciones.to_dict("records")
+        }
+        inspeccion = inspecciones_dict[st.selectbox("Inspección", list(inspecciones_dict.keys()))]
+        formulario_captura(captura, inspeccion)
+        formulario_hallazgo_campo(captura, inspeccion)
+    
+    st.markdown("---")
+    panel_sincronizacion(captura)
+
+
+def formulario_captura(captura, inspeccion: dict):
+    """Respuestas por ítem del checklist, guardadas localmente"""
+    items = items_checklist(inspeccion["items"])
+    pesos = pesos_items(items)
+    
+    with st.form(f"form_captura_{inspeccion['id']}"):
+        st.markdown("### Checklist")
+        respuestas = []
+        for i, item in enumerate(items):
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                respuesta = st.radio(
+                    f"{i + 1}. {item['pregunta']}{' ⚠️' if item.get('es_critico') else ''}",
+                    ["si", "no", "na"],
+                    format_func={"si": "Sí", "no": "No", "na": "N/A"}.get,
+                    horizontal=True,
+                    key=f"resp_{inspeccion['id']}_{i}"
+                )
+            with col2:
+                observacion = st.text_input("Observación", key=f"obs_{inspeccion['id']}_{i}")
+            respuestas.append({
+                "indice_item": i,
+                "pregunta": item["pregunta"],
+                "respuesta": respuesta,
+                "es_critico": bool(item.get("es_critico")),
+                "peso": float(pesos[i]),
+                "observacion": observacion or None
+            })
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            estado = st.selectbox("Estado", ["en_proceso", "completada"])
+        with col2:
+            fecha_realizada = st.date_input("Fecha Realizada", value=date.today())
+        observaciones = st.text_area("Observaciones")
+        
+        if st.form_submit_button("💾 Guardar Captura"):
+            puntaje = calcular_puntaje(items, respuestas)
+            # Cada ítem no conforme genera su hallazgo; se envían junto con la captura
+            hallazgos = hallazgos_no_conformes(inspeccion, items, respuestas, puntaje["no_conformes"])
+            captura.guardar_captura(inspeccion, {
+                "estado": estado,
+                "fecha_realizada": fecha_realizada.isoformat(),
+                "observaciones": observaciones or None,
+                "puntaje_total": puntaje["puntaje_total"],
+                "puntaje_obtenido": puntaje["puntaje_obtenido"]
+            }, respuestas, hallazgos)
+            st.success(
+                f"✅ Captura guardada en este equipo: {puntaje['porcentaje']:.1f}% de cumplimiento, "
+                f"{len(hallazgos)} hallazgos por ítems no conformes"
+            )
+            if hay_conexion():
+                resultado = captura.sincronizar(forzar=True)
+                if resultado and resultado["sincronizadas"]:
+                    invalidar_tabla("inspecciones")
+                    invalidar_tabla("hallazgos")
+                    st.success("✅ Inspección sincronizada")
+
+
+def formulario_hallazgo_campo(captura, inspeccion: dict):
+    """Hallazgo con evidencia, guardado localmente junto a la captura"""
+    with st.form(f"form_hallazgo_{inspeccion['id']}", clear_on_submit=True):
+        st.markdown("### Agregar Hallazgo")
+        col1, col2 = st.columns(2)
+        with col1:
+            tipo = st.selectbox("Tipo", ["No Conforme Menor", "No Conforme Mayor", "Observación", "Conforme"])
+            severidad = st.selectbox("Severidad", ["Baja", "Media", "Alta", "Crítica"])
+        with col2:
+            ubicacion = st.text_input("Ubicación")
+            fecha_limite = st.date_input("Fecha Límite", value=None)
+        descripcion = st.text_area("Descripción *")
+        accion_correctiva = st.text_area("Acción Correctiva")
+        evidencia = st.file_uploader("Evidencia", type=["jpg", "jpeg", "png", "pdf"])
+        
+        if st.form_submit_button("➕ Agregar Hallazgo"):
+            if not descripcion:
+                st.error("La descripción es obligatoria")
+            else:
+                captura.agregar_hallazgo(inspeccion, {
+                    "descripcion": descripcion,
+                    "tipo": tipo,
+                    "severidad": severidad,
+                    "ubicacion": ubicacion or None,
+                    "accion_correctiva": accion_correctiva or None,
+                    "fecha_limite": fecha_limite.isoformat() if fecha_limite else None
+                }, evidencia)
+                st.success("✅ Hallazgo guardado en este equipo")
+
+
+def panel_sincronizacion(captura):
+    """Capturas pendientes, sincronización manual y resolución de conflictos"""
+    st.markdown("### Sincronización")
+    
+    capturas = captura.listar()
+    if not capturas:
+        st.caption("No hay capturas pendientes en este equipo")
+        return
+    
+    df = pd.DataFrame(capturas)
+    st.dataframe(
+        df[["codigo", "estado", "hallazgos", "evidencias", "fecha_captura"]].rename(columns={
+            "codigo": "Inspección", "estado": "Estado", "hallazgos": "Hallazgos",
+            "evidencias": "Evidencias", "fecha_captura": "Capturada"
+        }),
+        width='stretch',
+        hide_index=True
+    )
+    
+    if st.button("🔄 Sincronizar Ahora"):
+        with st.spinner("Sincronizando..."):
+            resultado = captura.sincronizar(forzar=True)
+        if resultado is None:
+            st.warning("Sin conexión o sin capturas por enviar")
+        else:
+            invalidar_tabla("inspecciones")
+            invalidar_tabla("hallazgos")
+            st.success(
+                f"✅ {resultado['sincronizadas']} sincronizadas, "
+                f"{resultado['conflictos']} en conflicto, {resultado['errores']} con error"
+            )
+            st.rerun()
+    
+    for c in capturas:
+        if c["estado"] not in ("conflicto", "error"):
+            continue
+        col1, col2, col3 = st.columns([3, 1, 1])
+        with col1:
+            st.warning(f"**{c['codigo']}:** {c['detalle']}")
+        with col2:
+            if c["estado"] == "conflicto" and st.button("Sobrescribir", key=f"forzar_{c['inspeccion_id']}"):
+                captura.forzar(c["inspeccion_id"])
+                st.rerun()
+        with col3:
+            if st.button("Descartar", key=f"descartar_{c['inspeccion_id']}"):
+                captura.descartar(c["inspeccion_id"])
+                st.rerun()
+
+
+def tendencia_cumplimiento():
+    """Tendencia mensual de cumplimiento por área y checklist (agregada en la base)"""
+    st.subheader("📈 Tendencia de Cumplimiento")
+    
+    supabase = get_supabase_client()
+    
+    checklists = {c["nombre"]: c["id"] for c in checklists_activos()}
+    col1, col2 = st.columns(2)
+    with col1:
+        desde = st.date_input("Desde", value=date.today() - timedelta(days=365))
+    with col2:
+        checklist = st.selectbox("Checklist", ["Todos"] + list(checklists.keys()))
+    
+    filtros = {"periodo_desde": desde.replace(day=1).isoformat()}
+    if checklist != "Todos":
+        filtros["checklist_id"] = checklists[checklist]
+    
+    tendencia = supabase.listar_cumplimiento_inspecciones(filtros)
+    if not tendencia:
+        st.info("No hay inspecciones completadas con puntaje en el periodo")
+        return
+    
+    df = pd.DataFrame(tendencia)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Inspecciones", int(df["inspecciones"].sum()))
+    with col2:
+        puntaje_total = df["puntaje_total"].astype(float).sum()
+        cumplimiento = df["puntaje_obtenido"].astype(float).sum() / puntaje_total * 100 if puntaje_total else 0
+        st.metric("Cumplimiento", f"{cumplimiento:.1f}%")
+    with col3:
+        st.metric("Críticos No Conformes", int(df["criticos_no_conformes"].sum()))
+    
+    fig = px.line(
+        df,
+        x="periodo",
+        y="cumplimiento_ponderado",
+        color="area",
+        line_dash="checklist",
+        markers=True,
+        title="Cumplimiento por Área y Checklist",
+        labels={"periodo": "Mes", "cumplimiento_ponderado": "Cumplimiento (%)", "area": "Área", "checklist": "Checklist"}
+    )
+    st.plotly_chart(fig, width='stretch')
+    
+    st.dataframe(
+        df[["periodo", "area", "checklist", "inspecciones", "cumplimiento_ponderado",
+            "cumplimiento_minimo", "criticos_no_conformes"]].rename(columns={
+            "periodo": "Mes", "area": "Área", "checklist": "Checklist", "inspecciones": "Inspecciones",
+            "cumplimiento_ponderado": "Cumplimiento %", "cumplimiento_minimo": "Mínimo %",
+            "criticos_no_conformes": "Críticos No Conformes"
+        }),
+        width='stretch',
+        hide_index=True
+    )
+
+
+def modulo_inspecciones():
+    """Módulo principal de inspecciones"""
+    st.title("🔍 Gestión de Inspecciones")
     
-    with tabs[2]:
-        formulario_checklist()
+    subvistas("inspecciones", {
+        "📋 Inspecciones": listar_inspecciones,
+        "➕ Nueva Inspección": formulario_inspeccion,
+        "📲 Captura en Campo": captura_en_campo,
+        "📈 Cumplimiento": tendencia_cumplimiento,
+        "📝 Crear Checklist": formulario_checklist
+    })
 
 
 if __name__ == "__main__":
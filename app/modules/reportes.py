@@ -6,78 +6,277 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date, timedelta
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
-import io
+from typing import Optional
+import tempfile
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.supabase_client import get_supabase_client
+from utils.navegacion import subvistas
+from utils.figuras import memorizar_figuras
+from utils.cache_datos import invalidar_tabla
+from utils.snapshots import obtener_o_generar, describir_snapshot
+from utils.almacenamiento import boton_descarga
+from utils.espejo_local import get_espejo_local
+from utils.analitica import get_motor_analitico, scorecard_areas, DESGLOSES
 from config.settings import REPORTES_CONFIG
+from auth import obtener_usuario_actual
+
+
+COLUMNAS_HORAS_HOMBRE = ["area", "periodo", "horas_trabajadas", "numero_trabajadores"]
+
+# Tablas de las que depende cada reporte (marca de agua de los snapshots)
+TABLAS_RESUMEN = ["riesgos", "incidentes", "capacitaciones", "inspecciones", "horas_hombre"]
+TABLAS_SUNAFIL = ["incidentes", "horas_hombre"]
+TABLAS_EXPORTACION = {
+    "Riesgos": ["riesgos", "usuarios"],
+    "Incidentes": ["incidentes", "usuarios"],
+    "Capacitaciones": ["capacitaciones"],
+    "Inspecciones": ["inspecciones", "checklists", "usuarios"],
+    "EPPs": ["epp_catalogo"]
+}
+# Hojas de la exportación, consultadas sobre el espejo local
+CONSULTAS_EXPORTACION = {
+    "Riesgos": """
+        SELECT r.*, u.nombre_completo AS responsable, c.nombre_completo AS creador
+        FROM riesgos r
+        LEFT JOIN usuarios u ON u.id = r.responsable_id
+        LEFT JOIN usuarios c ON c.id = r.creado_por
+        ORDER BY r.fecha_creacion DESC
+    """,
+    "Incidentes": """
+        SELECT i.*, u.nombre_completo AS reportador
+        FROM incidentes i
+        LEFT JOIN usuarios u ON u.id = i.reportado_por
+        ORDER BY i.fecha_hora DESC
+    """,
+    "Capacitaciones": "SELECT * FROM capacitaciones ORDER BY fecha_programada DESC",
+    "Inspecciones": """
+        SELECT i.*, c.nombre AS checklist, u.nombre_completo AS inspector
+        FROM inspecciones i
+        LEFT JOIN checklists c ON c.id = i.checklist_id
+        LEFT JOIN usuarios u ON u.id = i.inspector_id
+        ORDER BY i.fecha_programada DESC
+    """,
+    "EPPs": "SELECT * FROM epp_catalogo ORDER BY nombre"
+}
+TABLAS_SCORECARD = [
+    "riesgos", "incidentes", "inspecciones", "capacitaciones",
+    "asistentes_capacitacion", "usuarios", "epp_asignaciones"
+]
+TABLAS_ANALISIS = {
+    "Análisis de Riesgos": ["riesgos"],
+    "Análisis de Incidentes": ["incidentes"],
+    "Análisis de Capacitaciones": ["capacitaciones", "asistentes_capacitacion"],
+    "Análisis por Área": ["riesgos", "incidentes", "inspecciones"]
+}
+
+
+def calcular_indices(accidentes_incap: float, dias_perdidos: float, horas_hombre: float) -> dict:
+    """
+    Calcula los índices de seguridad según DS 005-2012-TR
+
+    Returns:
+        dict: {"if": ..., "is": ..., "ia": ...} (0 si no hay horas-hombre)
+    """
+    if not horas_hombre or horas_hombre <= 0:
+        return {"if": 0.0, "is": 0.0, "ia": 0.0}
+
+    if_value = (accidentes_incap / horas_hombre) * 1000000
+    is_value = (dias_perdidos / horas_hombre) * 1000000
+    ia_value = (if_value * is_value) / 1000
+    return {"if": if_value, "is": is_value, "ia": ia_value}
+
+
+def consolidar_indices(df: pd.DataFrame, por: list) -> pd.DataFrame:
+    """
+    Agrupa el consolidado de v_indices_seguridad y recalcula IF/IS/IA
+    sobre los totales de cada grupo (no sobre el promedio de índices)
+    """
+    columnas = ["horas_trabajadas", "total_incidentes", "accidentes_incapacitantes", "dias_perdidos"]
+    datos = df.copy()
+    datos[columnas] = datos[columnas].apply(pd.to_numeric, errors="coerce").fillna(0)
+
+    agrupado = datos.groupby(por, as_index=False)[columnas].sum()
+    horas = agrupado["horas_trabajadas"].where(agrupado["horas_trabajadas"] > 0)
+    agrupado["IF"] = (agrupado["accidentes_incapacitantes"] / horas * 1000000).round(2)
+    agrupado["IS"] = (agrupado["dias_perdidos"] / horas * 1000000).round(2)
+    agrupado["IA"] = (agrupado["IF"] * agrupado["IS"] / 1000).round(2)
+    return agrupado
+
+
+def preparar_horas_hombre(df: pd.DataFrame) -> tuple:
+    """
+    Valida y normaliza un CSV de horas-hombre
+
+    Returns:
+        tuple: (registros válidos, DataFrame de errores por fila)
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    faltantes = [c for c in ["area", "periodo", "horas_trabajadas"] if c not in df.columns]
+    if faltantes:
+        errores = pd.DataFrame([{"fila": 0, "error": f"Columnas faltantes: {', '.join(faltantes)}"}])
+        return [], errores
+
+    if "numero_trabajadores" not in df.columns:
+        df["numero_trabajadores"] = None
+
+    df["area"] = df["area"].astype(str).str.strip()
+    df["periodo"] = pd.to_datetime(df["periodo"].astype(str).str.strip(), errors="coerce").dt.to_period("M").dt.to_timestamp()
+    df["horas_trabajadas"] = pd.to_numeric(df["horas_trabajadas"], errors="coerce")
+    df["numero_trabajadores"] = pd.to_numeric(df["numero_trabajadores"], errors="coerce")
+    df["fila"] = df.index + 2  # encabezado en la fila 1
+
+    motivos = pd.Series("", index=df.index)
+    motivos[df["area"].isin(["", "nan", "None"])] += "Área vacía. "
+    motivos[df["periodo"].isna()] += "Periodo inválido (usar AAAA-MM). "
+    motivos[df["horas_trabajadas"].isna() | (df["horas_trabajadas"] < 0)] += "Horas inválidas. "
+    motivos[df["numero_trabajadores"] < 0] += "Número de trabajadores inválido. "
+
+    errores = df.loc[motivos != "", ["fila"]].assign(error=motivos[motivos != ""].str.strip())
+    validos = df[motivos == ""].drop_duplicates(subset=["area", "periodo"], keep="last")
+
+    usuario = obtener_usuario_actual() or {}
+    registros = [
+        {
+            "area": fila.area,
+            "periodo": fila.periodo.date().isoformat(),
+            "horas_trabajadas": float(fila.horas_trabajadas),
+            "numero_trabajadores": None if pd.isna(fila.numero_trabajadores) else int(fila.numero_trabajadores),
+            "registrado_por": usuario.get("id")
+        }
+        for fila in validos.itertuples(index=False)
+    ]
+    return registros, errores
+
+
+def calcular_kpis_resumen() -> dict:
+    """KPI agregados del resumen ejecutivo (consultas agregadas sobre el espejo local)"""
+    espejo = get_espejo_local()
+    
+    def contar(tabla: str, condicion: str) -> tuple:
+        df = espejo.consultar(f"SELECT COUNT(*) AS total, COALESCE(SUM({condicion}), 0) AS parcial FROM {tabla}")
+        return (int(df.iloc[0]["total"]), int(df.iloc[0]["parcial"])) if not df.empty else (0, 0)
+    
+    total_riesgos, riesgos_criticos = contar("riesgos", "clasificacion IN ('Alto', 'Crítico')")
+    total_incidentes, accidentes = contar("incidentes", "tipo LIKE '%Accidente%'")
+    total_capacitaciones, cap_realizadas = contar("capacitaciones", "estado = 'realizada'")
+    total_inspecciones, insp_completadas = contar("inspecciones", "estado = 'completada'")
+    
+    por_mes = espejo.consultar(
+        "SELECT strftime('%Y-%m', fecha_hora) AS mes, COUNT(*) AS cantidad "
+        "FROM incidentes GROUP BY mes ORDER BY mes"
+    )
+    tendencia = {fila.mes: int(fila.cantidad) for fila in por_mes.itertuples(index=False)}
+    
+    return {
+        "total_riesgos": total_riesgos,
+        "riesgos_criticos": riesgos_criticos,
+        "total_incidentes": total_incidentes,
+        "accidentes": accidentes,
+        "total_capacitaciones": total_capacitaciones,
+        "cap_realizadas": cap_realizadas,
+        "total_inspecciones": total_inspecciones,
+        "insp_completadas": insp_completadas,
+        "tendencia_incidentes": tendencia,
+        "indices": espejo.indices_seguridad().to_dict("records")
+    }
 
 
 def reporte_ejecutivo():
     """Reporte ejecutivo del sistema SST"""
     st.subheader("📊 Resumen Ejecutivo")
     
-    supabase = get_supabase_client()
-    
-    # Obtener datos
-    riesgos = supabase.listar_riesgos()
-    incidentes = supabase.listar_incidentes()
-    capacitaciones = supabase.listar_capacitaciones()
-    inspecciones = supabase.listar_inspecciones()
+    # Agregados SQL sobre el espejo local: no consultan la base de producción
+    kpis = calcular_kpis_resumen()
 
     # Métricas principales
     col1, col2, col3, col4 = st.columns(4)
 
     with col1:
-        st.metric("Total Riesgos", len(riesgos))
-        riesgos_criticos = len([r for r in riesgos if r.get("clasificacion") in ["Alto", "Crítico"]])
-        st.metric("Riesgos Críticos", riesgos_criticos)
+        st.metric("Total Riesgos", kpis["total_riesgos"])
+        st.metric("Riesgos Críticos", kpis["riesgos_criticos"])
 
     with col2:
-        st.metric("Total Incidentes", len(incidentes))
-        accidentes = len([i for i in incidentes if "Accidente" in i.get("tipo", "")])
-        st.metric("Accidentes", accidentes)
+        st.metric("Total Incidentes", kpis["total_incidentes"])
+        st.metric("Accidentes", kpis["accidentes"])
 
     with col3:
-        st.metric("Capacitaciones", len(capacitaciones))
-        cap_realizadas = len([c for c in capacitaciones if c.get("estado") == "realizada"])
-        st.metric("Realizadas", cap_realizadas)
+        st.metric("Capacitaciones", kpis["total_capacitaciones"])
+        st.metric("Realizadas", kpis["cap_realizadas"])
     
     with col4:
-        st.metric("Inspecciones", len(inspecciones))
-        insp_completadas = len([i for i in inspecciones if i.get("estado") == "completada"])
-        st.metric("Completadas", insp_completadas)
+        st.metric("Inspecciones", kpis["total_inspecciones"])
+        st.metric("Completadas", kpis["insp_completadas"])
     
     # Gráficos de resumen
     st.markdown("### 📈 Tendencias")
     
-    if incidentes:
-        df_inc = pd.DataFrame(incidentes)
-        df_inc["fecha"] = pd.to_datetime(df_inc["fecha_hora"]).dt.date
-        inc_por_mes = df_inc.groupby(pd.to_datetime(df_inc["fecha_hora"]).dt.to_period("M")).size()
-        
+    tendencia = kpis["tendencia_incidentes"]
+    if tendencia:
         fig = px.line(
-            x=inc_por_mes.index.astype(str),
-            y=inc_por_mes.values,
+            x=list(tendencia.keys()),
+            y=list(tendencia.values()),
             title="Tendencia de Incidentes por Mes",
             labels={"x": "Mes", "y": "Cantidad"}
         )
         st.plotly_chart(fig, width='stretch')
 
+    # PDF del resumen
+    if st.button("📄 Generar PDF del Resumen"):
+        datos_pdf = {
+            "fecha_corte": date.today(),
+            "metricas": [
+                ['Total Riesgos', str(kpis["total_riesgos"])],
+                ['Riesgos Críticos', str(kpis["riesgos_criticos"])],
+                ['Total Incidentes', str(kpis["total_incidentes"])],
+                ['Accidentes', str(kpis["accidentes"])],
+                ['Capacitaciones', str(kpis["total_capacitaciones"])],
+                ['Capacitaciones Realizadas', str(kpis["cap_realizadas"])],
+                ['Inspecciones', str(kpis["total_inspecciones"])],
+                ['Inspecciones Completadas', str(kpis["insp_completadas"])]
+            ]
+        }
+        if tendencia:
+            datos_pdf["tendencia"] = [[mes, str(cantidad)] for mes, cantidad in tendencia.items()]
+        
+        from utils.pdf_reportes import generar_reporte
+        
+        with st.spinner("Generando PDF..."):
+            resultado = obtener_o_generar(
+                "resumen_ejecutivo_pdf",
+                {"fecha_corte": date.today()},
+                TABLAS_RESUMEN,
+                lambda: generar_reporte("resumen_ejecutivo", datos_pdf),
+                "pdf",
+                nombre_descarga=f"resumen_ejecutivo_{date.today().strftime('%Y%m%d')}.pdf"
+            )
+        if resultado:
+            if resultado["reutilizado"]:
+                st.caption(describir_snapshot(resultado))
+            boton_descarga("⬇️ Descargar Resumen PDF", resultado["url"])
+    
+    indices = kpis["indices"]
+    if indices:
+        df_indices = consolidar_indices(pd.DataFrame(indices), ["periodo"])
+        df_indices = df_indices[df_indices["horas_trabajadas"] > 0]
+        if not df_indices.empty:
+            fig = px.line(
+                df_indices,
+                x="periodo",
+                y=["IF", "IS"],
+                title="Tendencia de Índices de Frecuencia y Severidad",
+                labels={"periodo": "Mes", "value": "Índice", "variable": "Índice"}
+            )
+            st.plotly_chart(fig, width='stretch')
+
 
 def reporte_legal_sunafil():
     """Reporte legal para SUNAFIL"""
     st.subheader("📋 Reporte Legal SUNAFIL")
     st.markdown("**Reporte según Ley 29783 y DS 005-2012-TR**")
     
-    supabase = get_supabase_client()
-    
     # Filtros de fecha
     col1, col2 = st.columns(2)
     with col1:
@@ -94,10 +293,18 @@ def reporte_legal_sunafil():
     
     st.markdown("### 2. Estadísticas de Seguridad")
     
-    incidentes = supabase.listar_incidentes()
+    # Consultas de reporte sobre el espejo local, no sobre la base de producción
+    espejo = get_espejo_local()
+    df = espejo.leer_tabla("incidentes")
+    horas_manuales = None
+    
+    # Valores del reporte sin incidentes registrados (los exportadores los leen igual)
+    total_incidentes, accidentes_incap, dias_perdidos = 0, 0, 0
+    df_filtrado, incidentes_tipo, indices_area = pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+    horas_hombre = 0.0
     
-    if incidentes:
-        df = pd.DataFrame(incidentes)
+    if not df.empty:
+        df["dias_descanso_medico"] = pd.to_numeric(df["dias_descanso_medico"], errors="coerce").fillna(0)
         df["fecha"] = pd.to_datetime(df["fecha_hora"]).dt.date
         
         # Filtrar por rango de fechas
@@ -126,24 +333,52 @@ def reporte_legal_sunafil():
         # Índices de seguridad
         st.markdown("### 4. Índices de Seguridad")
         
-        # Solicitar horas hombre trabajadas
-        horas_hombre = st.number_input("Horas Hombre Trabajadas en el Período", min_value=1, value=100000)
+        # Horas hombre del registro mensual por área
+        filtros_periodo = {
+            "periodo_desde": fecha_inicio.replace(day=1).isoformat(),
+            "periodo_hasta": fecha_fin.replace(day=1).isoformat()
+        }
+        horas_registradas = espejo.leer_tabla("horas_hombre")
+        if not horas_registradas.empty:
+            periodo = horas_registradas["periodo"].str[:10]
+            horas_registradas = horas_registradas[
+                (periodo >= filtros_periodo["periodo_desde"]) & (periodo <= filtros_periodo["periodo_hasta"])
+            ]
+            horas_hombre = float(pd.to_numeric(horas_registradas["horas_trabajadas"], errors="coerce").sum())
         
         if horas_hombre > 0:
+            st.caption(f"Horas-hombre del registro: {horas_hombre:,.0f} ({len(horas_registradas)} registros área/mes)")
+        else:
+            st.warning("No hay horas-hombre registradas para el período. Impórtalas en la pestaña ⏱️ Horas-Hombre.")
+            horas_hombre = st.number_input("Horas Hombre Trabajadas en el Período", min_value=1, value=100000)
+            horas_manuales = horas_hombre
+        
+        if horas_hombre > 0:
+            indices = calcular_indices(accidentes_incap, dias_perdidos, horas_hombre)
+            if_value, is_value, ia_value = indices["if"], indices["is"], indices["ia"]
+            
             # Índice de Frecuencia
-            if_value = (accidentes_incap / horas_hombre) * 1000000
             st.metric("Índice de Frecuencia (IF)", f"{if_value:.2f}")
             st.caption("IF = (Nº Accidentes Incapacitantes / HH Trabajadas) × 1,000,000")
             
             # Índice de Severidad
-            is_value = (dias_perdidos / horas_hombre) * 1000000
             st.metric("Índice de Severidad (IS)", f"{is_value:.2f}")
             st.caption("IS = (Días Perdidos / HH Trabajadas) × 1,000,000")
             
             # Índice de Accidentabilidad
-            ia_value = (if_value * is_value) / 1000
             st.metric("Índice de Accidentabilidad (IA)", f"{ia_value:.2f}")
             st.caption("IA = (IF × IS) / 1,000")
+        
+        # Índices por área (consolidado mensual del período)
+        consolidado = espejo.indices_seguridad(filtros_periodo["periodo_desde"], filtros_periodo["periodo_hasta"])
+        if not consolidado.empty:
+            st.markdown("### 5. Índices por Área")
+            indices_area = consolidar_indices(consolidado, ["area"])
+            indices_area.columns = [
+                "Área", "HH Trabajadas", "Incidentes", "Acc. Incapacitantes",
+                "Días Perdidos", "IF", "IS", "IA"
+            ]
+            st.dataframe(indices_area, hide_index=True)
     
     # Botones de descarga directa
     st.markdown("### 📥 Exportar Reporte")
@@ -151,288 +386,534 @@ def reporte_legal_sunafil():
     col1, col2 = st.columns(2)
     
     # Generar Excel
-    excel_buffer = io.BytesIO()
-    with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-        # Hoja 1: Información General
-        info_general = pd.DataFrame({
-            "Campo": ["Razón Social", "RUC", "Dirección", "Sector", "Actividad Económica", "Período Desde", "Período Hasta"],
-            "Valor": [
-                REPORTES_CONFIG['empresa'],
-                REPORTES_CONFIG['ruc'],
-                REPORTES_CONFIG['direccion'],
-                REPORTES_CONFIG['sector'],
-                REPORTES_CONFIG['actividad_economica'],
-                str(fecha_inicio),
-                str(fecha_fin)
-            ]
-        })
-        info_general.to_excel(writer, sheet_name="Información General", index=False)
-        
-        # Hoja 2: Estadísticas
-        if incidentes:
-            estadisticas = pd.DataFrame({
-                "Indicador": ["Total Incidentes", "Accidentes Incapacitantes", "Días Perdidos"],
-                "Valor": [total_incidentes, accidentes_incap, int(dias_perdidos)]
+    def generar_excel() -> str:
+        """Excel del reporte SUNAFIL (archivo temporal)"""
+        fd, ruta_excel = tempfile.mkstemp(suffix=".xlsx", prefix="sst_")
+        os.close(fd)
+        with pd.ExcelWriter(ruta_excel, engine='openpyxl') as writer:
+            # Hoja 1: Información General
+            info_general = pd.DataFrame({
+                "Campo": ["Razón Social", "RUC", "Dirección", "Sector", "Actividad Económica", "Período Desde", "Período Hasta"],
+                "Valor": [
+                    REPORTES_CONFIG['empresa'],
+                    REPORTES_CONFIG['ruc'],
+                    REPORTES_CONFIG['direccion'],
+                    REPORTES_CONFIG['sector'],
+                    REPORTES_CONFIG['actividad_economica'],
+                    str(fecha_inicio),
+                    str(fecha_fin)
+                ]
             })
-            estadisticas.to_excel(writer, sheet_name="Estadísticas", index=False)
+            info_general.to_excel(writer, sheet_name="Información General", index=False)
+        
+            # Hoja 2: Estadísticas
+            if not df.empty:
+                estadisticas = pd.DataFrame({
+                    "Indicador": ["Total Incidentes", "Accidentes Incapacitantes", "Días Perdidos"],
+                    "Valor": [total_incidentes, accidentes_incap, int(dias_perdidos)]
+                })
+                estadisticas.to_excel(writer, sheet_name="Estadísticas", index=False)
+            
+                # Hoja 3: Incidentes por Tipo
+                incidentes_tipo.to_excel(writer, sheet_name="Incidentes por Tipo", index=False)
             
-            # Hoja 3: Incidentes por Tipo
-            incidentes_tipo.to_excel(writer, sheet_name="Incidentes por Tipo", index=False)
+                # Hoja 4: Detalle de Incidentes
+                df_filtrado.to_excel(writer, sheet_name="Detalle Incidentes", index=False)
             
-            # Hoja 4: Detalle de Incidentes
-            df_filtrado.to_excel(writer, sheet_name="Detalle Incidentes", index=False)
+                # Hoja 5: Índices por Área
+                if not indices_area.empty:
+                    indices_area.to_excel(writer, sheet_name="Índices por Área", index=False)
     
-    excel_buffer.seek(0)
+        return ruta_excel
     
     # Generar PDF
-    pdf_buffer = io.BytesIO()
-    doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Título
-    title = Paragraph("<b>REPORTE LEGAL SUNAFIL</b>", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 12))
-    
-    # Subtítulo
-    subtitle = Paragraph(f"Período: {fecha_inicio} al {fecha_fin}", styles['Heading2'])
-    elements.append(subtitle)
-    elements.append(Spacer(1, 12))
-    
-    # Información de la empresa
-    empresa_data = [
-        ['Campo', 'Valor'],
-        ['Razón Social', REPORTES_CONFIG['empresa']],
-        ['RUC', REPORTES_CONFIG['ruc']],
-        ['Dirección', REPORTES_CONFIG['direccion']],
-        ['Sector', REPORTES_CONFIG['sector']],
-        ['Actividad Económica', REPORTES_CONFIG['actividad_economica']]
-    ]
-    
-    empresa_table = Table(empresa_data, colWidths=[200, 300])
-    empresa_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(empresa_table)
-    elements.append(Spacer(1, 20))
-    
-    # Estadísticas
-    if incidentes:
-        stats_title = Paragraph("<b>Estadísticas de Seguridad</b>", styles['Heading2'])
-        elements.append(stats_title)
-        elements.append(Spacer(1, 12))
-        
-        stats_data = [
-            ['Indicador', 'Valor'],
-            ['Total Incidentes', str(total_incidentes)],
-            ['Accidentes Incapacitantes', str(accidentes_incap)],
-            ['Días Perdidos', str(int(dias_perdidos))]
-        ]
+    def generar_pdf() -> str:
+        """PDF del reporte SUNAFIL (archivo temporal)"""
+        from utils.pdf_reportes import generar_reporte
         
-        if horas_hombre > 0:
-            stats_data.append(['Índice de Frecuencia (IF)', f"{if_value:.2f}"])
-            stats_data.append(['Índice de Severidad (IS)', f"{is_value:.2f}"])
-            stats_data.append(['Índice de Accidentabilidad (IA)', f"{ia_value:.2f}"])
-        
-        stats_table = Table(stats_data, colWidths=[300, 200])
-        stats_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(stats_table)
-        elements.append(Spacer(1, 20))
-        
-        # Incidentes por tipo
-        tipo_title = Paragraph("<b>Incidentes por Tipo</b>", styles['Heading2'])
-        elements.append(tipo_title)
-        elements.append(Spacer(1, 12))
-        
-        tipo_data = [['Tipo', 'Cantidad']]
-        for _, row in incidentes_tipo.iterrows():
-            tipo_data.append([str(row['Tipo']), str(row['Cantidad'])])
-        
-        tipo_table = Table(tipo_data, colWidths=[300, 200])
-        tipo_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 12),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black)
-        ]))
-        elements.append(tipo_table)
+        datos_pdf = {"fecha_inicio": fecha_inicio, "fecha_fin": fecha_fin}
+        if not df.empty:
+            datos_pdf["estadisticas"] = [
+                ['Total Incidentes', str(total_incidentes)],
+                ['Accidentes Incapacitantes', str(accidentes_incap)],
+                ['Días Perdidos', str(int(dias_perdidos))]
+            ]
+            if horas_hombre > 0:
+                datos_pdf["estadisticas"] += [
+                    ['Índice de Frecuencia (IF)', f"{if_value:.2f}"],
+                    ['Índice de Severidad (IS)', f"{is_value:.2f}"],
+                    ['Índice de Accidentabilidad (IA)', f"{ia_value:.2f}"]
+                ]
+            datos_pdf["incidentes_tipo"] = [[str(t), str(c)] for t, c in incidentes_tipo.values.tolist()]
+            datos_pdf["indices_area"] = indices_area
+            datos_pdf["detalle"] = df_filtrado.to_dict("records")
+        
+        return generar_reporte("sunafil", datos_pdf)
     
-    # Generar PDF
-    doc.build(elements)
-    pdf_buffer.seek(0)
+    # Reutilizar snapshots si los datos del período no cambiaron
+    parametros = {
+        "fecha_inicio": fecha_inicio,
+        "fecha_fin": fecha_fin,
+        "horas_manuales": horas_manuales
+    }
+    nombre_base = f"reporte_sunafil_{fecha_inicio.strftime('%Y%m%d')}_{fecha_fin.strftime('%Y%m%d')}"
     
-    # Botones de descarga directa
     with col1:
-        st.download_button(
-            label="📥 Descargar Excel",
-            data=excel_buffer,
-            file_name=f"reporte_sunafil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            width='stretch'
+        if st.button("📥 Generar Excel", width='stretch'):
+            with st.spinner("Generando Excel..."):
+                resultado = obtener_o_generar("sunafil_excel", parametros, TABLAS_SUNAFIL,
+                                              generar_excel, "xlsx", nombre_descarga=f"{nombre_base}.xlsx")
+            if resultado:
+                if resultado["reutilizado"]:
+                    st.caption(describir_snapshot(resultado))
+                boton_descarga("⬇️ Descargar Excel", resultado["url"], width='stretch')
+    
+    with col2:
+        if st.button("📄 Generar PDF", width='stretch'):
+            with st.spinner("Generando PDF..."):
+                resultado = obtener_o_generar("sunafil_pdf", parametros, TABLAS_SUNAFIL,
+                                              generar_pdf, "pdf", nombre_descarga=f"{nombre_base}.pdf")
+            if resultado:
+                if resultado["reutilizado"]:
+                    st.caption(describir_snapshot(resultado))
+                boton_descarga("⬇️ Descargar PDF", resultado["url"], width='stretch')
+
+
+def construir_analisis(tipo_analisis: str) -> Optional[dict]:
+    """Figuras del análisis estadístico seleccionado (SQL sobre el motor analítico)"""
+    motor = get_motor_analitico()
+    
+    if tipo_analisis == "Análisis de Riesgos":
+        por_clasificacion = motor.consultar(
+            "SELECT clasificacion, COUNT(*) AS cantidad FROM riesgos GROUP BY clasificacion"
+        )
+        
+        if por_clasificacion.empty:
+            return None
+        
+        por_area = motor.consultar(
+            "SELECT area, COUNT(*) AS cantidad FROM riesgos GROUP BY area ORDER BY cantidad DESC"
+        )
+        cruce = motor.consultar(
+            "SELECT tipo_riesgo, clasificacion, COUNT(*) AS cantidad FROM riesgos GROUP BY ALL"
+        )
+        
+        # Mapa de calor
+        pivot = cruce.pivot(index="tipo_riesgo", columns="clasificacion", values="cantidad").fillna(0)
+        
+        return {
+            "figuras": {
+                # Distribución por clasificación
+                "clasificacion": px.pie(por_clasificacion, names="clasificacion", values="cantidad",
+                                        title="Distribución por Clasificación"),
+                # Riesgos por área
+                "area": px.bar(por_area, x="area", y="cantidad", title="Riesgos por Área"),
+                "heatmap": px.imshow(
+                    pivot,
+                    title="Mapa de Calor: Tipo de Riesgo vs Clasificación",
+                    color_continuous_scale="RdYlGn_r"
+                )
+            }
+        }
+    
+    if tipo_analisis == "Análisis de Incidentes":
+        # Tendencia temporal con media móvil de 3 meses
+        inc_por_mes = motor.consultar("""
+            SELECT strftime(date_trunc('month', fecha_hora), '%Y-%m') AS mes,
+                   COUNT(*) AS cantidad,
+                   ROUND(AVG(COUNT(*)) OVER (ORDER BY date_trunc('month', fecha_hora)
+                                             ROWS BETWEEN 2 PRECEDING AND CURRENT ROW), 2) AS media_movil
+            FROM incidentes
+            GROUP BY date_trunc('month', fecha_hora)
+            ORDER BY mes
+        """)
+        
+        if inc_por_mes.empty:
+            return None
+        
+        por_tipo = motor.consultar(
+            "SELECT tipo, COUNT(*) AS cantidad FROM incidentes GROUP BY tipo ORDER BY cantidad DESC"
+        )
+        por_area = motor.consultar(
+            "SELECT area, COUNT(*) AS cantidad FROM incidentes GROUP BY area ORDER BY cantidad DESC"
+        )
+        
+        return {
+            "figuras": {
+                "tendencia": px.line(
+                    inc_por_mes,
+                    x="mes",
+                    y=["cantidad", "media_movil"],
+                    title="Tendencia de Incidentes por Mes (media móvil 3 meses)"
+                ),
+                # Por tipo
+                "tipo": px.bar(por_tipo, x="tipo", y="cantidad", title="Incidentes por Tipo"),
+                # Por área
+                "area": px.bar(por_area, x="area", y="cantidad", title="Incidentes por Área")
+            }
+        }
+    
+    if tipo_analisis == "Análisis de Capacitaciones":
+        resumen = motor.consultar("""
+            SELECT COUNT(*) AS programadas,
+                   COUNT(*) FILTER (WHERE estado = 'realizada') AS realizadas,
+                   SUM(duracion_horas) FILTER (WHERE estado = 'realizada') AS horas
+            FROM capacitaciones
+        """)
+        
+        if resumen.empty or not resumen.iloc[0]["programadas"]:
+            return None
+        
+        asistencia = motor.consultar("""
+            SELECT c.tipo,
+                   COUNT(a.id) AS convocados,
+                   COUNT(a.id) FILTER (WHERE a.asistio) AS asistentes,
+                   ROUND(100.0 * COUNT(a.id) FILTER (WHERE a.asistio) / NULLIF(COUNT(a.id), 0), 1) AS tasa_asistencia,
+                   ROUND(AVG(a.puntaje_evaluacion), 2) AS puntaje_promedio
+            FROM capacitaciones c
+            JOIN asistentes_capacitacion a ON a.capacitacion_id = c.id
+            WHERE c.estado = 'realizada'
+            GROUP BY c.tipo
+            ORDER BY convocados DESC
+        """)
+        por_mes = motor.consultar("""
+            SELECT strftime(date_trunc('month', fecha_programada), '%Y-%m') AS mes, estado, COUNT(*) AS cantidad
+            FROM capacitaciones
+            GROUP BY ALL
+            ORDER BY mes
+        """)
+        por_tipo = motor.consultar("""
+            SELECT tipo, COUNT(*) AS cantidad, SUM(COALESCE(duracion_horas, 0)) AS horas
+            FROM capacitaciones
+            WHERE estado = 'realizada'
+            GROUP BY tipo
+            ORDER BY horas DESC
+        """)
+        
+        fila = resumen.iloc[0]
+        convocados = int(asistencia["convocados"].sum()) if not asistencia.empty else 0
+        presentes = int(asistencia["asistentes"].sum()) if not asistencia.empty else 0
+        
+        return {
+            "metricas": {
+                "programadas": int(fila["programadas"]),
+                "realizadas": int(fila["realizadas"]),
+                "horas": float(fila["horas"] or 0),
+                "tasa_asistencia": (presentes / convocados * 100) if convocados else 0.0
+            },
+            "asistencia": asistencia,
+            "figuras": {
+                "tendencia": px.bar(por_mes, x="mes", y="cantidad", color="estado",
+                                    title="Capacitaciones por Mes y Estado"),
+                "horas": px.bar(por_tipo, x="tipo", y="horas", title="Horas de Capacitación por Tipo")
+            }
+        }
+    
+    if tipo_analisis == "Análisis por Área":
+        # Ventana de los últimos 12 meses
+        incidentes_mes = motor.consultar("""
+            SELECT area, strftime(date_trunc('month', fecha_hora), '%Y-%m') AS mes, COUNT(*) AS cantidad
+            FROM incidentes
+            WHERE fecha_hora >= date_trunc('month', current_date) - INTERVAL 11 MONTH
+            GROUP BY ALL
+        """)
+        riesgos_area = motor.consultar(
+            "SELECT area, clasificacion, COUNT(*) AS cantidad FROM riesgos GROUP BY ALL"
         )
+        
+        if incidentes_mes.empty and riesgos_area.empty:
+            return None
+        
+        figuras = {}
+        if not incidentes_mes.empty:
+            pivot = incidentes_mes.pivot(index="area", columns="mes", values="cantidad").fillna(0)
+            figuras["incidentes_mes"] = px.imshow(
+                pivot, title="Incidentes por Área y Mes (últimos 12 meses)",
+                color_continuous_scale="Reds", aspect="auto"
+            )
+        if not riesgos_area.empty:
+            figuras["riesgos_area"] = px.bar(
+                riesgos_area, x="area", y="cantidad", color="clasificacion",
+                title="Riesgos por Área y Clasificación"
+            )
+        return {"figuras": figuras}
+    
+    return None
+
+
+def desglose_dimensiones():
+    """Desglose libre por área × mes × tipo con filtros de profundización"""
+    motor = get_motor_analitico()
     
+    col1, col2, col3 = st.columns([1, 2, 2])
+    with col1:
+        tabla = st.selectbox("Datos", list(DESGLOSES.keys()), format_func=str.capitalize)
+    disponibles = list(DESGLOSES[tabla]["dimensiones"].keys())
     with col2:
-        st.download_button(
-            label="📄 Descargar PDF",
-            data=pdf_buffer,
-            file_name=f"reporte_sunafil_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-            mime="application/pdf",
-            width='stretch'
+        dimensiones = st.multiselect("Agrupar por", disponibles,
+                                     default=[d for d in ["area", "mes"] if d in disponibles])
+    with col3:
+        rango = st.date_input("Período", value=(date.today() - timedelta(days=365), date.today()))
+    
+    desde, hasta = (rango[0].isoformat(), rango[1].isoformat()) if len(rango) == 2 else (None, None)
+    
+    # Profundizar: fijar el valor de las dimensiones que no se agrupan
+    filtros = {}
+    libres = [d for d in disponibles if d not in dimensiones and d != "mes"]
+    if libres:
+        columnas = st.columns(len(libres))
+        for columna, dimension in zip(columnas, libres):
+            valores = motor.desglose(tabla, [dimension], desde, hasta)
+            opciones = ["Todos"] + ([str(v) for v in valores[dimension].dropna()] if not valores.empty else [])
+            with columna:
+                valor = st.selectbox(dimension.capitalize(), opciones, key=f"desglose_{tabla}_{dimension}")
+            if valor != "Todos":
+                filtros[dimension] = valor
+    
+    resultado = motor.desglose(tabla, dimensiones, desde, hasta, filtros)
+    
+    if resultado.empty:
+        st.info("Sin datos para el desglose seleccionado")
+        return
+    
+    st.dataframe(resultado, hide_index=True, width='stretch')
+    
+    if dimensiones:
+        medida = list(DESGLOSES[tabla]["medidas"].keys())[0]
+        fig = px.bar(
+            resultado, x=dimensiones[0], y=medida,
+            color=dimensiones[1] if len(dimensiones) > 1 else None,
+            title=f"{tabla.capitalize()}: {medida} por {' × '.join(dimensiones)}"
         )
+        st.plotly_chart(fig, width='stretch')
+
+
+def scorecard_por_area():
+    """Scorecard de todas las áreas para un período (memorizado por período y versión del espejo)"""
+    col1, col2 = st.columns(2)
+    with col1:
+        inicio = st.date_input("Desde", value=date.today().replace(day=1) - timedelta(days=335),
+                               key="scorecard_desde")
+    with col2:
+        fin = st.date_input("Hasta", value=date.today(), key="scorecard_hasta")
+    
+    # Períodos de meses completos: la caché se reutiliza dentro del mismo mes
+    desde = inicio.replace(day=1).isoformat()
+    hasta = fin.isoformat()
+    
+    espejo = get_espejo_local()
+    datos = memorizar_figuras(
+        "scorecard_areas",
+        [espejo.version_tabla(tabla) for tabla in TABLAS_SCORECARD],
+        lambda: {"scorecard": scorecard_areas(desde, hasta)},
+        {"desde": desde, "hasta": hasta}
+    )
+    scorecard = datos["scorecard"]
+    
+    if scorecard.empty:
+        st.info("Sin datos para el scorecard del período")
+        return
+    
+    st.markdown(f"#### Scorecard por Área ({len(scorecard)} áreas)")
+    st.dataframe(
+        scorecard.rename(columns={
+            "area": "Área",
+            "riesgos_vigentes": "Riesgos Vigentes",
+            "riesgos_altos": "Altos/Críticos",
+            "incidentes": "Incidentes",
+            "accidentes": "Accidentes",
+            "dias_perdidos": "Días Perdidos",
+            "inspecciones": "Inspecciones",
+            "cumplimiento": "Cumplimiento (%)",
+            "horas_capacitacion": "HH Capacitación",
+            "epp_vencidos": "EPP Vencidos",
+            "epp_por_vencer": "EPP por Vencer (30 d)"
+        }),
+        hide_index=True,
+        width='stretch'
+    )
 
 
 def analisis_estadistico():
     """Análisis estadístico avanzado"""
     st.subheader("📊 Análisis Estadístico")
     
-    supabase = get_supabase_client()
-    
     # Selector de análisis
     tipo_analisis = st.selectbox("Tipo de Análisis", [
         "Análisis de Riesgos",
         "Análisis de Incidentes",
         "Análisis de Capacitaciones",
-        "Análisis por Área"
+        "Análisis por Área",
+        "Desglose por Dimensiones"
     ])
     
+    if tipo_analisis == "Desglose por Dimensiones":
+        desglose_dimensiones()
+        return
+    
+    if tipo_analisis == "Análisis por Área":
+        scorecard_por_area()
+    
+    # La versión es la del espejo local, que es de donde leen las consultas
+    espejo = get_espejo_local()
+    datos = memorizar_figuras(
+        "analisis_estadistico",
+        [espejo.version_tabla(tabla) for tabla in TABLAS_ANALISIS[tipo_analisis]],
+        lambda: construir_analisis(tipo_analisis),
+        {"tipo_analisis": tipo_analisis}
+    )
+    
+    if not datos:
+        st.info("Sin datos para el análisis seleccionado")
+        return
+    
+    figuras = datos["figuras"]
+    
     if tipo_analisis == "Análisis de Riesgos":
-        riesgos = supabase.listar_riesgos()
+        col1, col2 = st.columns(2)
         
-        if riesgos:
-            df = pd.DataFrame(riesgos)
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Distribución por clasificación
-                fig = px.pie(df, names="clasificacion", title="Distribución por Clasificación")
-                st.plotly_chart(fig, width='stretch')
-            
-            with col2:
-                # Riesgos por área
-                fig = px.bar(
-                    df["area"].value_counts().reset_index(),
-                    x="area", y="count",
-                    title="Riesgos por Área"
-                )
-                st.plotly_chart(fig, width='stretch')
-            
-            # Mapa de calor
-            pivot = pd.crosstab(df["tipo_riesgo"], df["clasificacion"])
-            fig = px.imshow(
-                pivot,
-                title="Mapa de Calor: Tipo de Riesgo vs Clasificación",
-                color_continuous_scale="RdYlGn_r"
-            )
-            st.plotly_chart(fig, width='stretch')
+        with col1:
+            st.plotly_chart(figuras["clasificacion"], width='stretch')
+        
+        with col2:
+            st.plotly_chart(figuras["area"], width='stretch')
+        
+        st.plotly_chart(figuras["heatmap"], width='stretch')
     
     elif tipo_analisis == "Análisis de Incidentes":
-        incidentes = supabase.listar_incidentes()
+        st.plotly_chart(figuras["tendencia"], width='stretch')
         
-        if incidentes:
-            df = pd.DataFrame(incidentes)
-            df["fecha"] = pd.to_datetime(df["fecha_hora"]).dt.date
-            df["mes"] = pd.to_datetime(df["fecha_hora"]).dt.to_period("M")
-            
-            # Tendencia temporal
-            inc_por_mes = df.groupby("mes").size().reset_index(name="cantidad")
-            fig = px.line(
-                inc_por_mes,
-                x="mes",
-                y="cantidad",
-                title="Tendencia de Incidentes por Mes"
-            )
-            st.plotly_chart(fig, width='stretch')
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                # Por tipo
-                fig = px.bar(
-                    df["tipo"].value_counts().reset_index(),
-                    x="tipo", y="count",
-                    title="Incidentes por Tipo"
-                )
-                st.plotly_chart(fig, width='stretch')
-            
-            with col2:
-                # Por área
-                fig = px.bar(
-                    df["area"].value_counts().reset_index(),
-                    x="area", y="count",
-                    title="Incidentes por Área"
-                )
-                st.plotly_chart(fig, width='stretch')
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.plotly_chart(figuras["tipo"], width='stretch')
+        
+        with col2:
+            st.plotly_chart(figuras["area"], width='stretch')
+    
+    elif tipo_analisis == "Análisis de Capacitaciones":
+        metricas = datos["metricas"]
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Programadas", metricas["programadas"])
+        col2.metric("Realizadas", metricas["realizadas"])
+        col3.metric("Horas Impartidas", f"{metricas['horas']:,.1f}")
+        col4.metric("Asistencia", f"{metricas['tasa_asistencia']:.1f}%")
+        
+        st.plotly_chart(figuras["tendencia"], width='stretch')
+        st.plotly_chart(figuras["horas"], width='stretch')
+        
+        if not datos["asistencia"].empty:
+            st.markdown("#### Asistencia por Tipo")
+            st.dataframe(datos["asistencia"], hide_index=True, width='stretch')
+    
+    elif tipo_analisis == "Análisis por Área":
+        for figura in figuras.values():
+            st.plotly_chart(figura, width='stretch')
 
 
 def exportar_excel():
     """Exportar datos a Excel"""
     st.subheader("📥 Exportar Datos a Excel")
     
-    supabase = get_supabase_client()
-    
-    opciones = st.multiselect("Selecciona los datos a exportar", [
-        "Riesgos",
-        "Incidentes",
-        "Capacitaciones",
-        "Inspecciones",
-        "EPPs"
-    ])
+    opciones = st.multiselect("Selecciona los datos a exportar", list(CONSULTAS_EXPORTACION.keys()))
     
     if st.button("Generar Excel"):
         if not opciones:
             st.error("Selecciona al menos una opción")
         else:
-            with st.spinner("Generando archivo..."):
-                # Crear archivo Excel en memoria
-                excel_buffer = io.BytesIO()
+            def generar_excel() -> str:
+                """Excel con las hojas seleccionadas, leídas del espejo local (archivo temporal)"""
+                espejo = get_espejo_local()
+                fd, ruta_excel = tempfile.mkstemp(suffix=".xlsx", prefix="sst_")
+                os.close(fd)
                 
-                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                    if "Riesgos" in opciones:
-                        riesgos = supabase.listar_riesgos()
-                        if riesgos:
-                            pd.DataFrame(riesgos).to_excel(writer, sheet_name="Riesgos", index=False)
+                with pd.ExcelWriter(ruta_excel, engine='openpyxl') as writer:
+                    for hoja in opciones:
+                        df = espejo.consultar(CONSULTAS_EXPORTACION[hoja])
+                        if not df.empty:
+                            df.to_excel(writer, sheet_name=hoja, index=False)
                     
-                    if "Incidentes" in opciones:
-                        incidentes = supabase.listar_incidentes()
-                        if incidentes:
-                            pd.DataFrame(incidentes).to_excel(writer, sheet_name="Incidentes", index=False)
-                    
-                    if "Capacitaciones" in opciones:
-                        capacitaciones = supabase.listar_capacitaciones()
-                        if capacitaciones:
-                            pd.DataFrame(capacitaciones).to_excel(writer, sheet_name="Capacitaciones", index=False)
-                
-                excel_buffer.seek(0)
+                    # openpyxl exige al menos una hoja
+                    if not writer.sheets:
+                        pd.DataFrame({"Mensaje": ["Sin datos para exportar"]}).to_excel(writer, sheet_name="Vacío", index=False)
                 
-                # Botón de descarga
-                st.download_button(
-                    label="⬇️ Descargar Excel Generado",
-                    data=excel_buffer,
-                    file_name=f"reporte_sst_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                return ruta_excel
+            
+            with st.spinner("Generando archivo..."):
+                resultado = obtener_o_generar(
+                    "exportacion_excel",
+                    {"opciones": sorted(opciones)},
+                    [tabla for o in opciones for tabla in TABLAS_EXPORTACION[o]],
+                    generar_excel,
+                    "xlsx",
+                    nombre_descarga=f"reporte_sst_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
                 )
+                
+            if resultado:
+                if resultado["reutilizado"]:
+                    st.caption(describir_snapshot(resultado))
+                
+                # Enlace de descarga
+                boton_descarga("⬇️ Descargar Excel Generado", resultado["url"])
+
+
+def gestion_horas_hombre():
+    """Registro de horas-hombre por área y mes con importación masiva CSV"""
+    st.subheader("⏱️ Horas-Hombre por Área")
+    st.markdown("Base para el cálculo de los índices IF, IS e IA en reportes y tendencias.")
+    
+    supabase = get_supabase_client()
+    
+    plantilla = pd.DataFrame([
+        {"area": "Producción", "periodo": "2025-01", "horas_trabajadas": 24000, "numero_trabajadores": 120}
+    ], columns=COLUMNAS_HORAS_HOMBRE)
+    st.download_button(
+        label="📄 Descargar Plantilla CSV",
+        data=plantilla.to_csv(index=False).encode("utf-8"),
+        file_name="plantilla_horas_hombre.csv",
+        mime="text/csv"
+    )
+    
+    archivo = st.file_uploader("Importar CSV de Horas-Hombre", type=["csv"])
+    
+    if archivo:
+        try:
+            df_csv = pd.read_csv(archivo, sep=None, engine="python", encoding="utf-8-sig")
+        except Exception as e:
+            st.error(f"No se pudo leer el CSV: {str(e)}")
+            return
+        
+        registros, errores = preparar_horas_hombre(df_csv)
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            st.metric("Filas válidas", len(registros))
+        with col2:
+            st.metric("Filas con errores", len(errores))
+        
+        if not errores.empty:
+            st.dataframe(errores, hide_index=True)
+        
+        if registros and st.button("💾 Importar Horas-Hombre", type="primary"):
+            with st.spinner("Importando..."):
+                guardados = supabase.importar_horas_hombre(registros)
+            if guardados:
+                invalidar_tabla("horas_hombre")
+                st.success(f"✅ {guardados} registros de horas-hombre guardados")
+    
+    st.markdown("### 📋 Registros")
+    filtro_area = st.text_input("🔍 Filtrar por Área", key="hh_filtro_area")
+    
+    filtros = {"area": filtro_area} if filtro_area else None
+    horas = supabase.listar_horas_hombre(filtros)
+    
+    if horas:
+        df = pd.DataFrame(horas)
+        df_mostrar = df[COLUMNAS_HORAS_HOMBRE].copy()
+        df_mostrar.columns = ["Área", "Periodo", "HH Trabajadas", "Trabajadores"]
+        st.dataframe(df_mostrar, width='stretch', hide_index=True)
+    else:
+        st.info("No hay horas-hombre registradas")
 
 
 def modulo_reportes():
@@ -440,19 +921,13 @@ def modulo_reportes():
     st.title("📊 Reportes y Análisis")
     st.markdown("**Reportes Legales y Estadísticos del Sistema SST**")
     
-    tabs = st.tabs(["📊 Resumen Ejecutivo", "📋 Reporte SUNAFIL", "📈 Análisis Estadístico", "📥 Exportar Excel"])
-    
-    with tabs[0]:
-        reporte_ejecutivo()
-    
-    with tabs[1]:
-        reporte_legal_sunafil()
-    
-    with tabs[2]:
-        analisis_estadistico()
-    
-    with tabs[3]:
-        exportar_excel()
+    subvistas("reportes", {
+        "📊 Resumen Ejecutivo": reporte_ejecutivo,
+        "📋 Reporte SUNAFIL": reporte_legal_sunafil,
+        "📈 Análisis Estadístico": analisis_estadistico,
+        "📥 Exportar Excel": exportar_excel,
+        "⏱️ Horas-Hombre": gestion_horas_hombre
+    })
 
 
 if __name__ == "__main__":
@@ -7,14 +7,36 @@ import plotly.express as px
 import plotly.graph_objects as go
 from datetime import datetime, date
 from typing import Optional
+import tempfile
+import time
 import sys
 import os
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.supabase_client import get_supabase_client
+from utils.navegacion import subvistas
+from utils.cache_datos import usuarios_activos, matriz_riesgo_vigente, invalidar_tabla
+from utils.figuras import datos_dashboard
 from utils.n8n_client import get_n8n_client
+from utils.almacenamiento import publicar_exportacion, boton_descarga
+from utils.matriz_riesgo import (
+    clasificar, matriz_referencia, matriz_por_area, umbrales_desde_matriz,
+    COLORES_CLASIFICACION, UMBRALES_RIESGO
+)
+from utils.espejo_local import get_espejo_local
 from config.settings import TIPOS_RIESGO
-from auth import obtener_usuario_actual
+from auth import obtener_usuario_actual, es_admin
+
+
+COLUMNAS_IPERC = [
+    "codigo", "descripcion", "area", "proceso", "tipo_riesgo", "probabilidad",
+    "severidad", "medidas_control", "responsable", "estado", "fecha_revision"
+]
+ESTADOS_RIESGO = ["identificado", "en_control", "controlado", "cerrado"]
+
+# Reclasificación masiva: riesgos por llamada RPC y pausa entre lotes (segundos)
+TAMANO_LOTE_RECLASIFICACION = 1000
+PAUSA_RECLASIFICACION = 0.5
 
 
 def generar_codigo_riesgo() -> str:
@@ -23,6 +45,12 @@ def generar_codigo_riesgo() -> str:
     return f"RIESGO-{timestamp}"
 
 
+def umbrales_vigentes() -> list:
+    """Umbrales de la matriz activa en matrices_riesgo (versión 1 si no está disponible)"""
+    matriz = matriz_riesgo_vigente()
+    return umbrales_desde_matriz(matriz) if matriz else UMBRALES_RIESGO
+
+
 def calcular_nivel_riesgo(probabilidad: int, severidad: int) -> tuple:
     """
     Calcula el nivel y clasificación del riesgo
@@ -30,50 +58,15 @@ def calcular_nivel_riesgo(probabilidad: int, severidad: int) -> tuple:
     Returns:
         tuple: (nivel, clasificacion, color)
     """
-    nivel = probabilidad * severidad
-    
-    if nivel <= 4:
-        return nivel, "Bajo", "green"
-    elif nivel <= 12:
-        return nivel, "Medio", "yellow"
-    elif nivel <= 16:
-        return nivel, "Alto", "orange"
-    else:
-        return nivel, "Crítico", "red"
+    resultado = clasificar([probabilidad], [severidad], umbrales_vigentes()).iloc[0]
+    return int(resultado["nivel_riesgo"]), resultado["clasificacion"], resultado["color"]
 
 
 def mostrar_matriz_riesgo():
     """Muestra la matriz de riesgos 5x5"""
     st.subheader("📊 Matriz de Evaluación de Riesgos 5x5")
     
-    # Crear matriz
-    matriz = []
-    for severidad in range(5, 0, -1):
-        fila = []
-        for probabilidad in range(1, 6):
-            nivel = probabilidad * severidad
-            if nivel <= 4:
-                color = "🟢"
-                clasificacion = "Bajo"
-            elif nivel <= 12:
-                color = "🟡"
-                clasificacion = "Medio"
-            elif nivel <= 16:
-                color = "🟠"
-                clasificacion = "Alto"
-            else:
-                color = "🔴"
-                clasificacion = "Crítico"
-            fila.append(f"{color} {nivel}")
-        matriz.append(fila)
-    
-    df_matriz = pd.DataFrame(
-        matriz,
-        columns=["Prob 1", "Prob 2", "Prob 3", "Prob 4", "Prob 5"],
-        index=["Sev 5", "Sev 4", "Sev 3", "Sev 2", "Sev 1"]
-    )
-    
-    st.dataframe(df_matriz, width=800)
+    st.dataframe(matriz_referencia(umbrales_vigentes()), width=800)
     
     col1, col2 = st.columns(2)
     with col1:
@@ -95,6 +88,37 @@ def mostrar_matriz_riesgo():
         - 4: Mayor
         - 5: Catastrófico
         """)
+    
+    # Matriz poblada con los riesgos vigentes
+    st.markdown("### Riesgos Vigentes por Celda")
+    
+    riesgos = get_espejo_local().consultar(
+        "SELECT area, probabilidad, severidad FROM riesgos WHERE estado <> 'cerrado'"
+    )
+    
+    if riesgos.empty:
+        st.info("No hay riesgos vigentes registrados")
+        return
+    
+    matrices = matriz_por_area(riesgos)
+    areas = list(matrices.index.get_level_values("area").unique())
+    area = st.selectbox("Área", ["Todas"] + areas, key="matriz_riesgo_area")
+    
+    if area == "Todas":
+        conteo = matrices.groupby(level="severidad", sort=False).sum()
+    else:
+        conteo = matrices.loc[area]
+    
+    fig = px.imshow(
+        conteo.values,
+        x=[f"Prob {p}" for p in conteo.columns],
+        y=[f"Sev {s}" for s in conteo.index],
+        text_auto=True,
+        color_continuous_scale="Reds",
+        labels=dict(color="Riesgos"),
+        title=f"Riesgos por celda — {area if area != 'Todas' else 'todas las áreas'}"
+    )
+    st.plotly_chart(fig, width='stretch')
 
 
 def formulario_registro_riesgo():
@@ -106,7 +130,7 @@ def formulario_registro_riesgo():
     usuario = obtener_usuario_actual()
     
     # Obtener lista de usuarios para asignar responsable
-    usuarios = supabase.listar_usuarios()
+    usuarios = usuarios_activos()
     usuarios_dict = {u["nombre_completo"]: u["id"] for u in usuarios}
     
     with st.form("form_riesgo"):
@@ -164,6 +188,7 @@ def formulario_registro_riesgo():
                 riesgo_creado = supabase.crear_riesgo(datos_riesgo)
                 
                 if riesgo_creado:
+                    invalidar_tabla("riesgos")
                     st.success(f"✅ Riesgo registrado: {riesgo_creado['codigo']}")
                     
                     # Notificar si es riesgo crítico
@@ -175,6 +200,182 @@ def formulario_registro_riesgo():
                     st.rerun()
 
 
+def leer_iperc(archivo) -> pd.DataFrame:
+    """
+    Lee una matriz IPERC (xlsx o CSV) fila por fila
+    
+    Los xlsx se recorren en modo solo lectura de openpyxl (sin cargar estilos
+    ni el libro completo en memoria); la primera fila no vacía es el encabezado.
+    El índice del DataFrame es el número de fila en el archivo, para que los
+    errores apunten a la fila real aunque haya filas vacías intercaladas.
+    """
+    if not archivo.name.lower().endswith(".xlsx"):
+        # Sin saltar líneas vacías: el índice + 2 es la línea del archivo (encabezado en la 1)
+        df = pd.read_csv(archivo, sep=None, engine="python", encoding="utf-8-sig", dtype=str,
+                         skip_blank_lines=False)
+        df.index = pd.Index(df.index + 2, name="fila")
+        return df.dropna(how="all")
+    
+    from openpyxl import load_workbook
+    
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = (
+            (numero, f) for numero, f in enumerate(libro.active.iter_rows(values_only=True), start=1)
+            if any(c is not None for c in f)
+        )
+        _, encabezado = next(filas, (None, None))
+        if encabezado is None:
+            return pd.DataFrame()
+        numeros, datos = [], []
+        for numero, f in filas:
+            numeros.append(numero)
+            datos.append(f)
+    finally:
+        libro.close()
+    return pd.DataFrame(datos, columns=[str(c) if c is not None else "" for c in encabezado],
+                        index=pd.Index(numeros, name="fila"))
+
+
+def preparar_iperc(df: pd.DataFrame, usuarios: list) -> tuple:
+    """
+    Valida, clasifica y resuelve responsables de una matriz IPERC
+    
+    Args:
+        df: Filas leídas con leer_iperc (índice = número de fila en el archivo)
+        usuarios: Usuarios activos (responsables por nombre o email)
+    
+    Returns:
+        tuple: (registros válidos, filas de origen, DataFrame de errores por fila,
+                cantidad de riesgos válidos por clasificación)
+    """
+    df = df.rename(columns=lambda c: str(c).strip().lower())
+    faltantes = [c for c in ["descripcion", "area", "tipo_riesgo", "probabilidad", "severidad"] if c not in df.columns]
+    if faltantes:
+        errores = pd.DataFrame([{"fila": 0, "error": f"Columnas faltantes: {', '.join(faltantes)}"}])
+        return [], [], errores, pd.Series(dtype=int)
+    
+    for columna in COLUMNAS_IPERC:
+        if columna not in df.columns:
+            df[columna] = None
+    
+    texto = ["codigo", "descripcion", "area", "proceso", "tipo_riesgo", "medidas_control", "responsable", "estado"]
+    df[texto] = df[texto].apply(lambda c: c.astype("string").str.strip().replace("", pd.NA))
+    df["estado"] = df["estado"].str.lower().fillna("identificado")
+    df["probabilidad"] = pd.to_numeric(df["probabilidad"], errors="coerce")
+    df["severidad"] = pd.to_numeric(df["severidad"], errors="coerce")
+    df["fecha_revision"] = pd.to_datetime(df["fecha_revision"], errors="coerce", dayfirst=True)
+    df["fila"] = df.index  # número de fila en el archivo (leer_iperc)
+    
+    # Índice de responsables por nombre y por email (sin distinguir mayúsculas)
+    indice = {}
+    for u in usuarios:
+        indice[str(u["nombre_completo"]).strip().lower()] = u["id"]
+        indice[str(u["email"]).strip().lower()] = u["id"]
+    df["responsable_id"] = df["responsable"].str.lower().map(indice)
+    
+    escala = range(1, 6)
+    motivos = pd.Series("", index=df.index)
+    motivos[df["descripcion"].isna()] += "Descripción vacía. "
+    motivos[df["area"].isna()] += "Área vacía. "
+    motivos[~df["tipo_riesgo"].isin(TIPOS_RIESGO)] += "Tipo de riesgo inválido. "
+    motivos[~df["probabilidad"].isin(escala)] += "Probabilidad fuera de 1-5. "
+    motivos[~df["severidad"].isin(escala)] += "Severidad fuera de 1-5. "
+    motivos[~df["estado"].isin(ESTADOS_RIESGO)] += "Estado inválido. "
+    motivos[df["responsable"].notna() & df["responsable_id"].isna()] += "Responsable no encontrado. "
+    motivos[df["codigo"].notna() & df["codigo"].duplicated(keep=False)] += "Código duplicado en el archivo. "
+    
+    errores = df.loc[motivos != "", ["fila"]].assign(error=motivos[motivos != ""].str.strip())
+    validos = df[motivos == ""].copy()
+    
+    if validos.empty:
+        return [], [], errores, pd.Series(dtype=int)
+    
+    validos[["nivel_riesgo", "clasificacion"]] = clasificar(
+        validos["probabilidad"], validos["severidad"], umbrales_vigentes()
+    )[["nivel_riesgo", "clasificacion"]]
+    
+    # Códigos faltantes: prefijo por lote más número de fila
+    prefijo = generar_codigo_riesgo()
+    validos["codigo"] = validos["codigo"].fillna(validos["fila"].map(lambda f: f"{prefijo}-{f:04d}"))
+    
+    usuario = obtener_usuario_actual() or {}
+    registros = [
+        {
+            "codigo": fila.codigo,
+            "descripcion": fila.descripcion,
+            "area": fila.area,
+            "proceso": None if pd.isna(fila.proceso) else fila.proceso,
+            "tipo_riesgo": fila.tipo_riesgo,
+            "probabilidad": int(fila.probabilidad),
+            "severidad": int(fila.severidad),
+            "medidas_control": None if pd.isna(fila.medidas_control) else fila.medidas_control,
+            "responsable_id": None if pd.isna(fila.responsable_id) else fila.responsable_id,
+            "estado": fila.estado,
+            "fecha_revision": None if pd.isna(fila.fecha_revision) else fila.fecha_revision.date().isoformat(),
+            "creado_por": usuario.get("id")
+        }
+        for fila in validos.itertuples(index=False)
+    ]
+    return registros, validos["fila"].tolist(), errores, validos["clasificacion"].value_counts()
+
+
+def importar_iperc():
+    """Importación masiva de una matriz IPERC (xlsx o CSV)"""
+    st.subheader("📥 Importar Matriz IPERC")
+    st.markdown("Carga cientos de riesgos desde la matriz IPERC de una sede.")
+    
+    plantilla = pd.DataFrame([{
+        "codigo": "", "descripcion": "Caída al mismo nivel por piso húmedo", "area": "Producción",
+        "proceso": "Limpieza", "tipo_riesgo": "Locativo", "probabilidad": 3, "severidad": 2,
+        "medidas_control": "Señalización y secado inmediato", "responsable": "correo@empresa.com",
+        "estado": "identificado", "fecha_revision": "2025-06-30"
+    }], columns=COLUMNAS_IPERC)
+    st.download_button(
+        label="📄 Descargar Plantilla CSV",
+        data=plantilla.to_csv(index=False).encode("utf-8"),
+        file_name="plantilla_iperc.csv",
+        mime="text/csv"
+    )
+    
+    archivo = st.file_uploader("Matriz IPERC", type=["xlsx", "csv"])
+    
+    if not archivo:
+        return
+    
+    try:
+        df = leer_iperc(archivo)
+    except Exception as e:
+        st.error(f"No se pudo leer el archivo: {str(e)}")
+        return
+    
+    registros, filas, errores, por_clasificacion = preparar_iperc(df, usuarios_activos())
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Filas válidas", len(registros))
+    with col2:
+        st.metric("Filas con errores", len(errores))
+    
+    if not por_clasificacion.empty:
+        st.caption(" · ".join(f"{clasificacion}: {cantidad}" for clasificacion, cantidad in por_clasificacion.items()))
+    
+    if not errores.empty:
+        st.dataframe(errores, hide_index=True)
+    
+    if registros and st.button("💾 Importar Riesgos", type="primary"):
+        with st.spinner(f"Importando {len(registros)} riesgos..."):
+            resultado = get_supabase_client().importar_riesgos(registros, filas)
+    
+        if resultado["guardados"]:
+            invalidar_tabla("riesgos")
+            st.success(f"✅ {resultado['guardados']} riesgos importados")
+    
+        if resultado["errores"]:
+            st.error(f"{len(resultado['errores'])} filas rechazadas por la base de datos")
+            st.dataframe(pd.DataFrame(resultado["errores"]), hide_index=True)
+
+
 def listar_riesgos():
     """Lista y filtra riesgos registrados"""
     st.subheader("📋 Listado de Riesgos")
@@ -231,85 +432,205 @@ def listar_riesgos():
         
         # Exportar a Excel
         if st.button("📥 Exportar a Excel"):
-            excel_file = f"reports/riesgos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+            fd, excel_file = tempfile.mkstemp(suffix=".xlsx", prefix="sst_")
+            os.close(fd)
             df_mostrar.to_excel(excel_file, index=False)
-            st.success(f"Archivo exportado: {excel_file}")
+            url = publicar_exportacion(
+                excel_file,
+                f"riesgos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
+                "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+            )
+            if url:
+                boton_descarga("⬇️ Descargar Excel", url)
     else:
         st.warning("No se encontraron riesgos con los filtros aplicados")
 
 
+def construir_dashboard_riesgos() -> Optional[dict]:
+    """Métricas y figuras del dashboard de riesgos"""
+    riesgos = get_supabase_client().listar_riesgos()
+    
+    if not riesgos:
+        return None
+    
+    df = pd.DataFrame(riesgos)
+    # Clasificación vigente recalculada desde (probabilidad, severidad)
+    df[["nivel_riesgo", "clasificacion"]] = clasificar(
+        df["probabilidad"], df["severidad"], umbrales_vigentes()
+    )[["nivel_riesgo", "clasificacion"]]
+    total = len(df)
+    controlados = len(df[df["estado"] == "controlado"])
+    
+    # Distribución por clasificación
+    fig_clasificacion = px.pie(
+        df,
+        names="clasificacion",
+        title="Distribución por Clasificación",
+        color="clasificacion",
+        color_discrete_map=COLORES_CLASIFICACION
+    )
+    
+    # Distribución por tipo de riesgo
+    fig_tipo = px.bar(
+        df["tipo_riesgo"].value_counts().reset_index(),
+        x="tipo_riesgo",
+        y="count",
+        title="Riesgos por Tipo",
+        labels={"tipo_riesgo": "Tipo de Riesgo", "count": "Cantidad"}
+    )
+    
+    # Mapa de calor por área y clasificación
+    pivot_area = pd.crosstab(df["area"], df["clasificacion"])
+    fig_heatmap = px.imshow(
+        pivot_area,
+        title="Mapa de Calor: Riesgos por Área y Clasificación",
+        labels=dict(x="Clasificación", y="Área", color="Cantidad"),
+        color_continuous_scale="RdYlGn_r"
+    )
+    
+    return {
+        "metricas": {
+            "total": total,
+            "criticos": len(df[df["clasificacion"] == "Crítico"]),
+            "altos": len(df[df["clasificacion"] == "Alto"]),
+            "porcentaje_controlados": (controlados / total * 100) if total > 0 else 0
+        },
+        "figuras": {
+            "clasificacion": fig_clasificacion,
+            "tipo": fig_tipo,
+            "heatmap": fig_heatmap
+        }
+    }
+
+
 def dashboard_riesgos():
     """Dashboard con gráficos de riesgos"""
     st.subheader("📊 Dashboard de Riesgos")
     
-    supabase = get_supabase_client()
-    riesgos = supabase.listar_riesgos()
+    datos = datos_dashboard("riesgos", ["riesgos", "matrices_riesgo"], construir_dashboard_riesgos)
     
-    if not riesgos:
+    if not datos:
         st.warning("No hay riesgos registrados")
         return
     
-    df = pd.DataFrame(riesgos)
+    metricas, figuras = datos["metricas"], datos["figuras"]
     
     # Métricas principales
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total = len(df)
-        st.metric("Total Riesgos", total)
+        st.metric("Total Riesgos", metricas["total"])
     
     with col2:
-        criticos = len(df[df["clasificacion"] == "Crítico"])
+        criticos = metricas["criticos"]
         st.metric("Riesgos Críticos", criticos, delta=None if criticos == 0 else "⚠️")
     
     with col3:
-        altos = len(df[df["clasificacion"] == "Alto"])
-        st.metric("Riesgos Altos", altos)
+        st.metric("Riesgos Altos", metricas["altos"])
     
     with col4:
-        controlados = len(df[df["estado"] == "controlado"])
-        porcentaje = (controlados / total * 100) if total > 0 else 0
-        st.metric("% Controlados", f"{porcentaje:.1f}%")
+        st.metric("% Controlados", f"{metricas['porcentaje_controlados']:.1f}%")
     
     # Gráficos
     col1, col2 = st.columns(2)
     
     with col1:
-        # Distribución por clasificación
-        fig_clasificacion = px.pie(
-            df,
-            names="clasificacion",
-            title="Distribución por Clasificación",
-            color="clasificacion",
-            color_discrete_map={
-                "Bajo": "green",
-                "Medio": "yellow",
-                "Alto": "orange",
-                "Crítico": "red"
-            }
-        )
-        st.plotly_chart(fig_clasificacion, width='stretch')
+        st.plotly_chart(figuras["clasificacion"], width='stretch')
     
     with col2:
-        # Distribución por tipo de riesgo
-        fig_tipo = px.bar(
-            df["tipo_riesgo"].value_counts().reset_index(),
-            x="tipo_riesgo",
-            y="count",
-            title="Riesgos por Tipo",
-            labels={"tipo_riesgo": "Tipo de Riesgo", "count": "Cantidad"}
-        )
-        st.plotly_chart(fig_tipo, width='stretch')
+        st.plotly_chart(figuras["tipo"], width='stretch')
     
-    # Mapa de calor por área y clasificación
-    pivot_area = pd.crosstab(df["area"], df["clasificacion"])
-    fig_heatmap = px.imshow(
-        pivot_area,
-        title="Mapa de Calor: Riesgos por Área y Clasificación",
-        labels=dict(x="Clasificación", y="Área", color="Cantidad"),
-        color_continuous_scale="RdYlGn_r"
+    st.plotly_chart(figuras["heatmap"], width='stretch')
+
+
+def reclasificar_riesgos(version: int):
+    """Reclasifica en la base, por lotes y con pausas, los riesgos de otra versión de matriz"""
+    supabase = get_supabase_client()
+    pendientes = supabase.contar_riesgos_por_reclasificar(version)
+    
+    if pendientes is None:
+        return
+    if pendientes == 0:
+        st.success(f"✅ Todos los riesgos están clasificados con la matriz v{version}")
+        return
+    
+    st.info(f"{pendientes} riesgos clasificados con otra versión de la matriz")
+    if not st.button("🔄 Reclasificar Riesgos", type="primary"):
+        return
+    
+    progreso = st.progress(0.0, text="Reclasificando...")
+    procesados = 0
+    while True:
+        actualizados = supabase.reclasificar_riesgos_lote(version, TAMANO_LOTE_RECLASIFICACION)
+        if actualizados == -1:
+            invalidar_tabla("riesgos")
+            invalidar_tabla("matrices_riesgo")
+            st.warning(f"{procesados} riesgos reclasificados; se activó otra versión de la matriz "
+                       f"y la reclasificación con la v{version} se detuvo")
+            return
+        if not actualizados:
+            break
+        procesados += actualizados
+        progreso.progress(min(procesados / pendientes, 1.0), text=f"{procesados} de {pendientes} riesgos")
+        # Pausa entre lotes para no saturar la base durante la jornada
+        time.sleep(PAUSA_RECLASIFICACION)
+    
+    invalidar_tabla("riesgos")
+    restantes = supabase.contar_riesgos_por_reclasificar(version)
+    if restantes:
+        st.warning(f"{procesados} riesgos reclasificados; {restantes} en edición quedaron pendientes")
+    else:
+        st.success(f"✅ {procesados} riesgos reclasificados con la matriz v{version}")
+
+
+def configurar_umbrales():
+    """Versiones de la matriz de clasificación y reclasificación masiva"""
+    st.subheader("⚙️ Umbrales de Clasificación")
+    
+    if not es_admin():
+        st.warning("Solo los administradores pueden modificar la matriz de clasificación")
+        return
+    
+    vigente = matriz_riesgo_vigente()
+    if not vigente:
+        st.error("No hay una matriz de clasificación activa")
+        return
+    
+    st.markdown(
+        f"**Matriz vigente v{vigente['version']}:** Bajo ≤ {vigente['limite_bajo']} · "
+        f"Medio ≤ {vigente['limite_medio']} · Alto ≤ {vigente['limite_alto']} · Crítico > {vigente['limite_alto']}"
     )
-    st.plotly_chart(fig_heatmap, width='stretch')
+    
+    with st.form("form_umbrales"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            limite_bajo = st.number_input("Bajo hasta", min_value=1, max_value=23, value=int(vigente["limite_bajo"]))
+        with col2:
+            limite_medio = st.number_input("Medio hasta", min_value=2, max_value=23, value=int(vigente["limite_medio"]))
+        with col3:
+            limite_alto = st.number_input("Alto hasta", min_value=3, max_value=24, value=int(vigente["limite_alto"]))
+        descripcion = st.text_input("Motivo del cambio")
+        
+        submitted = st.form_submit_button("💾 Crear Nueva Versión")
+        
+        if submitted:
+            if not limite_bajo < limite_medio < limite_alto:
+                st.error("Los límites deben ser crecientes: Bajo < Medio < Alto")
+            else:
+                matriz = get_supabase_client().crear_matriz_riesgo({
+                    "limite_bajo": limite_bajo,
+                    "limite_medio": limite_medio,
+                    "limite_alto": limite_alto,
+                    "descripcion": descripcion,
+                    "creado_por": (obtener_usuario_actual() or {}).get("id")
+                })
+                if matriz:
+                    invalidar_tabla("matrices_riesgo")
+                    st.success(f"✅ Matriz v{matriz['version']} activa")
+                    st.rerun()
+    
+    st.markdown("### Reclasificación")
+    reclasificar_riesgos(vigente["version"])
 
 
 def modulo_riesgos():
@@ -317,19 +638,14 @@ def modulo_riesgos():
     st.title("⚠️ Gestión de Riesgos")
     st.markdown("**Identificación y Evaluación de Riesgos - Art. 26-28 Ley 29783**")
     
-    tabs = st.tabs(["📊 Dashboard", "📋 Listado", "➕ Registrar", "📐 Matriz 5x5"])
-    
-    with tabs[0]:
-        dashboard_riesgos()
-    
-    with tabs[1]:
-        listar_riesgos()
-    
-    with tabs[2]:
-        formulario_registro_riesgo()
-    
-    with tabs[3]:
-        mostrar_matriz_riesgo()
+    subvistas("riesgos", {
+        "📊 Dashboard": dashboard_riesgos,
+        "📋 Listado": listar_riesgos,
+        "➕ Registrar": formulario_registro_riesgo,
+        "📥 Importar IPERC": importar_iperc,
+        "📐 Matriz 5x5": mostrar_matriz_riesgo,
+        "⚙️ Umbrales": configurar_umbrales
+    })
 
 
 if __name__ == "__main__":
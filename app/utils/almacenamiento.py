@@ -0,0 +1,516 @@
+"""
+Almacenamiento de archivos del Sistema SST (Supabase Storage o disco local)
+
+Los archivos se envían por streaming; los grandes, con el protocolo TUS de
+subidas reanudables (bloques de 6 MB que se reintentan desde el último offset
+confirmado). Varias subidas se ejecutan en paralelo con subir_varios.
+Los enlaces de descarga se muestran con boton_descarga, que sirve desde la
+sesión los archivos del backend local (un file:// no abre en el navegador).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from datetime import datetime
+import threading
+import hashlib
+import base64
+import time
+import uuid
+import requests
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+import sys
+import os
+import io
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Los secretos (SUPABASE_*, STORAGE_*) se leen como settings.X al usarlos, no al importar
+from config import settings
+from config.settings import URL_FIRMADA_EXPIRACION, STORAGE_BUCKETS
+
+
+# Tamaño de cada bloque enviado en una subida por streaming
+TAMANO_BLOQUE = 1024 * 1024
+
+# Subidas reanudables (TUS): Supabase exige bloques de exactamente 6 MB
+TAMANO_BLOQUE_TUS = 6 * 1024 * 1024
+UMBRAL_REANUDABLE = TAMANO_BLOQUE_TUS
+REINTENTOS_BLOQUE = 3
+
+# Subidas simultáneas en subir_varios
+SUBIDAS_CONCURRENTES = 4
+
+Origen = Union[bytes, str, BinaryIO]
+
+# progreso(bytes_enviados, bytes_totales)
+Progreso = Optional[Callable[[int, int], None]]
+
+
+def _abrir_origen(origen: Origen) -> BinaryIO:
+    """Normaliza el origen (bytes, ruta de archivo o archivo abierto) a un archivo binario"""
+    if isinstance(origen, (bytes, bytearray)):
+        return io.BytesIO(origen)
+    if isinstance(origen, str):
+        return open(origen, "rb")
+    if hasattr(origen, "seek"):
+        origen.seek(0)
+    return origen
+
+
+def _tamano(archivo: BinaryIO) -> Optional[int]:
+    """Tamaño de un archivo abierto sin leerlo (None si no admite seek)"""
+    try:
+        actual = archivo.tell()
+        archivo.seek(0, os.SEEK_END)
+        tamano = archivo.tell()
+        archivo.seek(actual)
+        return tamano
+    except (AttributeError, OSError):
+        return None
+
+
+def leer_en_bloques(archivo: BinaryIO, tamano: int = TAMANO_BLOQUE,
+                    progreso: Progreso = None, total: int = 0) -> Iterator[bytes]:
+    """Lee un archivo en bloques sin cargarlo completo en memoria"""
+    enviados = 0
+    while True:
+        bloque = archivo.read(tamano)
+        if not bloque:
+            break
+        enviados += len(bloque)
+        if progreso:
+            progreso(enviados, total)
+        yield bloque
+
+
+def calcular_hash(origen: Origen) -> Tuple[str, int]:
+    """
+    SHA-256 de un archivo leído por bloques (sin cargarlo en memoria)
+
+    Returns:
+        tuple: (hash hexadecimal, tamaño en bytes)
+    """
+    archivo = _abrir_origen(origen)
+    try:
+        digest, tamano = hashlib.sha256(), 0
+        for bloque in leer_en_bloques(archivo):
+            digest.update(bloque)
+            tamano += len(bloque)
+        return digest.hexdigest(), tamano
+    finally:
+        if isinstance(origen, str):
+            archivo.close()
+
+
+class Almacenamiento(ABC):
+    """Interfaz común de los backends de almacenamiento"""
+
+    @abstractmethod
+    def subir(self, bucket: str, ruta: str, origen: Origen,
+              tipo_contenido: str = "application/octet-stream", progreso: Progreso = None) -> bool:
+        """Sube un archivo (bytes, ruta local o archivo abierto) por streaming"""
+
+    @abstractmethod
+    def url_publica(self, bucket: str, ruta: str) -> str:
+        """Retorna la URL pública permanente de un archivo"""
+
+    @abstractmethod
+    def descargar(self, bucket: str, ruta: str) -> Optional[bytes]:
+        """Descarga el contenido de un archivo"""
+
+    @abstractmethod
+    def url_descarga(self, bucket: str, ruta: str, expira_segundos: int = URL_FIRMADA_EXPIRACION,
+                     nombre_descarga: Optional[str] = None) -> Optional[str]:
+        """Retorna un enlace de descarga firmado (nombre_descarga fija el nombre del archivo)"""
+
+    @abstractmethod
+    def urls_descarga(self, bucket: str, rutas: List[str],
+                      expira_segundos: int = URL_FIRMADA_EXPIRACION) -> Dict[str, str]:
+        """Firma varios archivos de un bucket en una sola llamada ({ruta: url})"""
+
+    @abstractmethod
+    def ubicacion(self, url: str) -> Optional[Tuple[str, str]]:
+        """(bucket, ruta) de una URL retornada por url_publica; None si no es de este almacenamiento"""
+
+    @abstractmethod
+    def eliminar(self, bucket: str, ruta: str) -> bool:
+        """Elimina un archivo"""
+
+
+class AlmacenamientoSupabase(Almacenamiento):
+    """Backend sobre Supabase Storage"""
+
+    def __init__(self):
+        if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_KEY:
+            raise ValueError("Las credenciales de Supabase no están configuradas")
+
+        self.url_base = f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1"
+        self.headers = {
+            "Authorization": f"Bearer {settings.SUPABASE_SERVICE_KEY}",
+            "apikey": settings.SUPABASE_SERVICE_KEY
+        }
+        self.timeout = 300  # segundos
+
+    def _url_objeto(self, bucket: str, ruta: str) -> str:
+        return f"{self.url_base}/object/{quote(bucket)}/{quote(ruta)}"
+
+    def subir(self, bucket: str, ruta: str, origen: Origen,
+              tipo_contenido: str = "application/octet-stream", progreso: Progreso = None) -> bool:
+        archivo = _abrir_origen(origen)
+        try:
+            tamano = _tamano(archivo)
+            if tamano is not None and tamano > UMBRAL_REANUDABLE:
+                return self._subir_reanudable(bucket, ruta, archivo, tamano, tipo_contenido, progreso)
+
+            # Un generador como cuerpo hace que requests use Transfer-Encoding: chunked
+            response = requests.post(
+                self._url_objeto(bucket, ruta),
+                data=leer_en_bloques(archivo, progreso=progreso, total=tamano or 0),
+                headers={**self.headers, "Content-Type": tipo_contenido, "x-upsert": "true"},
+                timeout=self.timeout
+            )
+            if response.status_code in [200, 201]:
+                return True
+            st.error(f"Error al subir archivo ({response.status_code}): {response.text}")
+            return False
+        except Exception as e:
+            st.error(f"Error al subir archivo: {str(e)}")
+            return False
+        finally:
+            if isinstance(origen, str):
+                archivo.close()
+
+    def _subir_reanudable(self, bucket: str, ruta: str, archivo: BinaryIO, tamano: int,
+                          tipo_contenido: str, progreso: Progreso) -> bool:
+        """Subida TUS: crea la sesión y envía bloques de 6 MB, reanudando tras un fallo"""
+        def codificar(valor: str) -> str:
+            return base64.b64encode(valor.encode("utf-8")).decode("ascii")
+
+        cabeceras = {**self.headers, "Tus-Resumable": "1.0.0"}
+        response = requests.post(
+            f"{self.url_base}/upload/resumable",
+            headers={
+                **cabeceras,
+                "Upload-Length": str(tamano),
+                "Upload-Metadata": ",".join([
+                    f"bucketName {codificar(bucket)}",
+                    f"objectName {codificar(ruta)}",
+                    f"contentType {codificar(tipo_contenido)}"
+                ]),
+                "x-upsert": "true"
+            },
+            timeout=30
+        )
+        if response.status_code != 201:
+            st.error(f"Error al iniciar subida ({response.status_code}): {response.text}")
+            return False
+        ubicacion = response.headers["Location"]
+
+        # Tras un fallo se consulta el offset confirmado antes de reenviar; si
+        # la consulta también falla, cuenta como otro reintento del bloque
+        offset, fallos, verificar = 0, 0, False
+        while offset < tamano:
+            try:
+                if verificar:
+                    # El servidor informa cuántos bytes confirmó: se reanuda desde ahí
+                    estado = requests.head(ubicacion, headers=cabeceras, timeout=30)
+                    if estado.status_code != 200:
+                        raise IOError(f"{estado.status_code}: {estado.text}")
+                    offset = int(estado.headers["Upload-Offset"])
+                    verificar = False
+                    if offset >= tamano:
+                        continue
+
+                archivo.seek(offset)
+                bloque = archivo.read(TAMANO_BLOQUE_TUS)
+                response = requests.patch(
+                    ubicacion,
+                    data=bloque,
+                    headers={
+                        **cabeceras,
+                        "Upload-Offset": str(offset),
+                        "Content-Type": "application/offset+octet-stream"
+                    },
+                    timeout=self.timeout
+                )
+                if response.status_code != 204:
+                    raise IOError(f"{response.status_code}: {response.text}")
+                offset = int(response.headers["Upload-Offset"])
+                fallos = 0
+            except Exception as e:
+                fallos += 1
+                if fallos > REINTENTOS_BLOQUE:
+                    st.error(f"Error al subir archivo: {str(e)}")
+                    return False
+                time.sleep(2 ** fallos)
+                verificar = True
+            if progreso:
+                progreso(offset, tamano)
+        return True
+
+    def url_publica(self, bucket: str, ruta: str) -> str:
+        return f"{self.url_base}/object/public/{quote(bucket)}/{quote(ruta)}"
+
+    def descargar(self, bucket: str, ruta: str) -> Optional[bytes]:
+        try:
+            response = requests.get(self._url_objeto(bucket, ruta), headers=self.headers, timeout=self.timeout)
+            if response.status_code == 200:
+                return response.content
+            return None
+        except Exception as e:
+            st.error(f"Error al descargar archivo: {str(e)}")
+            return None
+
+    def url_descarga(self, bucket: str, ruta: str, expira_segundos: int = URL_FIRMADA_EXPIRACION,
+                     nombre_descarga: Optional[str] = None) -> Optional[str]:
+        try:
+            response = requests.post(
+                f"{self.url_base}/object/sign/{quote(bucket)}/{quote(ruta)}",
+                json={"expiresIn": expira_segundos},
+                headers=self.headers,
+                timeout=30
+            )
+            if response.status_code != 200:
+                return None
+            firmada = response.json().get("signedURL")
+            if not firmada:
+                return None
+            url = f"{self.url_base}{firmada}"
+            if nombre_descarga:
+                url += f"&download={quote(nombre_descarga)}"
+            return url
+        except Exception as e:
+            st.error(f"Error al generar enlace de descarga: {str(e)}")
+            return None
+
+    def urls_descarga(self, bucket: str, rutas: List[str],
+                      expira_segundos: int = URL_FIRMADA_EXPIRACION) -> Dict[str, str]:
+        try:
+            response = requests.post(
+                f"{self.url_base}/object/sign/{quote(bucket)}",
+                json={"expiresIn": expira_segundos, "paths": rutas},
+                headers=self.headers,
+                timeout=30
+            )
+            if response.status_code != 200:
+                st.error(f"Error al firmar enlaces ({response.status_code}): {response.text}")
+                return {}
+            return {
+                item["path"]: f"{self.url_base}{item['signedURL']}"
+                for item in response.json() if item.get("signedURL") and not item.get("error")
+            }
+        except Exception as e:
+            st.error(f"Error al firmar enlaces: {str(e)}")
+            return {}
+
+    def ubicacion(self, url: str) -> Optional[Tuple[str, str]]:
+        prefijo = f"{self.url_base}/object/public/"
+        if not url.startswith(prefijo):
+            return None
+        bucket, _, ruta = url[len(prefijo):].partition("/")
+        return unquote(bucket), unquote(ruta)
+
+    def eliminar(self, bucket: str, ruta: str) -> bool:
+        try:
+            response = requests.delete(
+                f"{self.url_base}/object/{quote(bucket)}",
+                json={"prefixes": [ruta]},
+                headers=self.headers,
+                timeout=30
+            )
+            return response.status_code == 200
+        except Exception as e:
+            st.error(f"Error al eliminar archivo: {str(e)}")
+            return False
+
+
+class AlmacenamientoLocal(Almacenamiento):
+    """Backend en disco local (pruebas y desarrollo sin Supabase)"""
+
+    def __init__(self, raiz: Optional[str] = None):
+        self.raiz = os.path.abspath(raiz or settings.STORAGE_LOCAL_PATH)
+
+    def _ruta_local(self, bucket: str, ruta: str) -> str:
+        destino = os.path.abspath(os.path.join(self.raiz, bucket, ruta))
+        if not destino.startswith(self.raiz + os.sep):
+            raise ValueError(f"Ruta fuera del almacenamiento: {ruta}")
+        return destino
+
+    def subir(self, bucket: str, ruta: str, origen: Origen,
+              tipo_contenido: str = "application/octet-stream", progreso: Progreso = None) -> bool:
+        archivo = _abrir_origen(origen)
+        try:
+            destino = self._ruta_local(bucket, ruta)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            total = _tamano(archivo) or 0
+            with open(destino, "wb") as f:
+                for bloque in leer_en_bloques(archivo, progreso=progreso, total=total):
+                    f.write(bloque)
+            return True
+        except Exception as e:
+            st.error(f"Error al guardar archivo: {str(e)}")
+            return False
+        finally:
+            if isinstance(origen, str):
+                archivo.close()
+
+    def descargar(self, bucket: str, ruta: str) -> Optional[bytes]:
+        try:
+            with open(self._ruta_local(bucket, ruta), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def url_publica(self, bucket: str, ruta: str) -> str:
+        return f"file://{self._ruta_local(bucket, ruta)}"
+
+    def url_descarga(self, bucket: str, ruta: str, expira_segundos: int = URL_FIRMADA_EXPIRACION,
+                     nombre_descarga: Optional[str] = None) -> Optional[str]:
+        destino = self._ruta_local(bucket, ruta)
+        if not os.path.exists(destino):
+            return None
+        url = f"file://{quote(destino)}"
+        if nombre_descarga:
+            url += f"?download={quote(nombre_descarga)}"
+        return url
+
+    def urls_descarga(self, bucket: str, rutas: List[str],
+                      expira_segundos: int = URL_FIRMADA_EXPIRACION) -> Dict[str, str]:
+        urls = {ruta: self.url_descarga(bucket, ruta, expira_segundos) for ruta in rutas}
+        return {ruta: url for ruta, url in urls.items() if url}
+
+    def ubicacion(self, url: str) -> Optional[Tuple[str, str]]:
+        prefijo = f"file://{self.raiz}{os.sep}"
+        if not url.startswith(prefijo):
+            return None
+        bucket, _, ruta = url[len(prefijo):].partition(os.sep)
+        return bucket, ruta.replace(os.sep, "/")
+
+    def eliminar(self, bucket: str, ruta: str) -> bool:
+        try:
+            os.remove(self._ruta_local(bucket, ruta))
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def publicar_exportacion(origen: Origen, nombre_archivo: str,
+                         tipo_contenido: str = "application/octet-stream") -> Optional[str]:
+    """
+    Sube una exportación al bucket de reportes y retorna su enlace de descarga
+
+    Si el origen es una ruta de archivo temporal, se elimina tras la subida
+    para que no se acumulen archivos en el servidor de la aplicación.
+    """
+    almacenamiento = get_almacenamiento()
+    bucket = STORAGE_BUCKETS["reportes"]
+    ruta = f"exportaciones/{datetime.now().strftime('%Y%m%d')}/{uuid.uuid4().hex}_{nombre_archivo}"
+
+    try:
+        subido = almacenamiento.subir(bucket, ruta, origen, tipo_contenido)
+    finally:
+        if isinstance(origen, str) and os.path.exists(origen):
+            os.remove(origen)
+
+    if not subido:
+        return None
+    return almacenamiento.url_descarga(bucket, ruta, nombre_descarga=nombre_archivo)
+
+
+def boton_descarga(etiqueta: str, url: str, **kwargs):
+    """
+    Botón de descarga para un enlace de url_descarga / publicar_exportacion
+
+    Los enlaces firmados se abren con st.link_button; los del backend local
+    (file://) se leen del disco y se entregan con st.download_button.
+    """
+    partes = urlsplit(url)
+    if partes.scheme != "file":
+        st.link_button(etiqueta, url, **kwargs)
+        return
+
+    ruta = unquote(partes.path)
+    nombre = parse_qs(partes.query).get("download", [os.path.basename(ruta)])[0]
+    try:
+        with open(ruta, "rb") as f:
+            st.download_button(etiqueta, data=f.read(), file_name=nombre, **kwargs)
+    except FileNotFoundError:
+        st.error("El archivo ya no está disponible")
+
+
+def subir_varios(archivos: List[Dict], mostrar_progreso: bool = True) -> List[Optional[str]]:
+    """
+    Sube varios archivos en paralelo mostrando el avance de cada uno
+
+    Args:
+        archivos: [{"bucket", "ruta", "origen", "tipo_contenido", "nombre"}]; el
+            origen puede ser un archivo abierto (p. ej. el de st.file_uploader),
+            que se lee por bloques sin copiarlo. Sin "ruta", el archivo se
+            deduplica por contenido (utils.contenido)
+        mostrar_progreso: Dibuja una barra por archivo
+
+    Returns:
+        list: URL pública de cada archivo (None si falló), en el mismo orden
+    """
+    if not archivos:
+        return []
+
+    almacenamiento = get_almacenamiento()
+    avance = [(0, 0)] * len(archivos)
+    bloqueo = threading.Lock()
+
+    def subir_uno(indice: int, archivo: Dict) -> Optional[str]:
+        def progreso(enviados: int, total: int):
+            with bloqueo:
+                avance[indice] = (enviados, total)
+
+        tipo_contenido = archivo.get("tipo_contenido") or "application/octet-stream"
+        if "ruta" not in archivo:
+            from utils.contenido import subir_contenido
+            return subir_contenido(archivo["bucket"], archivo["origen"], archivo["nombre"],
+                                   tipo_contenido, progreso)
+
+        subido = almacenamiento.subir(
+            archivo["bucket"], archivo["ruta"], archivo["origen"], tipo_contenido, progreso
+        )
+        return almacenamiento.url_publica(archivo["bucket"], archivo["ruta"]) if subido else None
+
+    # Los hilos heredan el contexto de la sesión para que st.error se muestre
+    contexto = get_script_run_ctx()
+    with ThreadPoolExecutor(
+        max_workers=SUBIDAS_CONCURRENTES,
+        initializer=lambda: add_script_run_ctx(threading.current_thread(), contexto)
+    ) as ejecutor:
+        futuros = [ejecutor.submit(subir_uno, i, a) for i, a in enumerate(archivos)]
+
+        # Las barras se actualizan solo desde el hilo de la sesión
+        barras = [st.progress(0.0, text=a.get("nombre") or a.get("ruta")) for a in archivos] if mostrar_progreso else []
+        while barras and not all(f.done() for f in futuros):
+            for barra, archivo, (enviados, total) in zip(barras, archivos, list(avance)):
+                nombre = archivo.get("nombre") or archivo.get("ruta")
+                barra.progress(min(enviados / total, 1.0) if total else 0.0,
+                               text=f"{nombre} — {enviados / 1048576:.1f} de {total / 1048576:.1f} MB")
+            time.sleep(0.25)
+
+        resultados = [f.result() for f in futuros]
+
+    for barra, archivo, url in zip(barras, archivos, resultados):
+        nombre = archivo.get("nombre") or archivo.get("ruta")
+        barra.progress(1.0 if url else 0.0, text=f"{'✅' if url else '❌'} {nombre}")
+    return resultados
+
+
+# Instancia global del almacenamiento
+_almacenamiento_instance = None
+
+def get_almacenamiento() -> Almacenamiento:
+    """Retorna el backend de almacenamiento configurado (STORAGE_BACKEND)"""
+    global _almacenamiento_instance
+    if _almacenamiento_instance is None:
+        if settings.STORAGE_BACKEND == "local":
+            _almacenamiento_instance = AlmacenamientoLocal()
+        else:
+            _almacenamiento_instance = AlmacenamientoSupabase()
+    return _almacenamiento_instance
@@ -0,0 +1,284 @@
+"""
+Motor analítico columnar (DuckDB) sobre el espejo local
+
+Cada tabla del espejo se vuelca a un snapshot Parquet cuando cambia su versión
+local, y DuckDB la expone como vista. Las agregaciones, tablas cruzadas y
+ventanas temporales se resuelven en SQL vectorizado sin descargar tablas
+completas desde Supabase ni recorrerlas en pandas.
+"""
+from typing import Dict, List, Optional
+import threading
+import sys
+import os
+
+import duckdb
+import pandas as pd
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.espejo_local import get_espejo_local
+from config import settings
+
+
+TABLAS_ANALITICA = [
+    "usuarios",
+    "riesgos",
+    "inspecciones",
+    "hallazgos",
+    "capacitaciones",
+    "asistentes_capacitacion",
+    "incidentes",
+    "epp_catalogo",
+    "epp_asignaciones",
+    "horas_hombre"
+]
+
+# Dimensiones permitidas en los desgloses: {tabla: {"fecha": columna, "dimensiones": {nombre: expresión}}}
+# Solo se interpolan en SQL expresiones de esta lista
+DESGLOSES = {
+    "incidentes": {
+        "fecha": "fecha_hora",
+        "dimensiones": {
+            "area": "area",
+            "mes": "strftime(date_trunc('month', fecha_hora), '%Y-%m')",
+            "tipo": "tipo",
+            "estado": "estado"
+        },
+        "medidas": {
+            "cantidad": "COUNT(*)",
+            "dias_perdidos": "SUM(COALESCE(dias_descanso_medico, 0))"
+        }
+    },
+    "riesgos": {
+        "fecha": "fecha_identificacion",
+        "dimensiones": {
+            "area": "area",
+            "mes": "strftime(date_trunc('month', fecha_identificacion), '%Y-%m')",
+            "tipo": "tipo_riesgo",
+            "clasificacion": "clasificacion",
+            "estado": "estado"
+        },
+        "medidas": {
+            "cantidad": "COUNT(*)",
+            "nivel_promedio": "ROUND(AVG(nivel_riesgo), 2)"
+        }
+    },
+    "inspecciones": {
+        "fecha": "fecha_programada",
+        "dimensiones": {
+            "area": "area",
+            "mes": "strftime(date_trunc('month', fecha_programada), '%Y-%m')",
+            "estado": "estado"
+        },
+        "medidas": {
+            "cantidad": "COUNT(*)",
+            "cumplimiento_promedio": "ROUND(AVG(porcentaje_cumplimiento), 2)"
+        }
+    },
+    "capacitaciones": {
+        "fecha": "fecha_programada",
+        "dimensiones": {
+            "mes": "strftime(date_trunc('month', fecha_programada), '%Y-%m')",
+            "tipo": "tipo",
+            "modalidad": "modalidad",
+            "estado": "estado"
+        },
+        "medidas": {
+            "cantidad": "COUNT(*)",
+            "horas": "SUM(COALESCE(duracion_horas, 0))"
+        }
+    }
+}
+
+
+def _preparar(df: pd.DataFrame) -> pd.DataFrame:
+    """Tipa las fechas del espejo (texto ISO en SQLite) para el snapshot Parquet"""
+    for columna in df.columns:
+        if columna.startswith("fecha") or columna == "periodo":
+            df[columna] = pd.to_datetime(df[columna], errors="coerce", utc=True).dt.tz_localize(None)
+    return df
+
+
+class MotorAnalitico:
+    """Vistas DuckDB sobre snapshots Parquet del espejo local"""
+
+    def __init__(self, directorio: Optional[str] = None):
+        self.directorio = directorio or os.path.join(
+            os.path.dirname(os.path.abspath(settings.ESPEJO_LOCAL_PATH)), "parquet"
+        )
+        os.makedirs(self.directorio, exist_ok=True)
+        self._con = duckdb.connect()
+        self._versiones: Dict[str, tuple] = {}
+        self._bloqueo = threading.Lock()
+
+    def _exportar(self, tabla: str):
+        """Vuelca una tabla del espejo a Parquet y (re)define su vista"""
+        df = _preparar(get_espejo_local().leer_tabla(tabla))
+        ruta = os.path.join(self.directorio, f"{tabla}.parquet")
+        temporal = f"{ruta}.tmp"
+
+        self._con.register("_exportacion", df)
+        try:
+            self._con.execute(f"COPY (SELECT * FROM _exportacion) TO '{temporal}' (FORMAT PARQUET)")
+        finally:
+            self._con.unregister("_exportacion")
+        os.replace(temporal, ruta)
+        self._con.execute(f"CREATE OR REPLACE VIEW {tabla} AS SELECT * FROM read_parquet('{ruta}')")
+
+    def actualizar(self):
+        """Regenera los snapshots de las tablas cuya versión local cambió"""
+        espejo = get_espejo_local()
+        with self._bloqueo:
+            for tabla in TABLAS_ANALITICA:
+                version = espejo.version_tabla(tabla)
+                if version is not None and self._versiones.get(tabla) != version:
+                    self._exportar(tabla)
+                    self._versiones[tabla] = version
+
+    def consultar(self, sql: str, parametros: Optional[list] = None) -> pd.DataFrame:
+        """
+        Ejecuta una consulta analítica
+
+        Retorna un DataFrame vacío si alguna tabla aún no tiene datos sincronizados
+        """
+        self.actualizar()
+        cursor = self._con.cursor()
+        try:
+            return cursor.execute(sql, parametros or []).df()
+        except duckdb.CatalogException:
+            return pd.DataFrame()
+        finally:
+            cursor.close()
+
+    def desglose(self, tabla: str, dimensiones: List[str], desde: Optional[str] = None,
+                 hasta: Optional[str] = None, filtros: Optional[Dict[str, str]] = None) -> pd.DataFrame:
+        """
+        Agregación de una tabla por cualquier combinación de dimensiones
+
+        Args:
+            tabla: Tabla de DESGLOSES
+            dimensiones: Dimensiones de agrupación (p. ej. ["area", "mes", "tipo"])
+            desde, hasta: Rango de fechas (ISO) sobre la columna de fecha de la tabla
+            filtros: {dimensión: valor} para acotar el desglose (drill-down)
+        """
+        definicion = DESGLOSES[tabla]
+        invalidas = [d for d in list(dimensiones) + list(filtros or {}) if d not in definicion["dimensiones"]]
+        if invalidas:
+            raise ValueError(f"Dimensiones no disponibles para {tabla}: {', '.join(invalidas)}")
+
+        condiciones, parametros = [], []
+        if desde:
+            condiciones.append(f"{definicion['fecha']} >= ?")
+            parametros.append(desde)
+        if hasta:
+            condiciones.append(f"{definicion['fecha']} < CAST(? AS DATE) + INTERVAL 1 DAY")
+            parametros.append(hasta)
+        for dimension, valor in (filtros or {}).items():
+            condiciones.append(f"{definicion['dimensiones'][dimension]} = ?")
+            parametros.append(valor)
+
+        columnas = [f"{definicion['dimensiones'][d]} AS {d}" for d in dimensiones]
+        medidas = [f"{expresion} AS {nombre}" for nombre, expresion in definicion["medidas"].items()]
+        sql = f"SELECT {', '.join(columnas + medidas)} FROM {tabla}"
+        if condiciones:
+            sql += " WHERE " + " AND ".join(condiciones)
+        if dimensiones:
+            orden = ", ".join(str(i + 1) for i in range(len(dimensiones)))
+            sql += f" GROUP BY {orden} ORDER BY {orden}"
+        return self.consultar(sql, parametros)
+
+
+# Instancia global del motor
+_motor_instance = None
+
+def get_motor_analitico() -> MotorAnalitico:
+    """Retorna el motor analítico compartido del proceso"""
+    global _motor_instance
+    if _motor_instance is None:
+        _motor_instance = MotorAnalitico()
+    return _motor_instance
+
+
+# ==================== SCORECARD POR ÁREA ====================
+
+# Agregados por área de cada tabla; se combinan con un join vectorizado
+CONSULTAS_SCORECARD = {
+    "riesgos": """
+        SELECT area,
+               COUNT(*) AS riesgos_vigentes,
+               COUNT(*) FILTER (WHERE clasificacion IN ('Alto', 'Crítico')) AS riesgos_altos
+        FROM riesgos
+        WHERE estado <> 'cerrado'
+        GROUP BY area
+    """,
+    "incidentes": """
+        SELECT area,
+               COUNT(*) AS incidentes,
+               COUNT(*) FILTER (WHERE tipo LIKE 'Accidente%') AS accidentes,
+               SUM(COALESCE(dias_descanso_medico, 0)) AS dias_perdidos
+        FROM incidentes
+        WHERE fecha_hora >= ? AND fecha_hora < CAST(? AS DATE) + INTERVAL 1 DAY
+        GROUP BY area
+    """,
+    "inspecciones": """
+        SELECT area,
+               COUNT(*) AS inspecciones,
+               ROUND(AVG(porcentaje_cumplimiento), 1) AS cumplimiento
+        FROM inspecciones
+        WHERE estado = 'completada'
+          AND fecha_realizada >= ? AND fecha_realizada < CAST(? AS DATE) + INTERVAL 1 DAY
+        GROUP BY area
+    """,
+    "capacitacion": """
+        SELECT u.area,
+               SUM(COALESCE(c.duracion_horas, 0)) AS horas_capacitacion
+        FROM asistentes_capacitacion a
+        JOIN capacitaciones c ON c.id = a.capacitacion_id
+        JOIN usuarios u ON u.id = a.usuario_id
+        WHERE a.asistio AND c.estado = 'realizada'
+          AND c.fecha_realizada >= ? AND c.fecha_realizada < CAST(? AS DATE) + INTERVAL 1 DAY
+        GROUP BY u.area
+    """,
+    "epp": """
+        SELECT u.area,
+               COUNT(*) FILTER (WHERE e.fecha_vencimiento < current_date) AS epp_vencidos,
+               COUNT(*) FILTER (
+                   WHERE e.fecha_vencimiento >= current_date
+                     AND e.fecha_vencimiento < current_date + INTERVAL 30 DAY
+               ) AS epp_por_vencer
+        FROM epp_asignaciones e
+        JOIN usuarios u ON u.id = e.usuario_id
+        WHERE e.estado = 'activo'
+        GROUP BY u.area
+    """
+}
+
+# Conjuntos de la consulta que dependen del período
+PARAMETROS_PERIODO = {"incidentes", "inspecciones", "capacitacion"}
+
+
+def scorecard_areas(desde: str, hasta: str) -> pd.DataFrame:
+    """
+    Scorecard de todas las áreas: riesgos vigentes, incidentes, cumplimiento de
+    inspecciones, horas de capacitación y vencimientos de EPP
+
+    Una consulta agrupada por tabla (no una por área) y un outer join por área
+
+    Args:
+        desde, hasta: Período (ISO) de incidentes, inspecciones y capacitaciones
+    """
+    motor = get_motor_analitico()
+    scorecard = None
+    for nombre, sql in CONSULTAS_SCORECARD.items():
+        parcial = motor.consultar(sql, [desde, hasta] if nombre in PARAMETROS_PERIODO else None)
+        if parcial.empty:
+            continue
+        parcial = parcial.dropna(subset=["area"]).set_index("area")
+        scorecard = parcial if scorecard is None else scorecard.join(parcial, how="outer")
+
+    if scorecard is None:
+        return pd.DataFrame()
+
+    conteos = [c for c in scorecard.columns if c != "cumplimiento"]
+    scorecard[conteos] = scorecard[conteos].fillna(0)
+    return scorecard.reset_index().sort_values("area")
@@ -0,0 +1,151 @@
+"""
+Caché de datos compartida por todas las sesiones del proceso
+
+Los datos de referencia (usuarios, checklists, catálogo de EPP) y los KPI
+agregados se cargan una sola vez por cambio, no una vez por sesión y rerun.
+Cada tabla se vigila con una marca de agua (máxima fecha_actualizacion y
+total de filas) consultada como máximo cada INTERVALO_VERIFICACION segundos,
+sin importar cuántas sesiones la lean; si la marca cambia, los conjuntos que
+dependen de la tabla se recargan una vez (con un bloqueo por conjunto para que
+sesiones concurrentes no repitan la consulta).
+"""
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import threading
+import time
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+
+
+# Segundos durante los que una marca de agua se considera vigente
+INTERVALO_VERIFICACION = 30
+
+
+class CacheDatos:
+    """Conjuntos de datos compartidos, invalidados por marca de agua"""
+
+    def __init__(self, intervalo: int = INTERVALO_VERIFICACION):
+        self.intervalo = intervalo
+        self._marcas: Dict[str, Dict] = {}      # tabla -> {"marca", "verificado"}
+        self._conjuntos: Dict[str, Dict] = {}   # nombre -> {"datos", "version"}
+        self._bloqueos: Dict[str, threading.Lock] = {}
+        self._bloqueo = threading.Lock()
+
+    def _bloqueo_de(self, clave: str) -> threading.Lock:
+        with self._bloqueo:
+            return self._bloqueos.setdefault(clave, threading.Lock())
+
+    def marca_tabla(self, tabla: str) -> Optional[Tuple]:
+        """
+        Marca de agua vigente de una tabla (consulta a lo sumo una vez por intervalo)
+
+        Returns:
+            tuple: (max_fecha_actualizacion, total) o None si no se pudo obtener
+        """
+        entrada = self._marcas.get(tabla)
+        if entrada and time.monotonic() - entrada["verificado"] < self.intervalo:
+            return entrada["marca"]
+
+        with self._bloqueo_de(f"marca:{tabla}"):
+            entrada = self._marcas.get(tabla)
+            if entrada and time.monotonic() - entrada["verificado"] < self.intervalo:
+                return entrada["marca"]
+
+            marca_agua = get_supabase_client().obtener_marca_agua(tabla)
+            marca = None
+            if marca_agua["total"] is not None:
+                marca = (marca_agua["max_fecha_actualizacion"], marca_agua["total"])
+            self._marcas[tabla] = {"marca": marca, "verificado": time.monotonic()}
+            return marca
+
+    def version(self, tablas: List[str]) -> Optional[Tuple]:
+        """Versión combinada de varias tablas (None si alguna no tiene marca)"""
+        marcas = tuple((tabla, self.marca_tabla(tabla)) for tabla in sorted(set(tablas)))
+        if any(marca is None for _, marca in marcas):
+            return None
+        return marcas
+
+    def obtener(self, nombre: str, tablas: List[str], cargar: Callable[[], Any]) -> Any:
+        """
+        Retorna un conjunto de datos, recargándolo solo si cambió alguna de sus tablas
+
+        Args:
+            nombre: Identificador del conjunto
+            tablas: Tablas de las que depende
+            cargar: Consulta que produce los datos
+        """
+        version = self.version(tablas)
+        if version is None:
+            return cargar()
+
+        conjunto = self._conjuntos.get(nombre)
+        if conjunto and conjunto["version"] == version:
+            return conjunto["datos"]
+
+        with self._bloqueo_de(f"conjunto:{nombre}"):
+            # Otra sesión pudo recargarlo mientras se esperaba el bloqueo
+            conjunto = self._conjuntos.get(nombre)
+            if conjunto and conjunto["version"] == version:
+                return conjunto["datos"]
+
+            datos = cargar()
+            self._conjuntos[nombre] = {"datos": datos, "version": version}
+            return datos
+
+    def invalidar(self, tabla: Optional[str] = None):
+        """Fuerza a releer la marca de agua de una tabla (o de todas)"""
+        if tabla is None:
+            self._marcas.clear()
+        else:
+            self._marcas.pop(tabla, None)
+
+
+# Instancia global de la caché
+_cache_instance = None
+
+def get_cache_datos() -> CacheDatos:
+    """Retorna la caché de datos compartida del proceso"""
+    global _cache_instance
+    if _cache_instance is None:
+        _cache_instance = CacheDatos()
+    return _cache_instance
+
+
+def invalidar_tabla(tabla: Optional[str] = None):
+    """Fuerza a releer la marca de agua de una tabla (llamar tras registrar datos)"""
+    get_cache_datos().invalidar(tabla)
+
+
+# ==================== DATOS DE REFERENCIA ====================
+# Las listas son compartidas entre sesiones: no modificar los registros
+
+def usuarios_activos() -> List[Dict]:
+    """Usuarios activos (selectores de responsables, asistentes, etc.)"""
+    return get_cache_datos().obtener(
+        "usuarios_activos", ["usuarios"], lambda: get_supabase_client().listar_usuarios()
+    )
+
+
+def checklists_activos() -> List[Dict]:
+    """Checklists activos para programar inspecciones"""
+    return get_cache_datos().obtener(
+        "checklists_activos", ["checklists"], lambda: get_supabase_client().listar_checklists()
+    )
+
+
+def catalogo_epp(activos_solo: bool = True) -> List[Dict]:
+    """Catálogo de EPP"""
+    return get_cache_datos().obtener(
+        f"catalogo_epp_{'activos' if activos_solo else 'todos'}", ["epp_catalogo"],
+        lambda: get_supabase_client().listar_epp(activos_solo=activos_solo)
+    )
+
+
+def matriz_riesgo_vigente() -> Optional[Dict]:
+    """Versión activa de la matriz de clasificación de riesgos"""
+    return get_cache_datos().obtener(
+        "matriz_riesgo", ["matrices_riesgo"], lambda: get_supabase_client().obtener_matriz_riesgo_activa()
+    )
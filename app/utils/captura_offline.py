@@ -0,0 +1,302 @@
+"""
+Captura de inspecciones sin conexión
+
+Las respuestas, hallazgos y evidencias de una inspección se guardan primero en
+un SQLite local, sin ida y vuelta a Supabase. Cuando hay conexión, las
+capturas pendientes se envían por lotes: evidencias en paralelo y un solo RPC
+por lote (sincronizar_capturas_inspeccion). Una captura solo se aplica si la
+inspección no cambió en el servidor desde que se capturó (fecha_actualizacion);
+si cambió, queda en conflicto hasta que el inspector la fuerce o la descarte.
+Cada captura viaja con el hash de su contenido, que la inspección guarda al
+aplicarla: reenviar un lote cuya respuesta se perdió no la marca en conflicto.
+
+Limitación: el inicio de sesión (auth.login) pasa por Supabase Auth, así que
+sin conexión no se puede abrir una sesión nueva. La captura sin conexión sirve
+a una sesión iniciada antes del corte (vive en st.session_state) y a una app
+que corre en el mismo equipo del inspector; el espejo local debe haberse
+sincronizado antes de salir a campo para tener las inspecciones programadas.
+"""
+from datetime import datetime
+from typing import Dict, List, Optional
+import threading
+import sqlite3
+import hashlib
+import json
+import time
+import uuid
+import sys
+import os
+
+import requests
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from utils.almacenamiento import subir_varios
+from utils.ejecucion_checklist import id_hallazgo_item
+from config import settings
+from config.settings import STORAGE_BUCKETS
+
+
+# Capturas por llamada al RPC de sincronización
+TAMANO_LOTE_SINCRONIZACION = 20
+
+# Segundos mínimos entre dos intentos automáticos de sincronización
+INTERVALO_REINTENTO = 60
+
+# Segundos durante los que se reutiliza la última comprobación de conexión
+VIGENCIA_CONEXION = 15
+
+_conexion = (0.0, False)
+
+
+def hay_conexion(timeout: float = 3) -> bool:
+    """Comprueba si Supabase responde (cualquier respuesta HTTP cuenta)"""
+    global _conexion
+    instante, conectado = _conexion
+    if time.monotonic() - instante < VIGENCIA_CONEXION:
+        return conectado
+    try:
+        requests.head(settings.SUPABASE_URL, timeout=timeout)
+        conectado = True
+    except requests.RequestException:
+        conectado = False
+    _conexion = (time.monotonic(), conectado)
+    return conectado
+
+
+class CapturaOffline:
+    """Almacén local de capturas de inspección pendientes de sincronizar"""
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta or settings.CAPTURA_OFFLINE_PATH
+        self._bloqueo = threading.Lock()
+        self._ultimo_intento = 0.0
+
+        os.makedirs(os.path.dirname(os.path.abspath(self.ruta)), exist_ok=True)
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS capturas ("
+                "inspeccion_id TEXT PRIMARY KEY, codigo TEXT, datos TEXT, respuestas TEXT, "
+                "fecha_base TEXT, fecha_captura TEXT, estado TEXT DEFAULT 'pendiente', detalle TEXT)"
+            )
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS hallazgos ("
+                "id TEXT PRIMARY KEY, inspeccion_id TEXT, datos TEXT, "
+                "evidencia_nombre TEXT, evidencia_tipo TEXT, evidencia BLOB)"
+            )
+
+    def _conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    # ==================== CAPTURA ====================
+
+    def guardar_captura(self, inspeccion: Dict, datos: Dict, respuestas: List[Dict],
+                        hallazgos_items: Optional[List[Dict]] = None):
+        """
+        Guarda (o reemplaza) la captura de una inspección
+
+        Args:
+            inspeccion: Fila de la inspección tal como se leyó (id, codigo, fecha_actualizacion)
+            datos: Campos a actualizar (estado, fecha_realizada, observaciones, puntajes)
+            respuestas: [{"indice_item", "pregunta", "respuesta", "es_critico", "peso", "observacion"}]
+            hallazgos_items: Hallazgos de los ítems no conformes (id estable por ítem);
+                             reemplazan a los de una captura anterior de la misma inspección
+        """
+        generados = [(id_hallazgo_item(inspeccion["id"], r["indice_item"]),) for r in respuestas]
+        with self._conectar() as con:
+            # La fecha base es la de la primera captura: recapturar no oculta un conflicto
+            con.execute(
+                "INSERT INTO capturas (inspeccion_id, codigo, datos, respuestas, fecha_base, fecha_captura) "
+                "VALUES (?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(inspeccion_id) DO UPDATE SET datos = excluded.datos, "
+                "respuestas = excluded.respuestas, fecha_captura = excluded.fecha_captura",
+                (inspeccion["id"], inspeccion["codigo"], json.dumps(datos, default=str),
+                 json.dumps(respuestas), inspeccion.get("fecha_actualizacion"),
+                 datetime.now().isoformat())
+            )
+            if hallazgos_items is not None:
+                con.executemany("DELETE FROM hallazgos WHERE id = ?", generados)
+                con.executemany(
+                    "INSERT INTO hallazgos (id, inspeccion_id, datos) VALUES (?, ?, ?)",
+                    [(h["id"], inspeccion["id"], json.dumps({k: v for k, v in h.items() if k != "id"}))
+                     for h in hallazgos_items]
+                )
+
+    def agregar_hallazgo(self, inspeccion: Dict, datos: Dict, evidencia=None) -> str:
+        """
+        Agrega un hallazgo a la captura; el id se genera aquí para que reintentar
+        la sincronización no lo duplique
+
+        Args:
+            inspeccion: Fila de la inspección (si aún no tiene captura, se crea una vacía)
+            evidencia: Archivo de st.file_uploader (opcional), se guarda en el SQLite
+        """
+        hallazgo_id = str(uuid.uuid4())
+        inspeccion_id = inspeccion["id"]
+        with self._conectar() as con:
+            con.execute(
+                "INSERT OR IGNORE INTO capturas (inspeccion_id, codigo, datos, respuestas, fecha_base, fecha_captura) "
+                "VALUES (?, ?, '{}', '[]', ?, ?)",
+                (inspeccion_id, inspeccion["codigo"], inspeccion.get("fecha_actualizacion"),
+                 datetime.now().isoformat())
+            )
+            con.execute(
+                "INSERT INTO hallazgos (id, inspeccion_id, datos, evidencia_nombre, evidencia_tipo, evidencia) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (hallazgo_id, inspeccion_id, json.dumps(datos, default=str),
+                 evidencia.name if evidencia else None, evidencia.type if evidencia else None,
+                 evidencia.getvalue() if evidencia else None)
+            )
+        return hallazgo_id
+
+    def descartar(self, inspeccion_id: str):
+        """Elimina la captura de una inspección con sus hallazgos"""
+        with self._conectar() as con:
+            con.execute("DELETE FROM hallazgos WHERE inspeccion_id = ?", (inspeccion_id,))
+            con.execute("DELETE FROM capturas WHERE inspeccion_id = ?", (inspeccion_id,))
+
+    def forzar(self, inspeccion_id: str):
+        """Marca una captura en conflicto para sobrescribir los cambios del servidor"""
+        with self._conectar() as con:
+            con.execute(
+                "UPDATE capturas SET estado = 'forzada', detalle = NULL WHERE inspeccion_id = ?",
+                (inspeccion_id,)
+            )
+
+    def listar(self) -> List[Dict]:
+        """Capturas guardadas con la cantidad de hallazgos de cada una"""
+        with self._conectar() as con:
+            con.row_factory = sqlite3.Row
+            filas = con.execute(
+                "SELECT c.inspeccion_id, c.codigo, c.estado, c.detalle, c.fecha_captura, "
+                "COUNT(h.id) AS hallazgos, COUNT(h.evidencia_nombre) AS evidencias "
+                "FROM capturas c LEFT JOIN hallazgos h ON h.inspeccion_id = c.inspeccion_id "
+                "GROUP BY c.inspeccion_id ORDER BY c.fecha_captura"
+            ).fetchall()
+        return [dict(f) for f in filas]
+
+    # ==================== SINCRONIZACIÓN ====================
+
+    def _lote(self, con: sqlite3.Connection) -> List[Dict]:
+        """Siguiente lote de capturas pendientes o forzadas, con sus hallazgos"""
+        con.row_factory = sqlite3.Row
+        capturas = [dict(f) for f in con.execute(
+            "SELECT * FROM capturas WHERE estado IN ('pendiente', 'forzada') "
+            "ORDER BY fecha_captura LIMIT ?", (TAMANO_LOTE_SINCRONIZACION,)
+        )]
+        for captura in capturas:
+            captura["hallazgos"] = [dict(h) for h in con.execute(
+                "SELECT * FROM hallazgos WHERE inspeccion_id = ? ORDER BY id", (captura["inspeccion_id"],)
+            )]
+        return capturas
+
+    def _enviar_lote(self, capturas: List[Dict]) -> Optional[Dict[str, int]]:
+        """Sube las evidencias del lote y aplica las capturas con un solo RPC"""
+        supabase = get_supabase_client()
+
+        con_evidencia = [h for c in capturas for h in c["hallazgos"] if h["evidencia"] is not None]
+        urls = subir_varios([
+            {"bucket": STORAGE_BUCKETS["evidencias"], "origen": h["evidencia"],
+             "tipo_contenido": h["evidencia_tipo"], "nombre": h["evidencia_nombre"]}
+            for h in con_evidencia
+        ], mostrar_progreso=False)
+        if not all(urls):
+            return None
+        evidencias = {h["id"]: url for h, url in zip(con_evidencia, urls)}
+
+        envio = []
+        for c in capturas:
+            respuestas = json.loads(c["respuestas"] or "[]")
+            contenido = {
+                "inspeccion_id": c["inspeccion_id"],
+                "fecha_base": c["fecha_base"],
+                "inspeccion": json.loads(c["datos"]),
+                "respuestas": respuestas,
+                "hallazgos": [
+                    {**json.loads(h["datos"]), "id": h["id"], "evidencia_url": evidencias.get(h["id"])}
+                    for h in c["hallazgos"]
+                ],
+                # Un ítem que dejó de ser "no" retira el hallazgo que generó en una sincronización anterior
+                "hallazgos_retirados": [
+                    id_hallazgo_item(c["inspeccion_id"], r["indice_item"])
+                    for r in respuestas if r["respuesta"] != "no"
+                ]
+            }
+            # Las URLs de evidencias son por contenido: la misma captura da el mismo hash
+            captura = hashlib.sha256(json.dumps(contenido, sort_keys=True, default=str).encode("utf-8"))
+            envio.append({**contenido, "captura": captura.hexdigest(), "forzar": c["estado"] == "forzada"})
+        resultados = supabase.sincronizar_capturas_inspeccion(envio)
+        if resultados is None:
+            return None
+
+        conteo = {"sincronizadas": 0, "conflictos": 0, "errores": 0}
+        with self._conectar() as con:
+            for r in resultados:
+                if r["resultado"] == "sincronizada":
+                    con.execute("DELETE FROM hallazgos WHERE inspeccion_id = ?", (r["captura"],))
+                    con.execute("DELETE FROM capturas WHERE inspeccion_id = ?", (r["captura"],))
+                    conteo["sincronizadas"] += 1
+                elif r["resultado"] == "conflicto":
+                    con.execute(
+                        "UPDATE capturas SET estado = 'conflicto', "
+                        "detalle = 'La inspección se modificó en el servidor después de capturarla' "
+                        "WHERE inspeccion_id = ?", (r["captura"],)
+                    )
+                    conteo["conflictos"] += 1
+                else:
+                    con.execute(
+                        "UPDATE capturas SET estado = 'error', detalle = 'La inspección ya no existe' "
+                        "WHERE inspeccion_id = ?", (r["captura"],)
+                    )
+                    conteo["errores"] += 1
+        return conteo
+
+    def sincronizar(self, forzar: bool = False) -> Optional[Dict[str, int]]:
+        """
+        Envía las capturas pendientes por lotes si hay conexión
+
+        Args:
+            forzar: Ignora el intervalo entre intentos automáticos
+
+        Returns:
+            dict: {"sincronizadas", "conflictos", "errores"}; None si no se intentó o
+                  no hubo conexión
+        """
+        if not forzar and time.monotonic() - self._ultimo_intento < INTERVALO_REINTENTO:
+            return None
+
+        with self._bloqueo:
+            self._ultimo_intento = time.monotonic()
+            with self._conectar() as con:
+                pendientes = con.execute(
+                    "SELECT COUNT(*) FROM capturas WHERE estado IN ('pendiente', 'forzada')"
+                ).fetchone()[0]
+            if not pendientes or not hay_conexion():
+                return None
+
+            total = {"sincronizadas": 0, "conflictos": 0, "errores": 0}
+            while True:
+                with self._conectar() as con:
+                    lote = self._lote(con)
+                if not lote:
+                    break
+                conteo = self._enviar_lote(lote)
+                # Sin respuesta por captura el lote seguiría pendiente: no se reintenta en bucle
+                if conteo is None or not any(conteo.values()):
+                    break
+                for clave in total:
+                    total[clave] += conteo[clave]
+            return total
+
+
+# Instancia global del almacén de capturas
+_captura_instance = None
+
+def get_captura_offline() -> CapturaOffline:
+    """Retorna el almacén local de capturas de inspección"""
+    global _captura_instance
+    if _captura_instance is None:
+        _captura_instance = CapturaOffline()
+    return _captura_instance
@@ -0,0 +1,90 @@
+"""
+Archivos direccionados por contenido
+
+Cada archivo se identifica por el SHA-256 de su contenido, calculado leyendo
+por bloques. Si el bucket ya tiene ese contenido no se vuelve a subir; si es
+nuevo se guarda bajo contenido/<hash>, de modo que dos archivos con el mismo
+nombre no se pisan. Las referencias las cuentan los triggers de las tablas que
+guardan las URLs, así que solo cuentan los registros que llegan a existir; los
+archivos que quedan sin uso se eliminan con purgar_sin_referencias.
+"""
+from typing import Optional
+import time
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from utils.almacenamiento import Origen, Progreso, get_almacenamiento, calcular_hash
+
+
+# Segundos mínimos entre dos purgas de archivos sin uso (por proceso)
+INTERVALO_PURGA = 3600
+
+_ultima_purga = 0.0
+
+
+def ruta_contenido(hash_contenido: str, nombre: str) -> str:
+    """Ruta de almacenamiento de un contenido (conserva la extensión del nombre)"""
+    extension = os.path.splitext(nombre)[1].lower()
+    return f"contenido/{hash_contenido[:2]}/{hash_contenido}{extension}"
+
+
+def subir_contenido(bucket: str, origen: Origen, nombre: str,
+                    tipo_contenido: str = "application/octet-stream",
+                    progreso: Progreso = None) -> Optional[str]:
+    """
+    Sube un archivo deduplicado por contenido
+
+    La referencia se cuenta cuando un registro guarda la URL retornada; si ese
+    registro no llega a crearse, el archivo queda sin uso y se purga después.
+
+    Args:
+        bucket: Bucket de destino
+        origen: bytes, ruta local o archivo abierto
+        nombre: Nombre original (aporta la extensión)
+
+    Returns:
+        str: URL pública del archivo (nuevo o ya existente), o None si falló
+    """
+    supabase = get_supabase_client()
+    almacenamiento = get_almacenamiento()
+    hash_contenido, tamano = calcular_hash(origen)
+
+    existente = supabase.buscar_contenido(bucket, hash_contenido)
+    if existente:
+        if progreso:
+            progreso(tamano, tamano)
+        url = almacenamiento.url_publica(bucket, existente["ruta"])
+    else:
+        ruta = ruta_contenido(hash_contenido, nombre)
+        if not almacenamiento.subir(bucket, ruta, origen, tipo_contenido, progreso):
+            return None
+        registro = supabase.registrar_contenido(bucket, hash_contenido, ruta, tamano, tipo_contenido)
+        # Otra subida simultánea del mismo contenido pudo registrarlo con otra extensión
+        url = almacenamiento.url_publica(bucket, registro["ruta"] if registro else ruta)
+
+    purgar_sin_referencias()
+    return url
+
+
+def purgar_sin_referencias(forzar: bool = False) -> int:
+    """
+    Elimina los archivos que ningún registro usa desde hace más de un día
+    (registros borrados o que no llegaron a crearse); a lo sumo una vez por intervalo
+
+    Returns:
+        int: Archivos eliminados
+    """
+    global _ultima_purga
+    if not forzar and time.monotonic() - _ultima_purga < INTERVALO_PURGA:
+        return 0
+    _ultima_purga = time.monotonic()
+
+    almacenamiento = get_almacenamiento()
+    eliminados = 0
+    for archivo in get_supabase_client().purgar_contenido_sin_referencias():
+        if almacenamiento.eliminar(archivo["bucket"], archivo["ruta"]):
+            eliminados += 1
+    return eliminados
@@ -0,0 +1,76 @@
+"""
+Puntaje de la ejecución de un checklist
+
+Cada ítem pesa su "peso" (o PESO_CRITICO / 1 según es_critico); las respuestas
+"na" no cuentan. El puntaje se calcula con arreglos sobre todos los ítems a la
+vez y alimenta puntaje_total / puntaje_obtenido de la inspección, de donde la
+base deriva porcentaje_cumplimiento. Los ítems no conformes generan hallazgos.
+"""
+from typing import Dict, List
+import uuid
+
+import numpy as np
+
+
+PESO_CRITICO = 3.0
+PESO_NORMAL = 1.0
+
+
+def pesos_items(items: List[Dict]) -> np.ndarray:
+    """Peso de cada ítem del checklist, en orden"""
+    criticos = np.array([bool(item.get("es_critico")) for item in items], dtype=bool)
+    # Un peso explícito de 0 es válido (ítem informativo): solo None toma el predeterminado
+    explicitos = np.array([np.nan if item.get("peso") is None else item["peso"] for item in items], dtype=float)
+    return np.where(np.isnan(explicitos), np.where(criticos, PESO_CRITICO, PESO_NORMAL), explicitos)
+
+
+def calcular_puntaje(items: List[Dict], respuestas: List[Dict]) -> Dict:
+    """
+    Puntaje ponderado de una ejecución
+
+    Args:
+        items: Ítems del checklist
+        respuestas: [{"indice_item", "respuesta": "si" | "no" | "na"}]
+
+    Returns:
+        dict: puntaje_total, puntaje_obtenido, porcentaje y no_conformes (índices de ítems)
+    """
+    pesos = pesos_items(items)
+    valores = np.full(len(items), "na", dtype=object)
+    indices = np.array([r["indice_item"] for r in respuestas], dtype=int)
+    valores[indices] = [r["respuesta"] for r in respuestas]
+
+    aplica = valores != "na"
+    total = float(pesos[aplica].sum())
+    obtenido = float(pesos[valores == "si"].sum())
+    return {
+        "puntaje_total": round(total, 2),
+        "puntaje_obtenido": round(obtenido, 2),
+        "porcentaje": round(obtenido / total * 100, 2) if total else 0.0,
+        "no_conformes": np.flatnonzero(valores == "no").tolist()
+    }
+
+
+def id_hallazgo_item(inspeccion_id: str, indice_item: int) -> str:
+    """Id estable del hallazgo de un ítem: volver a guardar la ejecución no lo duplica"""
+    return str(uuid.uuid5(uuid.UUID(inspeccion_id), f"item-{indice_item}"))
+
+
+def hallazgos_no_conformes(inspeccion: Dict, items: List[Dict], respuestas: List[Dict],
+                           no_conformes: List[int]) -> List[Dict]:
+    """Hallazgos de los ítems respondidos "no" (con id estable por ítem)"""
+    observaciones = {r["indice_item"]: r.get("observacion") for r in respuestas}
+    hallazgos = []
+    for i in no_conformes:
+        critico = bool(items[i].get("es_critico"))
+        descripcion = f"Ítem {i + 1}: {items[i]['pregunta']}"
+        if observaciones.get(i):
+            descripcion += f" — {observaciones[i]}"
+        hallazgos.append({
+            "id": id_hallazgo_item(inspeccion["id"], i),
+            "descripcion": descripcion,
+            "tipo": "No Conforme Mayor" if critico else "No Conforme Menor",
+            "severidad": "Alta" if critico else "Media",
+            "ubicacion": inspeccion.get("area")
+        })
+    return hallazgos
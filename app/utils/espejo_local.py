@@ -0,0 +1,322 @@
+"""
+Espejo local (SQLite) de las tablas SST con sincronización incremental
+
+Cada tabla se replica en un archivo SQLite trayendo solo las filas con
+fecha_actualizacion >= la última sincronizada menos VENTANA_RETRASO (columna
+mantenida por los triggers actualizar_fecha_actualizacion). Las eliminaciones se replican desde
+la tabla de tombstones registros_eliminados. Reportes, exportaciones y
+análisis consultan el espejo en lugar de la base de producción.
+"""
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import threading
+import sqlite3
+import json
+import time
+import sys
+import os
+
+import pandas as pd
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from config import settings
+
+
+TABLAS_ESPEJO = [
+    "usuarios",
+    "riesgos",
+    "checklists",
+    "inspecciones",
+    "hallazgos",
+    "capacitaciones",
+    "asistentes_capacitacion",
+    "incidentes",
+    "acciones_correctivas",
+    "epp_catalogo",
+    "epp_asignaciones",
+    "documentos",
+    "horas_hombre"
+]
+
+# Filas por solicitud a Supabase
+TAMANO_LOTE = 1000
+
+# Segundos mínimos entre dos sincronizaciones automáticas
+INTERVALO_SINCRONIZACION = 60
+
+# El trigger fija fecha_actualizacion = NOW(), el inicio de la transacción y no
+# su commit: una fila que confirma después de la última sincronización puede
+# llevar una fecha menor que la marca guardada. Cada sincronización vuelve a
+# pedir esta ventana (el upsert es idempotente)
+VENTANA_RETRASO = timedelta(minutes=5)
+
+
+def _identificador(nombre: str) -> str:
+    """Cita un nombre de tabla o columna para SQLite"""
+    return '"' + nombre.replace('"', '""') + '"'
+
+
+def _valor_sqlite(valor):
+    """Convierte un valor de PostgREST a uno almacenable en SQLite"""
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False)
+    return valor
+
+
+class EspejoLocal:
+    """Réplica local de solo lectura de las tablas SST"""
+
+    def __init__(self, ruta: Optional[str] = None):
+        self.ruta = ruta or settings.ESPEJO_LOCAL_PATH
+        self._bloqueo = threading.Lock()
+        self._sincronizado = 0.0
+
+        directorio = os.path.dirname(os.path.abspath(self.ruta))
+        os.makedirs(directorio, exist_ok=True)
+        with self._conectar() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute(
+                "CREATE TABLE IF NOT EXISTS _sincronizacion ("
+                "tabla TEXT PRIMARY KEY, ultima_actualizacion TEXT, fecha_sincronizacion TEXT)"
+            )
+            con.execute("CREATE TABLE IF NOT EXISTS _estado (clave TEXT PRIMARY KEY, valor TEXT)")
+
+    def _conectar(self) -> sqlite3.Connection:
+        # Una conexión por operación: Streamlit atiende cada sesión en su propio hilo
+        return sqlite3.connect(self.ruta, timeout=30)
+
+    # ==================== SINCRONIZACIÓN ====================
+
+    def _asegurar_tabla(self, con: sqlite3.Connection, tabla: str, columnas: List[str]):
+        """Crea la tabla o agrega columnas nuevas (el esquema sigue al de Supabase)"""
+        con.execute(f"CREATE TABLE IF NOT EXISTS {_identificador(tabla)} (id TEXT PRIMARY KEY)")
+        existentes = {fila[1] for fila in con.execute(f"PRAGMA table_info({_identificador(tabla)})")}
+        for columna in columnas:
+            if columna not in existentes:
+                con.execute(f"ALTER TABLE {_identificador(tabla)} ADD COLUMN {_identificador(columna)}")
+
+    def _guardar(self, con: sqlite3.Connection, tabla: str, filas: List[Dict]):
+        """Inserta o actualiza filas por id"""
+        columnas = sorted({clave for fila in filas for clave in fila})
+        self._asegurar_tabla(con, tabla, columnas)
+
+        nombres = ", ".join(_identificador(c) for c in columnas)
+        marcadores = ", ".join("?" for _ in columnas)
+        actualizaciones = ", ".join(
+            f"{_identificador(c)} = excluded.{_identificador(c)}" for c in columnas if c != "id"
+        )
+        con.executemany(
+            f"INSERT INTO {_identificador(tabla)} ({nombres}) VALUES ({marcadores}) "
+            f"ON CONFLICT(id) DO UPDATE SET {actualizaciones}",
+            [[_valor_sqlite(fila.get(c)) for c in columnas] for fila in filas]
+        )
+
+    def _ultima_actualizacion(self, con: sqlite3.Connection, tabla: str) -> Optional[str]:
+        fila = con.execute(
+            "SELECT ultima_actualizacion FROM _sincronizacion WHERE tabla = ?", (tabla,)
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def sincronizar_tabla(self, tabla: str) -> Optional[int]:
+        """
+        Trae los cambios de una tabla desde la última sincronización
+
+        Returns:
+            int: Filas recibidas, o None si la consulta falló (el cursor no avanza)
+        """
+        supabase = get_supabase_client()
+
+        with self._conectar() as con:
+            marca = self._ultima_actualizacion(con, tabla)
+        desde = (datetime.fromisoformat(marca) - VENTANA_RETRASO).isoformat() if marca else None
+
+        # Consulta inclusiva (>=): las filas con la misma marca de tiempo se
+        # vuelven a recibir y el upsert las deja igual. Los bloques siguientes
+        # continúan después de la última (fecha_actualizacion, id) vista: una fila
+        # modificada durante la sincronización pasa al final en lugar de desplazar
+        # los bloques y hacer saltar otra
+        recibidas = 0
+        maximo = marca
+        cursor = None
+        while True:
+            filas = supabase.listar_cambios(tabla, desde, cursor=cursor, tamano=TAMANO_LOTE)
+            if filas is None:
+                return None
+            if filas:
+                with self._conectar() as con:
+                    self._guardar(con, tabla, filas)
+                recibidas += len(filas)
+                fechas = [f["fecha_actualizacion"] for f in filas if f.get("fecha_actualizacion")]
+                if fechas:
+                    maximo = max([maximo] + fechas) if maximo else max(fechas)
+            if len(filas) < TAMANO_LOTE:
+                break
+            cursor = (filas[-1]["fecha_actualizacion"], filas[-1]["id"])
+
+        with self._conectar() as con:
+            con.execute(
+                "INSERT INTO _sincronizacion (tabla, ultima_actualizacion, fecha_sincronizacion) "
+                "VALUES (?, ?, datetime('now')) ON CONFLICT(tabla) DO UPDATE SET "
+                "ultima_actualizacion = excluded.ultima_actualizacion, "
+                "fecha_sincronizacion = excluded.fecha_sincronizacion",
+                (tabla, maximo)
+            )
+        return recibidas
+
+    def sincronizar_eliminaciones(self) -> Optional[int]:
+        """Aplica los tombstones de registros_eliminados posteriores al último procesado"""
+        supabase = get_supabase_client()
+
+        with self._conectar() as con:
+            fila = con.execute("SELECT valor FROM _estado WHERE clave = 'ultimo_tombstone'").fetchone()
+            ultimo = int(fila[0]) if fila else 0
+
+        aplicadas = 0
+        while True:
+            tombstones = supabase.listar_eliminaciones(ultimo, TAMANO_LOTE)
+            if tombstones is None:
+                return None
+            if not tombstones:
+                break
+
+            with self._conectar() as con:
+                existentes = {f[0] for f in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+                for t in tombstones:
+                    if t["tabla"] in TABLAS_ESPEJO and t["tabla"] in existentes:
+                        con.execute(f"DELETE FROM {_identificador(t['tabla'])} WHERE id = ?", (t["registro_id"],))
+                ultimo = max(t["id"] for t in tombstones)
+                con.execute(
+                    "INSERT INTO _estado (clave, valor) VALUES ('ultimo_tombstone', ?) "
+                    "ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor",
+                    (str(ultimo),)
+                )
+            aplicadas += len(tombstones)
+            if len(tombstones) < TAMANO_LOTE:
+                break
+
+        return aplicadas
+
+    def sincronizar(self, forzar: bool = False) -> Dict[str, Optional[int]]:
+        """
+        Sincroniza todas las tablas del espejo (a lo sumo una vez por intervalo)
+
+        Returns:
+            dict: {tabla: filas recibidas (None si falló)}; vacío si no tocaba sincronizar
+        """
+        if not forzar and time.monotonic() - self._sincronizado < INTERVALO_SINCRONIZACION:
+            return {}
+
+        with self._bloqueo:
+            if not forzar and time.monotonic() - self._sincronizado < INTERVALO_SINCRONIZACION:
+                return {}
+
+            resultado = {tabla: self.sincronizar_tabla(tabla) for tabla in TABLAS_ESPEJO}
+            # Tras los upserts: una fila recreada no debe quedar borrada por un tombstone anterior
+            resultado["registros_eliminados"] = self.sincronizar_eliminaciones()
+            self._sincronizado = time.monotonic()
+            return resultado
+
+    def version_tabla(self, tabla: str) -> Optional[tuple]:
+        """
+        Versión local de una tabla: (última fecha_actualizacion, total de filas);
+        el total cambia con las eliminaciones. None si la tabla aún no existe
+        """
+        with self._conectar() as con:
+            existe = con.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)
+            ).fetchone()
+            if not existe:
+                return None
+            total = con.execute(f"SELECT COUNT(*) FROM {_identificador(tabla)}").fetchone()[0]
+            return (self._ultima_actualizacion(con, tabla), total)
+
+    def estado(self) -> pd.DataFrame:
+        """Última sincronización de cada tabla"""
+        return self.consultar("SELECT * FROM _sincronizacion ORDER BY tabla")
+
+    # ==================== CONSULTAS ====================
+
+    def consultar(self, sql: str, parametros: tuple = ()) -> pd.DataFrame:
+        """
+        Ejecuta una consulta de lectura sobre el espejo
+
+        Las tablas se crean con la primera fila recibida: una consulta sobre una
+        tabla aún vacía en Supabase retorna un DataFrame vacío
+        """
+        with self._conectar() as con:
+            try:
+                return pd.read_sql_query(sql, con, params=parametros)
+            except pd.errors.DatabaseError as e:
+                if "no such table" in str(e):
+                    return pd.DataFrame()
+                raise
+
+    def leer_tabla(self, tabla: str, orden: Optional[str] = None) -> pd.DataFrame:
+        """Contenido completo de una tabla del espejo (vacío si aún no se sincronizó)"""
+        if tabla not in TABLAS_ESPEJO:
+            raise ValueError(f"Tabla fuera del espejo: {tabla}")
+        with self._conectar() as con:
+            existe = con.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)
+            ).fetchone()
+            if not existe:
+                return pd.DataFrame()
+            sql = f"SELECT * FROM {_identificador(tabla)}"
+            if orden:
+                sql += f" ORDER BY {_identificador(orden)} DESC"
+            return pd.read_sql_query(sql, con)
+
+    def indices_seguridad(self, periodo_desde: Optional[str] = None,
+                          periodo_hasta: Optional[str] = None) -> pd.DataFrame:
+        """Consolidado mensual por área equivalente a la vista v_indices_seguridad"""
+        sql = """
+            WITH incidentes_mes AS (
+                SELECT area,
+                       strftime('%Y-%m-01', fecha_hora) AS periodo,
+                       COUNT(*) AS total_incidentes,
+                       SUM(tipo = 'Accidente Incapacitante') AS accidentes_incapacitantes,
+                       COALESCE(SUM(dias_descanso_medico), 0) AS dias_perdidos
+                FROM incidentes
+                GROUP BY area, strftime('%Y-%m-01', fecha_hora)
+            ),
+            horas AS (
+                SELECT area, substr(periodo, 1, 10) AS periodo, horas_trabajadas, numero_trabajadores
+                FROM horas_hombre
+            ),
+            consolidado AS (
+                SELECT h.area, h.periodo, h.horas_trabajadas, h.numero_trabajadores,
+                       COALESCE(im.total_incidentes, 0) AS total_incidentes,
+                       COALESCE(im.accidentes_incapacitantes, 0) AS accidentes_incapacitantes,
+                       COALESCE(im.dias_perdidos, 0) AS dias_perdidos
+                FROM horas h
+                LEFT JOIN incidentes_mes im ON h.area = im.area AND h.periodo = im.periodo
+                UNION ALL
+                SELECT im.area, im.periodo, NULL, NULL,
+                       im.total_incidentes, im.accidentes_incapacitantes, im.dias_perdidos
+                FROM incidentes_mes im
+                WHERE NOT EXISTS (SELECT 1 FROM horas h WHERE h.area = im.area AND h.periodo = im.periodo)
+            )
+            SELECT * FROM consolidado
+            WHERE (? IS NULL OR periodo >= ?) AND (? IS NULL OR periodo <= ?)
+            ORDER BY periodo
+        """
+        return self.consultar(sql, (periodo_desde, periodo_desde, periodo_hasta, periodo_hasta))
+
+
+# Instancia global del espejo
+_espejo_instance = None
+
+def get_espejo_local(sincronizar: bool = True) -> EspejoLocal:
+    """
+    Retorna el espejo local, sincronizándolo si pasó el intervalo
+
+    Con sincronizar=False se lee lo ya replicado (p. ej. sin conexión)
+    """
+    global _espejo_instance
+    if _espejo_instance is None:
+        _espejo_instance = EspejoLocal()
+    if sincronizar:
+        _espejo_instance.sincronizar()
+    return _espejo_instance
@@ -0,0 +1,49 @@
+"""
+Caché de figuras y agregados de dashboards por versión de datos
+
+Las métricas y figuras plotly de cada dashboard se memorizan con
+st.cache_data (compartido entre sesiones) bajo la clave (dashboard,
+versión de datos, parámetros). La versión proviene de las marcas de agua de
+la caché de datos compartida, que se consultan a lo sumo una vez por
+intervalo; así una interacción en otra parte de la página no recalcula los
+gráficos.
+"""
+from typing import Callable, Dict, List, Optional
+import json
+import sys
+import os
+
+import streamlit as st
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.cache_datos import get_cache_datos
+
+
+@st.cache_data(show_spinner=False, max_entries=128)
+def _memorizar(dashboard: str, version: str, parametros: str, _construir: Callable[[], Dict]):
+    return _construir()
+
+
+def memorizar_figuras(dashboard: str, version, construir: Callable[[], Optional[Dict]],
+                      parametros: Optional[Dict] = None) -> Optional[Dict]:
+    """Memoriza las figuras de un dashboard para una versión de datos ya conocida"""
+    return _memorizar(dashboard, json.dumps(version, default=str),
+                      json.dumps(parametros or {}, sort_keys=True, default=str), construir)
+
+
+def datos_dashboard(dashboard: str, tablas: List[str], construir: Callable[[], Optional[Dict]],
+                    parametros: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Retorna las métricas/figuras de un dashboard, recalculándolas solo si cambian los datos
+
+    Args:
+        dashboard: Identificador del dashboard
+        tablas: Tablas de las que dependen las figuras
+        construir: Consulta los datos y arma {"metricas": ..., "figuras": ...} (o None si no hay datos)
+        parametros: Selecciones del usuario que alteran las figuras
+    """
+    version = get_cache_datos().version(tablas)
+    if version is None:
+        return construir()
+    return memorizar_figuras(dashboard, version, construir, parametros)
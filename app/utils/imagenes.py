@@ -0,0 +1,181 @@
+"""
+Procesamiento de imágenes de evidencias (Pillow)
+
+Las fotos se suben re-codificadas a un tamaño acotado y sin metadatos EXIF
+(ubicación GPS, modelo del teléfono), junto con una miniatura que usan los
+listados y los PDF. El procesamiento corre en un pool de hilos para que
+varias fotos se preparen a la vez, y adjuntar_evidencias lo hace (junto con la
+subida) fuera de la sesión: el formulario no espera a Pillow. Solo las fotos
+van a segundo plano; videos y documentos se suben en la sesión, con avance.
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import time
+import sys
+import io
+import os
+
+from PIL import Image, ImageOps
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from utils.almacenamiento import subir_varios
+from utils.cache_datos import invalidar_tabla
+
+
+# Lado mayor de la imagen almacenada y de la miniatura (px)
+LADO_MAXIMO = 2048
+LADO_MINIATURA = 320
+CALIDAD_JPEG = 85
+
+EXTENSIONES_IMAGEN = (".jpg", ".jpeg", ".png", ".webp")
+
+_pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 2)
+
+# Trabajos de evidencias en curso (procesamiento + subida + registro)
+_segundo_plano = ThreadPoolExecutor(max_workers=2)
+REINTENTOS_REGISTRO = 3
+
+
+def es_imagen(nombre: str) -> bool:
+    """Indica si un archivo es una foto que conviene procesar"""
+    return nombre.lower().endswith(EXTENSIONES_IMAGEN)
+
+
+def _codificar(imagen: Image.Image) -> io.BytesIO:
+    salida = io.BytesIO()
+    # Sin exif=...: Pillow no copia los metadatos del original
+    imagen.save(salida, format="JPEG", quality=CALIDAD_JPEG, optimize=True, progressive=True)
+    salida.seek(0)
+    return salida
+
+
+def procesar_imagen(origen: BinaryIO) -> Tuple[io.BytesIO, io.BytesIO]:
+    """
+    Re-codifica una foto a JPEG de lado máximo LADO_MAXIMO y genera su miniatura
+
+    La orientación EXIF se aplica a los píxeles antes de descartar los metadatos.
+
+    Returns:
+        tuple: (imagen optimizada, miniatura)
+    """
+    if hasattr(origen, "seek"):
+        origen.seek(0)
+    with Image.open(origen) as original:
+        imagen = ImageOps.exif_transpose(original).convert("RGB")
+
+    imagen.thumbnail((LADO_MAXIMO, LADO_MAXIMO), Image.Resampling.LANCZOS)
+    optimizada = _codificar(imagen)
+
+    imagen.thumbnail((LADO_MINIATURA, LADO_MINIATURA), Image.Resampling.LANCZOS)
+    return optimizada, _codificar(imagen)
+
+
+def preparar_evidencias(archivos: list, bucket: str) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Arma las subidas de un conjunto de evidencias procesando las fotos en paralelo
+
+    Las subidas no llevan ruta: subir_varios las guarda por contenido, así una
+    foto repetida no se sube dos veces y los nombres iguales no se pisan.
+
+    Args:
+        archivos: Archivos de st.file_uploader
+        bucket: Bucket de destino
+
+    Returns:
+        tuple: (subidas para subir_varios, [{"archivo": índice de subida, "miniatura":
+                índice de subida o None}] por evidencia, en el orden recibido)
+    """
+    futuros = {
+        i: _pool.submit(procesar_imagen, archivo)
+        for i, archivo in enumerate(archivos) if es_imagen(archivo.name)
+    }
+
+    subidas, evidencias = [], []
+    for i, archivo in enumerate(archivos):
+        base = os.path.splitext(archivo.name)[0]
+        try:
+            optimizada, miniatura = futuros[i].result() if i in futuros else (None, None)
+        except Exception:
+            # Formato no soportado por Pillow: se sube el original
+            optimizada, miniatura = None, None
+
+        if optimizada is None:
+            subidas.append({"bucket": bucket, "origen": archivo, "tipo_contenido": archivo.type,
+                            "nombre": archivo.name})
+            evidencias.append({"archivo": len(subidas) - 1, "miniatura": None})
+            continue
+
+        subidas.append({"bucket": bucket, "origen": optimizada, "tipo_contenido": "image/jpeg",
+                        "nombre": f"{base}.jpg"})
+        subidas.append({"bucket": bucket, "origen": miniatura, "tipo_contenido": "image/jpeg",
+                        "nombre": f"{base} (miniatura).jpg"})
+        evidencias.append({"archivo": len(subidas) - 2, "miniatura": len(subidas) - 1})
+
+    return subidas, evidencias
+
+
+def _adjuntar(incidente_id: str, archivos: List[io.BytesIO], bucket: str,
+              previas: List[str], fallidas: List[str]):
+    # Las evidencias ya registradas (videos, documentos) no tienen miniatura
+    evidencias_urls, miniaturas_urls = list(previas), [None] * len(previas)
+    fallidas = list(fallidas)
+
+    try:
+        subidas, indices = preparar_evidencias(archivos, bucket)
+        urls = subir_varios(subidas, mostrar_progreso=False)
+        nuevas = [
+            (archivo.name, urls[indice["archivo"]],
+             urls[indice["miniatura"]] if indice["miniatura"] is not None else None)
+            for archivo, indice in zip(archivos, indices)
+        ]
+    except Exception:
+        nuevas = [(archivo.name, None, None) for archivo in archivos]
+
+    for nombre, url, miniatura in nuevas:
+        if url:
+            evidencias_urls.append(url)
+            miniaturas_urls.append(miniatura)
+        else:
+            fallidas.append(nombre)
+
+    # Sin sesión no hay a quién mostrar un error: el resultado queda en el incidente
+    datos = {
+        "evidencias_url": evidencias_urls or None,
+        "evidencias_miniaturas": miniaturas_urls if evidencias_urls else None,
+        "estado_evidencias": "incompletas" if fallidas else "completas",
+        "evidencias_fallidas": fallidas or None
+    }
+    supabase = get_supabase_client()
+    for intento in range(REINTENTOS_REGISTRO):
+        if supabase.actualizar_incidente(incidente_id, datos):
+            invalidar_tabla("incidentes")
+            return
+        time.sleep(2 ** intento)
+
+
+def adjuntar_evidencias(incidente_id: str, archivos: list, bucket: str,
+                        previas: Optional[List[str]] = None,
+                        fallidas: Optional[List[str]] = None) -> Future:
+    """
+    Procesa, sube y registra las fotos de un incidente ya creado, sin
+    bloquear la sesión; retorna de inmediato
+
+    El incidente debe crearse con estado_evidencias = "procesando"; al terminar
+    queda en "completas" o en "incompletas" con los nombres en evidencias_fallidas.
+    Si el proceso se reinicia antes, queda en "procesando".
+
+    Args:
+        archivos: Fotos de st.file_uploader (se copian: el formulario puede descartarlos)
+        previas: evidencias_url ya registradas en el incidente; las fotos se agregan al final
+        fallidas: Evidencias que ya fallaron en la sesión (se conservan en evidencias_fallidas)
+    """
+    copias = []
+    for archivo in archivos:
+        if not es_imagen(archivo.name):
+            raise ValueError(f"Solo las fotos se procesan en segundo plano: {archivo.name}")
+        copia = io.BytesIO(archivo.getvalue())
+        copia.name, copia.type = archivo.name, archivo.type
+        copias.append(copia)
+    return _segundo_plano.submit(_adjuntar, incidente_id, copias, bucket, previas or [], fallidas or [])
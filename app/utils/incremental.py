@@ -0,0 +1,165 @@
+"""
+Tablas mantenidas en memoria con actualizaciones incrementales
+
+En lugar de volver a descargar toda la tabla, se consultan solo las filas con
+fecha_actualizacion >= la última vista y se aplican como deltas sobre un
+DataFrame compartido por todas las sesiones del proceso, junto con contadores
+KPI que se ajustan fila por fila. Las eliminaciones (que no dejan rastro en
+fecha_actualizacion) se detectan comparando el total de filas con la marca de
+agua de la caché de datos y provocan una recarga completa.
+"""
+from typing import Callable, Dict, List, Optional
+import threading
+import time
+import sys
+import os
+
+import pandas as pd
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from utils.cache_datos import get_cache_datos
+
+
+# Segundos mínimos entre dos consultas de cambios (compartido entre sesiones)
+INTERVALO_SONDEO = 5
+
+
+class TablaIncremental:
+    """DataFrame de una tabla actualizado por deltas de fecha_actualizacion"""
+
+    def __init__(self, tabla: str, cargar_desde: Callable[[Optional[str]], Optional[List[Dict]]],
+                 contribucion: Callable[[Dict], Dict[str, float]],
+                 intervalo: int = INTERVALO_SONDEO):
+        """
+        Args:
+            tabla: Nombre de la tabla (para la marca de agua)
+            cargar_desde: Filas con fecha_actualizacion >= desde (None: todas), en orden
+                          ascendente y completas (paginadas); None si la consulta falló
+            contribucion: Aporte de una fila a cada contador KPI
+            intervalo: Segundos mínimos entre sondeos
+        """
+        self.tabla = tabla
+        self.cargar_desde = cargar_desde
+        self.contribucion = contribucion
+        self.intervalo = intervalo
+
+        self.df = pd.DataFrame()
+        # Filas tal como llegaron, por id: el aporte que se resta al actualizar una fila
+        # sale de aquí y no del DataFrame, donde los NULL se vuelven NaN y los tipos cambian
+        self._filas: Dict[str, Dict] = {}
+        self.contadores: Dict[str, float] = {}
+        self.version = 0               # Cambia cada vez que se aplica un delta
+        self.ultima_vista: Optional[str] = None
+        self._ids_ultima_vista: set = set()
+        self._sondeado = 0.0
+        self._bloqueo = threading.Lock()
+
+    def _sumar(self, fila: Dict, signo: int):
+        for clave, valor in self.contribucion(fila).items():
+            self.contadores[clave] = self.contadores.get(clave, 0) + signo * valor
+
+    def _recargar(self) -> bool:
+        filas = self.cargar_desde(None)
+        if filas is None:
+            return False
+        self.df = pd.DataFrame(filas)
+        if not self.df.empty:
+            self.df = self.df.set_index("id", drop=False)
+        self._filas = {fila["id"]: fila for fila in filas}
+        self.contadores = {}
+        for fila in filas:
+            self._sumar(fila, 1)
+        self._marcar_vistas(filas)
+        self.version += 1
+        return True
+
+    def _marcar_vistas(self, filas: List[Dict]):
+        """Recuerda la última fecha_actualizacion y los ids con esa misma fecha"""
+        if not filas:
+            return
+        ultima = max(f["fecha_actualizacion"] for f in filas)
+        if ultima != self.ultima_vista:
+            self.ultima_vista = ultima
+            self._ids_ultima_vista = set()
+        self._ids_ultima_vista |= {f["id"] for f in filas if f["fecha_actualizacion"] == ultima}
+
+    def _aplicar(self, filas: Optional[List[Dict]]) -> bool:
+        if filas is None:
+            return False
+        # La consulta es inclusiva (>=) para no perder filas con la misma marca de tiempo;
+        # se descartan las ya aplicadas
+        nuevas = [
+            f for f in filas
+            if not (f["fecha_actualizacion"] == self.ultima_vista and f["id"] in self._ids_ultima_vista)
+        ]
+        if not nuevas:
+            return False
+
+        for fila in nuevas:
+            anterior = self._filas.get(fila["id"])
+            if anterior is not None:
+                self._sumar(anterior, -1)
+            self._sumar(fila, 1)
+            self._filas[fila["id"]] = fila
+
+        delta = pd.DataFrame(nuevas).set_index("id", drop=False)
+        self.df = pd.concat([self.df[~self.df.index.isin(delta.index)], delta]) if not self.df.empty else delta
+        self._marcar_vistas(nuevas)
+        self.version += 1
+        return True
+
+    def actualizar(self) -> bool:
+        """
+        Aplica los cambios ocurridos desde el último sondeo
+
+        Returns:
+            bool: True si los datos cambiaron
+        """
+        if time.monotonic() - self._sondeado < self.intervalo:
+            return False
+
+        with self._bloqueo:
+            if time.monotonic() - self._sondeado < self.intervalo:
+                return False
+
+            if self.ultima_vista is None:
+                cambio = self._recargar()
+            else:
+                cambio = self._aplicar(self.cargar_desde(self.ultima_vista))
+                # Una diferencia en el total indica eliminaciones: recarga completa
+                marca = get_cache_datos().marca_tabla(self.tabla)
+                if marca is not None and marca[1] != len(self.df):
+                    get_cache_datos().invalidar(self.tabla)
+                    marca = get_cache_datos().marca_tabla(self.tabla)
+                    if marca is not None and marca[1] != len(self.df):
+                        cambio = self._recargar() or cambio
+
+            self._sondeado = time.monotonic()
+            return cambio
+
+
+def _contribucion_incidente(fila: Dict) -> Dict[str, float]:
+    """Aporte de un incidente a los KPI del dashboard"""
+    return {
+        "total": 1,
+        "accidentes": 1 if "Accidente" in (fila.get("tipo") or "") else 0,
+        "dias_perdidos": 0 if pd.isna(fila.get("dias_descanso_medico")) else float(fila["dias_descanso_medico"]),
+        "investigacion": 1 if fila.get("requiere_investigacion") is True else 0
+    }
+
+
+# Instancia global de incidentes en vivo
+_incidentes_instance = None
+
+def get_incidentes_en_vivo() -> TablaIncremental:
+    """Retorna la tabla incremental de incidentes compartida del proceso"""
+    global _incidentes_instance
+    if _incidentes_instance is None:
+        _incidentes_instance = TablaIncremental(
+            "incidentes",
+            lambda desde: get_supabase_client().listar_incidentes_actualizados(desde),
+            _contribucion_incidente
+        )
+    return _incidentes_instance
@@ -0,0 +1,159 @@
+"""
+Extracción de texto de documentos para la búsqueda por contenido
+
+El texto de los PDF, DOCX y XLSX se extrae en un pool de procesos (es trabajo
+de CPU) sin bloquear la sesión: indexar_documento retorna de inmediato y el
+resultado se guarda en documentos_texto al terminar. La base lo indexa con
+un tsvector en español (índice GIN) que consulta buscar_documentos.
+indexar_pendientes tampoco descarga en la sesión: cada documento se descarga
+en un hilo de fondo que luego encola la extracción.
+"""
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Optional
+from xml.etree import ElementTree
+import threading
+import zipfile
+import sys
+import os
+import io
+import re
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from utils.almacenamiento import get_almacenamiento
+
+
+# Caracteres guardados por documento (un tsvector admite como máximo 1 MB)
+LIMITE_TEXTO = 400_000
+
+PROCESOS_EXTRACCION = max(1, (os.cpu_count() or 2) - 1)
+
+# Descargas simultáneas de indexar_pendientes (espera de red, no CPU)
+DESCARGAS_SIMULTANEAS = 4
+
+_NS_WORD = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+_pool = None
+_bloqueo = threading.Lock()
+_descargas = ThreadPoolExecutor(max_workers=DESCARGAS_SIMULTANEAS)
+
+# Documentos encolados y aún sin texto guardado: un segundo clic no los repite
+_en_cola: set = set()
+
+
+def _texto_pdf(contenido: bytes) -> str:
+    from pypdf import PdfReader
+
+    lector = PdfReader(io.BytesIO(contenido))
+    return "\n".join(pagina.extract_text() or "" for pagina in lector.pages)
+
+
+def _texto_docx(contenido: bytes) -> str:
+    with zipfile.ZipFile(io.BytesIO(contenido)) as docx:
+        raiz = ElementTree.fromstring(docx.read("word/document.xml"))
+    return "\n".join(
+        "".join(t.text or "" for t in parrafo.iter(f"{_NS_WORD}t"))
+        for parrafo in raiz.iter(f"{_NS_WORD}p")
+    )
+
+
+def _texto_xlsx(contenido: bytes) -> str:
+    from openpyxl import load_workbook
+
+    libro = load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        return "\n".join(
+            " ".join(str(v) for v in fila if v is not None)
+            for hoja in libro.worksheets
+            for fila in hoja.iter_rows(values_only=True)
+        )
+    finally:
+        libro.close()
+
+
+EXTRACTORES = {
+    ".pdf": _texto_pdf,
+    ".docx": _texto_docx,
+    ".xlsx": _texto_xlsx
+}
+
+
+def extraer_texto(contenido: bytes, nombre: str) -> str:
+    """Texto plano de un documento (vacío si el formato no se soporta)"""
+    extractor = EXTRACTORES.get(os.path.splitext(nombre)[1].lower())
+    if extractor is None:
+        return ""
+    texto = re.sub(r"[ \t\r\f\v]+", " ", extractor(contenido))
+    texto = re.sub(r"\n\s*\n+", "\n", texto).strip()
+    return texto[:LIMITE_TEXTO]
+
+
+def _obtener_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _bloqueo:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PROCESOS_EXTRACCION)
+        return _pool
+
+
+def _liberar(documento_id: str):
+    with _bloqueo:
+        _en_cola.discard(documento_id)
+
+
+def _guardar(documento_id: str, futuro: Future):
+    try:
+        texto = futuro.result()
+    except Exception:
+        # Archivo dañado o protegido: se guarda vacío para no reintentarlo en cada pasada
+        texto = ""
+    try:
+        get_supabase_client().guardar_texto_documento(documento_id, texto)
+    finally:
+        _liberar(documento_id)
+
+
+def indexar_documento(documento_id: str, contenido: bytes, nombre: str) -> Future:
+    """Encola la extracción de texto de un documento; retorna sin esperarla"""
+    with _bloqueo:
+        _en_cola.add(documento_id)
+    futuro = _obtener_pool().submit(extraer_texto, contenido, nombre)
+    futuro.add_done_callback(lambda f: _guardar(documento_id, f))
+    return futuro
+
+
+def _descargar_e_indexar(documento_id: str, bucket: str, ruta: str) -> Optional[Future]:
+    try:
+        contenido = get_almacenamiento().descargar(bucket, ruta)
+    except Exception:
+        contenido = None
+    if not contenido:
+        _liberar(documento_id)
+        return None
+    return indexar_documento(documento_id, contenido, ruta)
+
+
+def indexar_pendientes(limite: int = 50) -> int:
+    """
+    Encola los documentos sin texto indexado (o modificados desde su indexación)
+
+    Solo consulta la lista: la descarga y la extracción ocurren en segundo
+    plano. Los documentos que ya están en cola se omiten.
+
+    Returns:
+        int: Documentos encolados
+    """
+    almacenamiento = get_almacenamiento()
+    encolados = 0
+    for documento in get_supabase_client().listar_documentos_sin_indexar(limite):
+        ubicacion = almacenamiento.ubicacion(documento.get("archivo_url") or "")
+        if ubicacion is None:
+            continue
+        with _bloqueo:
+            if documento["id"] in _en_cola:
+                continue
+            _en_cola.add(documento["id"])
+        _descargas.submit(_descargar_e_indexar, documento["id"], *ubicacion)
+        encolados += 1
+    return encolados
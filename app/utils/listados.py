@@ -0,0 +1,94 @@
+"""
+Listados paginados con panel de detalle bajo demanda
+
+Una sola consulta por página alimenta una tabla (st.dataframe) con selección
+de fila; el detalle se dibuja solo para la fila seleccionada. La cantidad de
+widgets por rerun es constante, sin importar cuántos registros existan.
+"""
+from typing import Callable, Dict, List, Optional
+import math
+import json
+
+import pandas as pd
+import streamlit as st
+
+
+TAMANO_PAGINA = 50
+
+
+def listado_paginado(clave: str,
+                     cargar_pagina: Callable[[int, int], Dict],
+                     columnas: Dict[str, str],
+                     detalle: Callable[[Dict], None],
+                     filtros: Optional[Dict] = None,
+                     mensaje_vacio: str = "No se encontraron registros",
+                     tamano_pagina: int = TAMANO_PAGINA) -> Optional[Dict]:
+    """
+    Dibuja una tabla paginada y el detalle de la fila seleccionada
+
+    Args:
+        clave: Prefijo de claves de widgets y de session_state
+        cargar_pagina: (pagina, tamano_pagina) -> {"datos": [...], "total": int}
+        columnas: {campo: encabezado} a mostrar en la tabla, en orden
+        detalle: Dibuja el panel de detalle del registro seleccionado
+        filtros: Filtros activos; al cambiar se vuelve a la primera página
+        mensaje_vacio: Aviso cuando no hay registros
+        tamano_pagina: Registros por página
+
+    Returns:
+        dict: Registro seleccionado o None
+    """
+    clave_pagina = f"{clave}_pagina"
+    clave_filtros = f"{clave}_filtros"
+
+    firma_filtros = json.dumps(filtros or {}, sort_keys=True, default=str)
+    if st.session_state.get(clave_filtros) != firma_filtros:
+        st.session_state[clave_filtros] = firma_filtros
+        st.session_state[clave_pagina] = 1
+
+    pagina = st.session_state.get(clave_pagina, 1)
+    resultado = cargar_pagina(pagina, tamano_pagina)
+    total = resultado["total"]
+    total_paginas = max(1, math.ceil(total / tamano_pagina))
+
+    # La página guardada puede quedar fuera de rango si se eliminaron registros
+    if pagina > total_paginas:
+        st.session_state[clave_pagina] = pagina = total_paginas
+        resultado = cargar_pagina(pagina, tamano_pagina)
+
+    registros: List[Dict] = resultado["datos"]
+    if not registros:
+        st.warning(mensaje_vacio)
+        return None
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        inicio = (pagina - 1) * tamano_pagina
+        st.info(f"Mostrando {inicio + 1}–{inicio + len(registros)} de {total}")
+    with col2:
+        st.number_input("Página", min_value=1, max_value=total_paginas, step=1,
+                        key=clave_pagina)
+
+    df = pd.DataFrame(registros)
+    for campo in columnas:
+        if campo not in df.columns:
+            df[campo] = None
+
+    evento = st.dataframe(
+        df[list(columnas.keys())].rename(columns=columnas),
+        width='stretch',
+        hide_index=True,
+        on_select="rerun",
+        selection_mode="single-row",
+        key=f"{clave}_tabla_{pagina}"
+    )
+
+    filas = evento.selection.rows
+    if not filas:
+        st.caption("Selecciona una fila para ver el detalle")
+        return None
+
+    registro = registros[filas[0]]
+    with st.container(border=True):
+        detalle(registro)
+    return registro
@@ -0,0 +1,108 @@
+"""
+Clasificación vectorizada de riesgos y agregación de la matriz 5x5
+
+La clasificación de cada celda (probabilidad, severidad) se precalcula en una
+tabla de búsqueda; clasificar miles de riesgos es una indexación de arreglos,
+no un if/elif por fila. La matriz poblada por área se obtiene con una sola
+agrupación.
+
+Los umbrales vigentes viven en la tabla matrices_riesgo (versionada); la base
+clasifica con ellos por trigger y la aplicación los lee de ahí con
+umbrales_desde_matriz. UMBRALES_RIESGO es la versión 1, usada solo si la
+matriz no está disponible.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+ESCALA = range(1, 6)
+
+# (nivel máximo, clasificación, color, ícono) en orden ascendente
+UMBRALES_RIESGO: List[Tuple[int, str, str, str]] = [
+    (4, "Bajo", "green", "🟢"),
+    (12, "Medio", "yellow", "🟡"),
+    (16, "Alto", "orange", "🟠"),
+    (25, "Crítico", "red", "🔴")
+]
+
+CLASIFICACIONES = [u[1] for u in UMBRALES_RIESGO]
+COLORES_CLASIFICACION = {u[1]: u[2] for u in UMBRALES_RIESGO}
+
+
+def umbrales_desde_matriz(matriz: Dict) -> List[Tuple[int, str, str, str]]:
+    """Convierte una fila de matrices_riesgo en la lista de umbrales"""
+    limites = [matriz["limite_bajo"], matriz["limite_medio"], matriz["limite_alto"], 25]
+    return [(int(limite), *u[1:]) for limite, u in zip(limites, UMBRALES_RIESGO)]
+
+
+def tabla_clasificacion(umbrales: Optional[List[Tuple]] = None) -> np.ndarray:
+    """
+    Tabla de búsqueda 6x6: índice de clasificación para [probabilidad, severidad]
+
+    La fila y columna 0 no se usan (la escala empieza en 1)
+    """
+    umbrales = umbrales or UMBRALES_RIESGO
+    niveles = np.outer(np.arange(6), np.arange(6))
+    limites = np.array([u[0] for u in umbrales])
+    return np.searchsorted(limites, niveles, side="left")
+
+
+_TABLA = tabla_clasificacion()
+
+
+def clasificar(probabilidad: Iterable[int], severidad: Iterable[int],
+               umbrales: Optional[List[Tuple]] = None) -> pd.DataFrame:
+    """
+    Clasifica arreglos completos de (probabilidad, severidad)
+
+    Returns:
+        DataFrame: columnas nivel_riesgo, clasificacion y color, alineadas con la entrada
+    """
+    umbrales = umbrales or UMBRALES_RIESGO
+    tabla = _TABLA if umbrales is UMBRALES_RIESGO else tabla_clasificacion(umbrales)
+    p = np.asarray(probabilidad, dtype=int)
+    s = np.asarray(severidad, dtype=int)
+    if ((p < 1) | (p > 5) | (s < 1) | (s > 5)).any():
+        raise ValueError("Probabilidad y severidad deben estar entre 1 y 5")
+
+    indices = tabla[p, s]
+    return pd.DataFrame({
+        "nivel_riesgo": p * s,
+        "clasificacion": np.array([u[1] for u in umbrales])[indices],
+        "color": np.array([u[2] for u in umbrales])[indices]
+    }, index=probabilidad.index if isinstance(probabilidad, pd.Series) else None)
+
+
+def matriz_referencia(umbrales: Optional[List[Tuple]] = None) -> pd.DataFrame:
+    """Matriz 5x5 de niveles con su ícono de clasificación (severidad descendente)"""
+    umbrales = umbrales or UMBRALES_RIESGO
+    tabla = tabla_clasificacion(umbrales)
+    iconos = np.array([u[3] for u in umbrales])
+    severidades = list(reversed(ESCALA))
+    celdas = [[f"{iconos[tabla[p, s]]} {p * s}" for p in ESCALA] for s in severidades]
+    return pd.DataFrame(
+        celdas,
+        columns=[f"Prob {p}" for p in ESCALA],
+        index=[f"Sev {s}" for s in severidades]
+    )
+
+
+def matriz_por_area(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cuenta los riesgos de cada celda 5x5 por área en una sola agrupación
+
+    Args:
+        df: Riesgos con columnas area, probabilidad y severidad
+
+    Returns:
+        DataFrame: índice (area, severidad) con severidad 5..1, columnas probabilidad 1..5
+    """
+    if df.empty:
+        return pd.DataFrame(columns=list(ESCALA))
+
+    conteo = df.groupby(["area", "severidad", "probabilidad"]).size().unstack("probabilidad", fill_value=0)
+    areas = conteo.index.get_level_values("area").unique()
+    completo = pd.MultiIndex.from_product([areas, list(reversed(ESCALA))], names=["area", "severidad"])
+    return conteo.reindex(index=completo, columns=list(ESCALA), fill_value=0)
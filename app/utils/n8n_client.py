@@ -10,7 +10,7 @@ import os
 
 # Agregar el directorio padre al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config.settings import N8N_WEBHOOKS
+from config import settings
 
 
 class N8NClient:
@@ -18,7 +18,7 @@ class N8NClient:
     
     def __init__(self):
         """Inicializa el cliente de n8n"""
-        self.webhooks = N8N_WEBHOOKS
+        self.webhooks = settings.N8N_WEBHOOKS
         self.timeout = 10  # segundos
     
     def _enviar_webhook(self, url: str, datos: Dict[str, Any]) -> bool:
@@ -0,0 +1,44 @@
+"""
+Navegación por sub-vistas dentro de un módulo
+
+A diferencia de st.tabs, que ejecuta el contenido de todas las pestañas en
+cada rerun, aquí solo se ejecuta la sub-vista activa: sus consultas, figuras
+y formularios no se cargan mientras no esté visible.
+"""
+from typing import Callable, Dict
+import streamlit as st
+
+
+def clave_subvista(modulo: str) -> str:
+    """Clave de session_state donde se guarda la sub-vista activa del módulo"""
+    return f"subvista_{modulo}"
+
+
+def subvistas(modulo: str, vistas: Dict[str, Callable[[], None]]):
+    """
+    Muestra un selector de sub-vistas y ejecuta solo la activa
+
+    Args:
+        modulo: Identificador del módulo (separa el estado entre páginas)
+        vistas: {etiqueta: función que dibuja la sub-vista}, en orden de aparición
+    """
+    etiquetas = list(vistas.keys())
+    clave = clave_subvista(modulo)
+
+    # Se guarda fuera del widget: Streamlit descarta el estado de los widgets
+    # que no se dibujan, y la selección debe sobrevivir al cambio de página
+    if st.session_state.get(clave) not in etiquetas:
+        st.session_state[clave] = etiquetas[0]
+
+    activa = st.radio(
+        "Sección",
+        etiquetas,
+        index=etiquetas.index(st.session_state[clave]),
+        horizontal=True,
+        key=f"{clave}_selector",
+        label_visibility="collapsed"
+    )
+    st.session_state[clave] = activa
+    st.divider()
+
+    vistas[activa]()
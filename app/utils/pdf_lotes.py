@@ -0,0 +1,171 @@
+"""
+Generación masiva de PDFs (certificados, actas de entrega) en paralelo
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+from datetime import datetime
+import unicodedata
+import tempfile
+import zipfile
+import shutil
+import re
+import sys
+import os
+
+import streamlit as st
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.pdf_reportes import PLANTILLAS, renderizar_pdf
+from utils.almacenamiento import publicar_exportacion, boton_descarga
+from reportlab.platypus import PageBreak
+
+
+# Documentos por tarea enviada al pool: amortiza el costo de serializar
+# datos y arrancar reportlab en cada proceso
+DOCUMENTOS_POR_TAREA = 25
+
+FORMATOS_LOTE = {
+    "zip": "Un PDF por documento (ZIP)",
+    "pdf": "Un solo PDF combinado"
+}
+
+
+def nombre_archivo_seguro(texto: str) -> str:
+    """Normaliza un texto para usarlo como nombre de archivo"""
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode("ascii")
+    texto = re.sub(r"[^A-Za-z0-9]+", "_", texto).strip("_")
+    return texto[:80] or "documento"
+
+
+def _renderizar_individuales(plantilla: str, documentos: List[Tuple[str, Dict]], carpeta: str) -> List[Tuple[str, str]]:
+    """Tarea del pool: un PDF por documento. Retorna [(nombre, ruta)]"""
+    generados = []
+    for nombre, datos in documentos:
+        ruta = os.path.join(carpeta, nombre)
+        renderizar_pdf(PLANTILLAS[plantilla](datos), ruta)
+        generados.append((nombre, ruta))
+    return generados
+
+
+def _renderizar_combinado(plantilla: str, documentos: List[Tuple[str, Dict]], ruta: str) -> str:
+    """Tarea del pool: todos los documentos del bloque en un solo PDF"""
+    def flujo():
+        for indice, (_, datos) in enumerate(documentos):
+            if indice:
+                yield PageBreak()
+            yield from PLANTILLAS[plantilla](datos)
+
+    return renderizar_pdf(flujo(), ruta)
+
+
+def generar_lote(plantilla: str, documentos: List[Tuple[str, Dict]], formato: str = "zip",
+                 progreso: Optional[Callable[[int, int], None]] = None,
+                 max_procesos: Optional[int] = None) -> str:
+    """
+    Genera un lote de PDFs en paralelo con un pool de procesos
+
+    Args:
+        plantilla: Clave de PLANTILLAS
+        documentos: Lista de (nombre_archivo, datos)
+        formato: "zip" (un PDF por documento) o "pdf" (un PDF combinado)
+        progreso: Callback (documentos_generados, total) llamado en el proceso principal
+        max_procesos: Tamaño del pool (por defecto, núcleos disponibles)
+
+    Returns:
+        str: Ruta del ZIP o PDF generado
+    """
+    if plantilla not in PLANTILLAS:
+        raise ValueError(f"Plantilla PDF desconocida: {plantilla}")
+    if formato not in FORMATOS_LOTE:
+        raise ValueError(f"Formato de lote desconocido: {formato}")
+
+    total = len(documentos)
+    bloques = [documentos[i:i + DOCUMENTOS_POR_TAREA] for i in range(0, total, DOCUMENTOS_POR_TAREA)]
+    carpeta = tempfile.mkdtemp(prefix="sst_lote_")
+    fd, destino = tempfile.mkstemp(suffix=f".{formato}", prefix="sst_lote_")
+    os.close(fd)
+
+    try:
+        with ProcessPoolExecutor(max_workers=max_procesos) as pool:
+            if formato == "zip":
+                futuros = {
+                    pool.submit(_renderizar_individuales, plantilla, bloque, carpeta): len(bloque)
+                    for bloque in bloques
+                }
+            else:
+                futuros = {
+                    pool.submit(_renderizar_combinado, plantilla, bloque,
+                                os.path.join(carpeta, f"bloque_{indice:05d}.pdf")): len(bloque)
+                    for indice, bloque in enumerate(bloques)
+                }
+
+            generados = 0
+            resultados = []
+            for futuro in as_completed(futuros):
+                resultados.append(futuro.result())
+                generados += futuros[futuro]
+                if progreso:
+                    progreso(generados, total)
+
+        if formato == "zip":
+            with zipfile.ZipFile(destino, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                for bloque in resultados:
+                    for nombre, ruta in bloque:
+                        zf.write(ruta, arcname=nombre)
+        else:
+            from pypdf import PdfWriter
+
+            writer = PdfWriter()
+            for ruta in sorted(resultados):
+                writer.append(ruta)
+            with open(destino, "wb") as f:
+                writer.write(f)
+            writer.close()
+
+        return destino
+    except Exception:
+        os.remove(destino)
+        raise
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def descargar_lote(clave: str, plantilla: str, documentos: List[Tuple[str, Dict]], prefijo: str):
+    """
+    Controles de Streamlit para generar y descargar un lote de PDFs
+
+    Args:
+        clave: Prefijo de claves de widgets
+        plantilla: Clave de PLANTILLAS
+        documentos: Lista de (nombre_archivo, datos)
+        prefijo: Prefijo del archivo descargado
+    """
+    formato = st.radio(
+        "Formato",
+        list(FORMATOS_LOTE.keys()),
+        format_func=FORMATOS_LOTE.get,
+        horizontal=True,
+        key=f"{clave}_formato"
+    )
+
+    if st.button(f"⚙️ Generar {len(documentos)} documentos", type="primary", key=f"{clave}_generar"):
+        barra = st.progress(0.0, text="Generando documentos...")
+
+        def actualizar(hechos: int, total: int):
+            barra.progress(hechos / total, text=f"Generando documentos... {hechos}/{total}")
+
+        try:
+            ruta = generar_lote(plantilla, documentos, formato, progreso=actualizar)
+        except Exception as e:
+            st.error(f"Error al generar el lote: {str(e)}")
+            return
+
+        barra.progress(1.0, text="✅ Lote generado")
+        url = publicar_exportacion(
+            ruta,
+            f"{prefijo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}",
+            "application/zip" if formato == "zip" else "application/pdf"
+        )
+        if url:
+            boton_descarga("⬇️ Descargar Lote", url)
@@ -0,0 +1,464 @@
+"""
+Motor de reportes PDF del Sistema SST
+"""
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+from datetime import datetime
+import tempfile
+import sys
+import os
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle, StyleSheet1
+from reportlab.lib.units import mm
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
+from xml.sax.saxutils import escape
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config.settings import REPORTES_CONFIG
+
+
+# Filas por bloque de tabla: las tablas largas se parten para que reportlab
+# las maquete por partes en lugar de calcular una sola tabla gigante
+FILAS_POR_BLOQUE = 200
+
+# Flowables que se mantienen en memoria mientras se genera el documento
+RESERVA_FLOWABLES = 50
+
+# Miniaturas de evidencias por fila y lado de cada una en el PDF
+MINIATURAS_POR_FILA = 3
+LADO_MINIATURA_PDF = 150
+
+ESTILOS_TABLA = {
+    "estandar": [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black)
+    ],
+    "detalle": [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#1f77b4")),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor("#f0f2f6")]),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+    ],
+    "firmas": [
+        ('LINEABOVE', (0, 1), (-1, 1), 1, colors.black),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('TOPPADDING', (0, 0), (-1, 0), 40)
+    ]
+}
+
+
+@lru_cache(maxsize=1)
+def obtener_estilos() -> StyleSheet1:
+    """Hoja de estilos de párrafo compartida por todas las plantillas"""
+    estilos = getSampleStyleSheet()
+    estilos.add(ParagraphStyle("Celda", parent=estilos["BodyText"], fontSize=8, leading=10))
+    estilos.add(ParagraphStyle("Pie", parent=estilos["Normal"], fontSize=7, textColor=colors.grey))
+    estilos.add(ParagraphStyle("Centrado", parent=estilos["Normal"], alignment=1))
+    estilos.add(ParagraphStyle("NombreCertificado", parent=estilos["Title"], fontSize=22, leading=28,
+                               textColor=colors.HexColor("#1f77b4")))
+    return estilos
+
+
+@lru_cache(maxsize=None)
+def estilo_tabla(variante: str = "estandar") -> TableStyle:
+    """Retorna un TableStyle precompilado (reutilizable entre tablas)"""
+    return TableStyle(ESTILOS_TABLA[variante])
+
+
+def celda(valor: Any, max_simple: int = 40):
+    """Convierte un valor en celda; los textos largos se envuelven en un Paragraph"""
+    if valor is None:
+        return ""
+    texto = str(valor)
+    if len(texto) <= max_simple:
+        return texto
+    return Paragraph(escape(texto), obtener_estilos()["Celda"])
+
+
+def tabla(filas: List[List[Any]], anchos: Optional[List[float]] = None,
+          variante: str = "estandar", filas_por_bloque: int = FILAS_POR_BLOQUE) -> Iterator[Table]:
+    """
+    Genera una tabla partida en bloques que repiten el encabezado
+
+    Args:
+        filas: Primera fila = encabezado
+        anchos: Ancho de columnas
+        variante: Clave de ESTILOS_TABLA
+    """
+    encabezado, cuerpo = filas[0], filas[1:]
+    if not cuerpo:
+        cuerpo = [[""] * len(encabezado)]
+
+    for inicio in range(0, len(cuerpo), filas_por_bloque):
+        bloque = [encabezado] + [[celda(v) for v in fila] for fila in cuerpo[inicio:inicio + filas_por_bloque]]
+        t = Table(bloque, colWidths=anchos, repeatRows=1)
+        t.setStyle(estilo_tabla(variante))
+        yield t
+
+
+def titulo(texto: str) -> Iterator:
+    yield Paragraph(f"<b>{escape(texto)}</b>", obtener_estilos()["Title"])
+    yield Spacer(1, 12)
+
+
+def seccion(texto: str) -> Iterator:
+    yield Paragraph(f"<b>{escape(texto)}</b>", obtener_estilos()["Heading2"])
+    yield Spacer(1, 12)
+
+
+def parrafo(texto: str, estilo: str = "Normal") -> Paragraph:
+    return Paragraph(escape(str(texto)), obtener_estilos()[estilo])
+
+
+def tabla_empresa() -> Iterator[Table]:
+    """Tabla con los datos de la empresa (REPORTES_CONFIG)"""
+    return tabla([
+        ['Campo', 'Valor'],
+        ['Razón Social', REPORTES_CONFIG['empresa']],
+        ['RUC', REPORTES_CONFIG['ruc']],
+        ['Dirección', REPORTES_CONFIG['direccion']],
+        ['Sector', REPORTES_CONFIG['sector']],
+        ['Actividad Económica', REPORTES_CONFIG['actividad_economica']]
+    ], anchos=[200, 300])
+
+
+def _pie_pagina(canvas, doc):
+    """Pie de página con empresa, fecha de emisión y número de página"""
+    canvas.saveState()
+    canvas.setFont("Helvetica", 7)
+    canvas.setFillColor(colors.grey)
+    canvas.drawString(doc.leftMargin, 10 * mm,
+                      f"{REPORTES_CONFIG['empresa']} - RUC {REPORTES_CONFIG['ruc']}")
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 10 * mm,
+                           f"Emitido {doc.fecha_emision} - Página {doc.page}")
+    canvas.restoreState()
+
+
+class _FlowablesPerezosos(list):
+    """
+    Lista que reportlab consume desde el inicio y que se rellena desde un
+    iterador, de modo que solo RESERVA_FLOWABLES elementos viven en memoria
+    """
+
+    def __init__(self, iterable: Iterable, reserva: int = RESERVA_FLOWABLES):
+        super().__init__()
+        self._iterador = iter(iterable)
+        self._reserva = reserva
+
+    def _rellenar(self):
+        while list.__len__(self) < self._reserva:
+            try:
+                list.append(self, next(self._iterador))
+            except StopIteration:
+                break
+
+    def __len__(self):
+        self._rellenar()
+        return list.__len__(self)
+
+
+# ==================== PLANTILLAS ====================
+
+def plantilla_sunafil(datos: Dict) -> Iterator:
+    """
+    Reporte legal SUNAFIL
+
+    datos: fecha_inicio, fecha_fin, estadisticas ([[indicador, valor]]),
+           incidentes_tipo ([[tipo, cantidad]]), indices_area (DataFrame opcional),
+           detalle (lista de incidentes opcional)
+    """
+    yield from titulo("REPORTE LEGAL SUNAFIL")
+    yield parrafo(f"Período: {datos['fecha_inicio']} al {datos['fecha_fin']}", "Heading2")
+    yield Spacer(1, 12)
+    yield from tabla_empresa()
+    yield Spacer(1, 20)
+
+    if datos.get("estadisticas"):
+        yield from seccion("Estadísticas de Seguridad")
+        yield from tabla([['Indicador', 'Valor']] + datos["estadisticas"], anchos=[300, 200])
+        yield Spacer(1, 20)
+
+    if datos.get("incidentes_tipo"):
+        yield from seccion("Incidentes por Tipo")
+        yield from tabla([['Tipo', 'Cantidad']] + datos["incidentes_tipo"], anchos=[300, 200])
+        yield Spacer(1, 20)
+
+    indices_area = datos.get("indices_area")
+    if indices_area is not None and not indices_area.empty:
+        yield from seccion("Índices por Área")
+        yield from tabla(
+            [list(indices_area.columns)] + indices_area.values.tolist(),
+            variante="detalle"
+        )
+        yield Spacer(1, 20)
+
+    if datos.get("detalle"):
+        yield PageBreak()
+        yield from seccion("Detalle de Incidentes")
+        filas = [['Código', 'Fecha', 'Tipo', 'Área', 'Días', 'Descripción']]
+        filas += [
+            [i.get("codigo"), str(i.get("fecha_hora", ""))[:16], i.get("tipo"), i.get("area"),
+             i.get("dias_descanso_medico", 0), i.get("descripcion")]
+            for i in datos["detalle"]
+        ]
+        yield from tabla(filas, anchos=[70, 65, 80, 70, 30, 200], variante="detalle")
+
+
+def plantilla_resumen_ejecutivo(datos: Dict) -> Iterator:
+    """
+    Resumen ejecutivo del sistema SST
+
+    datos: metricas ([[indicador, valor]]), tendencia ([[mes, cantidad]] opcional)
+    """
+    yield from titulo("RESUMEN EJECUTIVO SST")
+    yield parrafo(f"Fecha de corte: {datos.get('fecha_corte', datetime.now().date())}", "Heading2")
+    yield Spacer(1, 12)
+    yield from tabla_empresa()
+    yield Spacer(1, 20)
+
+    yield from seccion("Indicadores Principales")
+    yield from tabla([['Indicador', 'Valor']] + datos.get("metricas", []), anchos=[300, 200])
+    yield Spacer(1, 20)
+
+    if datos.get("tendencia"):
+        yield from seccion("Incidentes por Mes")
+        yield from tabla([['Mes', 'Cantidad']] + datos["tendencia"], anchos=[300, 200])
+
+
+def plantilla_resultado_inspeccion(datos: Dict) -> Iterator:
+    """
+    Resultado de una inspección
+
+    datos: inspeccion (dict), hallazgos (lista de dicts opcional)
+    """
+    inspeccion = datos["inspeccion"]
+    checklist = (inspeccion.get("checklist") or {}).get("nombre", "N/A")
+    inspector = (inspeccion.get("inspector") or {}).get("nombre_completo", "N/A")
+
+    yield from titulo("RESULTADO DE INSPECCIÓN")
+    yield from tabla([
+        ['Campo', 'Valor'],
+        ['Código', inspeccion.get("codigo")],
+        ['Checklist', checklist],
+        ['Área', inspeccion.get("area")],
+        ['Fecha Programada', inspeccion.get("fecha_programada")],
+        ['Fecha Realizada', inspeccion.get("fecha_realizada") or "-"],
+        ['Inspector', inspector],
+        ['Estado', inspeccion.get("estado")],
+        ['Cumplimiento', f"{float(inspeccion.get('porcentaje_cumplimiento') or 0):.1f}%"]
+    ], anchos=[200, 300])
+    yield Spacer(1, 20)
+
+    if inspeccion.get("observaciones"):
+        yield from seccion("Observaciones")
+        yield parrafo(inspeccion["observaciones"])
+        yield Spacer(1, 20)
+
+    hallazgos = datos.get("hallazgos") or []
+    yield from seccion(f"Hallazgos ({len(hallazgos)})")
+    filas = [['Tipo', 'Severidad', 'Descripción', 'Acción Correctiva', 'Estado']]
+    filas += [
+        [h.get("tipo"), h.get("severidad") or "-", h.get("descripcion"),
+         h.get("accion_correctiva") or "-", h.get("estado")]
+        for h in hallazgos
+    ]
+    yield from tabla(filas, anchos=[75, 55, 160, 140, 55], variante="detalle")
+
+
+def plantilla_reporte_incidente(datos: Dict) -> Iterator:
+    """
+    Reporte de un incidente con sus evidencias fotográficas
+
+    datos: incidente (dict); las fotos se incrustan desde evidencias_miniaturas,
+    no desde los originales
+    """
+    incidente = datos["incidente"]
+
+    yield from titulo("REPORTE DE INCIDENTE")
+    yield from tabla([
+        ['Campo', 'Valor'],
+        ['Código', incidente.get("codigo")],
+        ['Tipo', incidente.get("tipo")],
+        ['Fecha y Hora', incidente.get("fecha_hora")],
+        ['Área', incidente.get("area")],
+        ['Ubicación', incidente.get("ubicacion_especifica") or "-"],
+        ['Afectado', incidente.get("afectado_nombre") or "-"],
+        ['Días de Descanso', incidente.get("dias_descanso_medico") or 0],
+        ['Estado', incidente.get("estado")]
+    ], anchos=[200, 300])
+    yield Spacer(1, 20)
+
+    yield from seccion("Descripción")
+    yield parrafo(incidente.get("descripcion") or "-")
+    if incidente.get("medidas_inmediatas"):
+        yield from seccion("Medidas Inmediatas")
+        yield parrafo(incidente["medidas_inmediatas"])
+    yield Spacer(1, 20)
+
+    miniaturas = [m for m in incidente.get("evidencias_miniaturas") or [] if m]
+    if miniaturas:
+        yield from seccion(f"Evidencias ({len(miniaturas)})")
+        imagenes = [
+            Image(url, width=LADO_MINIATURA_PDF, height=LADO_MINIATURA_PDF, kind="proportional")
+            for url in miniaturas
+        ]
+        filas = [imagenes[i:i + MINIATURAS_POR_FILA] for i in range(0, len(imagenes), MINIATURAS_POR_FILA)]
+        filas[-1] += [""] * (MINIATURAS_POR_FILA - len(filas[-1]))
+        yield Table(filas, colWidths=[LADO_MINIATURA_PDF + 10] * MINIATURAS_POR_FILA)
+
+
+def plantilla_acta_entrega_epp(datos: Dict) -> Iterator:
+    """
+    Acta de entrega de EPP a un trabajador
+
+    datos: asignacion (dict con epp, usuario y entregador anidados)
+    """
+    asignacion = datos["asignacion"]
+    epp = asignacion.get("epp") or {}
+    trabajador = asignacion.get("usuario") or {}
+    entregador = asignacion.get("entregador") or {}
+
+    yield from titulo("ACTA DE ENTREGA DE EPP")
+    yield parrafo("Registro de entrega de Equipos de Protección Personal - Art. 60 Ley 29783", "Centrado")
+    yield Spacer(1, 12)
+
+    yield from seccion("Trabajador")
+    yield from tabla([
+        ['Campo', 'Valor'],
+        ['Nombre', trabajador.get("nombre_completo")],
+        ['Cargo', trabajador.get("cargo") or "-"],
+        ['Área', trabajador.get("area") or "-"]
+    ], anchos=[200, 300])
+    yield Spacer(1, 12)
+
+    yield from seccion("Equipo Entregado")
+    yield from tabla([
+        ['EPP', 'Tipo', 'Marca / Modelo', 'Cant.', 'Entrega', 'Vencimiento'],
+        [epp.get("nombre"), epp.get("tipo"),
+         f"{epp.get('marca') or '-'} / {epp.get('modelo') or '-'}",
+         asignacion.get("cantidad"), asignacion.get("fecha_asignacion"),
+         asignacion.get("fecha_vencimiento")]
+    ], anchos=[110, 90, 100, 35, 65, 65], variante="detalle")
+    yield Spacer(1, 12)
+
+    yield parrafo(
+        "El trabajador declara haber recibido el equipo en buen estado, haber sido capacitado "
+        "en su uso correcto y se compromete a utilizarlo y conservarlo adecuadamente."
+    )
+
+    t = Table(
+        [["", ""], [trabajador.get("nombre_completo") or "Trabajador",
+                    entregador.get("nombre_completo") or "Responsable de entrega"]],
+        colWidths=[230, 230]
+    )
+    t.setStyle(estilo_tabla("firmas"))
+    yield t
+
+
+def plantilla_certificado_capacitacion(datos: Dict) -> Iterator:
+    """
+    Certificado de asistencia a una capacitación
+
+    datos: asistente (dict con usuario y capacitacion anidados)
+    """
+    asistente = datos["asistente"]
+    capacitacion = asistente.get("capacitacion") or {}
+    usuario = asistente.get("usuario") or {}
+    fecha = capacitacion.get("fecha_realizada") or capacitacion.get("fecha_programada") or ""
+
+    yield Spacer(1, 60)
+    yield from titulo("CERTIFICADO DE CAPACITACIÓN")
+    yield parrafo(f"{REPORTES_CONFIG['empresa']} certifica que:", "Centrado")
+    yield Spacer(1, 20)
+    yield Paragraph(escape(usuario.get("nombre_completo") or ""), obtener_estilos()["NombreCertificado"])
+    yield Spacer(1, 20)
+    yield parrafo(
+        f"participó en la capacitación \"{capacitacion.get('titulo', '')}\" "
+        f"({capacitacion.get('tipo', '')}), con una duración de "
+        f"{capacitacion.get('duracion_horas') or 0} horas, realizada el {str(fecha)[:10]}, "
+        "en cumplimiento del Art. 27 y 35 de la Ley 29783.",
+        "Centrado"
+    )
+    yield Spacer(1, 20)
+
+    filas = [['Código', 'Instructor', 'Cargo', 'Área']]
+    filas.append([capacitacion.get("codigo"), capacitacion.get("instructor") or "-",
+                  usuario.get("cargo") or "-", usuario.get("area") or "-"])
+    if asistente.get("puntaje_evaluacion") is not None:
+        filas[0].append('Nota')
+        filas[1].append(asistente["puntaje_evaluacion"])
+    yield from tabla(filas, variante="detalle")
+
+    t = Table(
+        [["", ""], [capacitacion.get("instructor") or "Instructor", "Responsable SST"]],
+        colWidths=[230, 230]
+    )
+    t.setStyle(estilo_tabla("firmas"))
+    yield t
+
+
+PLANTILLAS: Dict[str, Callable[[Dict], Iterator]] = {
+    "sunafil": plantilla_sunafil,
+    "resumen_ejecutivo": plantilla_resumen_ejecutivo,
+    "resultado_inspeccion": plantilla_resultado_inspeccion,
+    "reporte_incidente": plantilla_reporte_incidente,
+    "acta_entrega_epp": plantilla_acta_entrega_epp,
+    "certificado_capacitacion": plantilla_certificado_capacitacion
+}
+
+
+def renderizar_pdf(flowables: Iterable, destino: Optional[str] = None,
+                   titulo_documento: str = "Reporte SST") -> str:
+    """
+    Renderiza un flujo de flowables a un archivo PDF
+
+    Los flowables se consumen a medida que se maquetan, por lo que documentos
+    de cientos de páginas no se materializan completos en memoria.
+
+    Args:
+        flowables: Iterable (idealmente un generador) de flowables
+        destino: Ruta del archivo; si es None se crea un temporal
+
+    Returns:
+        str: Ruta del PDF generado
+    """
+    if destino is None:
+        fd, destino = tempfile.mkstemp(suffix=".pdf", prefix="sst_")
+        os.close(fd)
+
+    doc = SimpleDocTemplate(destino, pagesize=A4, title=titulo_documento,
+                            author=REPORTES_CONFIG['empresa'])
+    doc.fecha_emision = datetime.now().strftime("%d/%m/%Y %H:%M")
+    doc.build(_FlowablesPerezosos(flowables), onFirstPage=_pie_pagina, onLaterPages=_pie_pagina)
+    return destino
+
+
+def generar_reporte(plantilla: str, datos: Dict, destino: Optional[str] = None) -> str:
+    """
+    Genera un reporte PDF a partir de una plantilla registrada
+
+    Args:
+        plantilla: Clave de PLANTILLAS
+        datos: Datos que espera la plantilla
+        destino: Ruta del archivo de salida (temporal si es None)
+
+    Returns:
+        str: Ruta del PDF generado
+    """
+    if plantilla not in PLANTILLAS:
+        raise ValueError(f"Plantilla PDF desconocida: {plantilla}")
+    return renderizar_pdf(PLANTILLAS[plantilla](datos), destino,
+                          titulo_documento=plantilla.replace("_", " ").title())
@@ -0,0 +1,138 @@
+"""
+Snapshots inmutables de reportes con reutilización por contenido
+
+Cada reporte generado se guarda con una clave SHA-256 de (tipo, parámetros,
+marca de agua de las tablas origen). Si los datos no cambiaron, la misma
+solicitud obtiene la misma clave y se sirve el artefacto guardado. Los reportes
+se construyen desde el espejo local, así que la marca de agua es la del espejo:
+un espejo atrasado produce la clave de los datos que realmente contiene.
+"""
+from typing import Callable, Dict, List, Optional, Union
+from datetime import datetime
+import hashlib
+import json
+import sys
+import os
+
+import streamlit as st
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from utils.almacenamiento import get_almacenamiento, publicar_exportacion
+from utils.espejo_local import get_espejo_local
+from config.settings import STORAGE_BUCKETS
+
+
+TIPOS_CONTENIDO = {
+    "pdf": "application/pdf",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "zip": "application/zip",
+    "csv": "text/csv"
+}
+
+
+def calcular_marca_agua(tablas: List[str]) -> List[Dict]:
+    """
+    Marca de agua de las tablas origen en el espejo local (orden estable);
+    total None si la tabla aún no está en el espejo
+    """
+    espejo = get_espejo_local()
+    marcas = []
+    for tabla in sorted(set(tablas)):
+        version = espejo.version_tabla(tabla)
+        marcas.append({
+            "tabla": tabla,
+            "max_fecha_actualizacion": version[0] if version else None,
+            "total": version[1] if version else None
+        })
+    return marcas
+
+
+def calcular_clave(tipo: str, parametros: Dict, marca_agua: List[Dict]) -> str:
+    """Clave de contenido del snapshot"""
+    contenido = json.dumps(
+        {"tipo": tipo, "parametros": parametros, "marca_agua": marca_agua},
+        sort_keys=True, default=str, ensure_ascii=False
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def obtener_o_generar(tipo: str, parametros: Dict, tablas: List[str],
+                      generador: Callable[[], Union[bytes, str]], formato: str,
+                      nombre_descarga: Optional[str] = None) -> Optional[Dict]:
+    """
+    Sirve un reporte desde su snapshot o lo genera y lo guarda
+
+    Args:
+        tipo: Tipo de reporte (ej. "sunafil_pdf")
+        parametros: Parámetros que determinan el contenido
+        tablas: Tablas de las que depende el reporte
+        generador: Produce el contenido (bytes o ruta de un archivo temporal)
+        formato: Extensión del archivo (pdf, xlsx, ...)
+        nombre_descarga: Nombre con el que se descarga el archivo
+
+    Returns:
+        dict: {"url", "reutilizado", "fecha_creacion"} o None si no se pudo guardar
+    """
+    supabase = get_supabase_client()
+    almacenamiento = get_almacenamiento()
+    bucket = STORAGE_BUCKETS["reportes"]
+    nombre_descarga = nombre_descarga or f"{tipo}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{formato}"
+
+    marca_agua = calcular_marca_agua(tablas)
+    sin_marca = any(m["total"] is None for m in marca_agua)
+    clave = calcular_clave(tipo, parametros, marca_agua)
+
+    if not sin_marca:
+        snapshot = supabase.obtener_snapshot(clave)
+        if snapshot:
+            url = almacenamiento.url_descarga(snapshot["bucket"], snapshot["ruta"],
+                                              nombre_descarga=nombre_descarga)
+            if url:
+                return {"url": url, "reutilizado": True, "fecha_creacion": snapshot["fecha_creacion"]}
+
+    contenido = generador()
+    tipo_contenido = TIPOS_CONTENIDO.get(formato, "application/octet-stream")
+
+    # Sin marca de agua confiable no se registra snapshot: la clave no identificaría los datos
+    if sin_marca:
+        url = publicar_exportacion(contenido, nombre_descarga, tipo_contenido)
+        return {"url": url, "reutilizado": False, "fecha_creacion": None} if url else None
+
+    ruta = f"{tipo}/{clave[:2]}/{clave}.{formato}"
+    try:
+        subido = almacenamiento.subir(bucket, ruta, contenido, tipo_contenido)
+        tamano = os.path.getsize(contenido) if isinstance(contenido, str) else len(contenido)
+    finally:
+        if isinstance(contenido, str) and os.path.exists(contenido):
+            os.remove(contenido)
+
+    if not subido:
+        return None
+
+    usuario = st.session_state.get("usuario_datos") or {}
+    snapshot = supabase.crear_snapshot({
+        "clave": clave,
+        "tipo": tipo,
+        "parametros": json.loads(json.dumps(parametros, default=str)),
+        "marca_agua": marca_agua,
+        "formato": formato,
+        "bucket": bucket,
+        "ruta": ruta,
+        "tamano_bytes": tamano,
+        "generado_por": usuario.get("id")
+    })
+
+    url = almacenamiento.url_descarga(bucket, ruta, nombre_descarga=nombre_descarga)
+    if not url:
+        return None
+    return {"url": url, "reutilizado": False, "fecha_creacion": (snapshot or {}).get("fecha_creacion")}
+
+
+def describir_snapshot(resultado: Optional[Dict]) -> Optional[str]:
+    """Texto corto para indicar que un reporte se sirvió desde un snapshot"""
+    if not resultado or not resultado.get("reutilizado"):
+        return None
+    fecha = str(resultado.get("fecha_creacion", ""))[:16].replace("T", " ")
+    return f"♻️ Reporte servido desde snapshot del {fecha} (datos sin cambios)"
@@ -2,7 +2,7 @@
 Cliente de Supabase para el Sistema SST
 """
 from supabase import create_client, Client
-from typing import Optional, Dict, List, Any
+from typing import Optional, Dict, List, Tuple, Any
 import streamlit as st
 from datetime import datetime
 import sys
@@ -10,7 +10,8 @@ import os
 
 # Agregar el directorio padre al path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config.settings import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_KEY, STORAGE_BUCKETS
+# Los secretos se leen al crear el cliente, no al importar el módulo
+from config import settings
 
 
 class SupabaseClient:
@@ -18,11 +19,17 @@ class SupabaseClient:
     
     def __init__(self):
         """Inicializa el cliente de Supabase"""
-        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+        if not settings.SUPABASE_URL or not settings.SUPABASE_SERVICE_KEY:
             raise ValueError("Las credenciales de Supabase no están configuradas")
         
         # Usar SERVICE_KEY para bypass de RLS
-        self.client: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+        self.client: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_SERVICE_KEY)
+    
+    def _pagina(self, query, pagina: int, tamano_pagina: int) -> Dict:
+        """Ejecuta una consulta (con count="exact") limitada a una página"""
+        inicio = (pagina - 1) * tamano_pagina
+        response = query.range(inicio, inicio + tamano_pagina - 1).execute()
+        return {"datos": response.data, "total": response.count or 0}
     
     # ==================== USUARIOS ====================
     
@@ -67,6 +74,33 @@ class SupabaseClient:
             st.error(f"Error al crear riesgo: {str(e)}")
             return None
     
+    def importar_riesgos(self, registros: List[Dict], filas: List[int], tamano_lote: int = 500) -> Dict:
+        """
+        Inserta riesgos en lotes; si un lote falla, lo reintenta fila por fila
+        para identificar los registros rechazados
+    
+        Args:
+            registros: Riesgos a insertar
+            filas: Fila de origen de cada registro (para el reporte de errores)
+    
+        Returns:
+            dict: {"guardados": int, "errores": [{"fila": int, "error": str}]}
+        """
+        guardados, errores = 0, []
+        for inicio in range(0, len(registros), tamano_lote):
+            lote = registros[inicio:inicio + tamano_lote]
+            try:
+                response = self.client.table("riesgos").insert(lote).execute()
+                guardados += len(response.data or [])
+            except Exception:
+                for fila, registro in zip(filas[inicio:inicio + tamano_lote], lote):
+                    try:
+                        self.client.table("riesgos").insert(registro).execute()
+                        guardados += 1
+                    except Exception as e:
+                        errores.append({"fila": fila, "error": str(e)})
+        return {"guardados": guardados, "errores": errores}
+    
     def listar_riesgos(self, filtros: Optional[Dict] = None) -> List[Dict]:
         """Lista riesgos con filtros opcionales"""
         try:
@@ -95,6 +129,65 @@ class SupabaseClient:
             st.error(f"Error al actualizar riesgo: {str(e)}")
             return False
     
+    def obtener_matriz_riesgo_activa(self) -> Optional[Dict]:
+        """Obtiene la versión activa de la matriz de clasificación"""
+        try:
+            response = self.client.table("matrices_riesgo").select("*").eq("activa", True).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            st.error(f"Error al obtener matriz de riesgo: {str(e)}")
+            return None
+    
+    def listar_matrices_riesgo(self) -> List[Dict]:
+        """Lista las versiones de la matriz de clasificación"""
+        try:
+            response = self.client.table("matrices_riesgo").select("*").order("version", desc=True).execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al listar matrices de riesgo: {str(e)}")
+            return []
+    
+    def crear_matriz_riesgo(self, datos: Dict) -> Optional[Dict]:
+        """Registra una nueva versión de la matriz y la activa"""
+        try:
+            response = self.client.table("matrices_riesgo").insert({**datos, "activa": False}).execute()
+            if not response.data:
+                return None
+            matriz = response.data[0]
+            self.client.rpc("activar_matriz_riesgo", {"p_version": matriz["version"]}).execute()
+            return {**matriz, "activa": True}
+        except Exception as e:
+            st.error(f"Error al crear matriz de riesgo: {str(e)}")
+            return None
+    
+    def contar_riesgos_por_reclasificar(self, version: int) -> Optional[int]:
+        """Cuenta los riesgos clasificados con otra versión de la matriz"""
+        try:
+            response = self.client.table("riesgos").select("id", count="exact").or_(
+                f"matriz_version.is.null,matriz_version.neq.{int(version)}"
+            ).limit(1).execute()
+            return response.count or 0
+        except Exception as e:
+            st.error(f"Error al contar riesgos por reclasificar: {str(e)}")
+            return None
+    
+    def reclasificar_riesgos_lote(self, version: int, limite: int = 1000) -> Optional[int]:
+        """
+        Reclasifica en la base un lote de riesgos con la versión indicada
+    
+        Returns:
+            int: Riesgos actualizados (0 cuando no quedan, -1 si la versión ya no
+                 es la activa), o None si falló
+        """
+        try:
+            response = self.client.rpc(
+                "reclasificar_riesgos_lote", {"p_version": version, "p_limite": limite}
+            ).execute()
+            return response.data or 0
+        except Exception as e:
+            st.error(f"Error al reclasificar riesgos: {str(e)}")
+            return None
+    
     # ==================== INSPECCIONES ====================
     
     def crear_checklist(self, datos: Dict) -> Optional[Dict]:
@@ -144,6 +237,49 @@ class SupabaseClient:
             st.error(f"Error al listar inspecciones: {str(e)}")
             return []
     
+    def listar_hallazgos(self, inspeccion_id: str) -> List[Dict]:
+        """Lista los hallazgos de una inspección"""
+        try:
+            response = self.client.table("hallazgos").select("*").eq("inspeccion_id", inspeccion_id).order("fecha_creacion").execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al listar hallazgos: {str(e)}")
+            return []
+    
+    def sincronizar_capturas_inspeccion(self, capturas: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Aplica un lote de capturas hechas sin conexión en una sola llamada
+    
+        Returns:
+            list: [{"captura": inspeccion_id, "resultado": "sincronizada" | "conflicto" |
+                   "no_existe"}], o None si la llamada falló
+        """
+        try:
+            response = self.client.rpc("sincronizar_capturas_inspeccion", {"p_capturas": capturas}).execute()
+            return response.data or []
+        except Exception as e:
+            st.error(f"Error al sincronizar inspecciones: {str(e)}")
+            return None
+    
+    def listar_cumplimiento_inspecciones(self, filtros: Optional[Dict] = None) -> List[Dict]:
+        """Lista la tendencia mensual de cumplimiento por área y checklist"""
+        try:
+            query = self.client.table("v_cumplimiento_inspecciones").select("*")
+    
+            if filtros:
+                if "area" in filtros:
+                    query = query.eq("area", filtros["area"])
+                if "checklist_id" in filtros:
+                    query = query.eq("checklist_id", filtros["checklist_id"])
+                if "periodo_desde" in filtros:
+                    query = query.gte("periodo", filtros["periodo_desde"])
+    
+            response = query.order("periodo").execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al obtener cumplimiento de inspecciones: {str(e)}")
+            return []
+    
     # ==================== CAPACITACIONES ====================
     
     def crear_capacitacion(self, datos: Dict) -> Optional[Dict]:
@@ -172,6 +308,25 @@ class SupabaseClient:
             st.error(f"Error al listar capacitaciones: {str(e)}")
             return []
     
+    def listar_capacitaciones_paginado(self, filtros: Optional[Dict] = None,
+                                       pagina: int = 1, tamano_pagina: int = 50) -> Dict:
+        """Lista una página de capacitaciones con el total de registros"""
+        try:
+            query = self.client.table("capacitaciones").select("*", count="exact")
+            
+            if filtros:
+                if "estado" in filtros:
+                    query = query.eq("estado", filtros["estado"])
+                if "tipo" in filtros:
+                    query = query.eq("tipo", filtros["tipo"])
+                if "modalidad" in filtros:
+                    query = query.eq("modalidad", filtros["modalidad"])
+            
+            return self._pagina(query.order("fecha_programada", desc=True), pagina, tamano_pagina)
+        except Exception as e:
+            st.error(f"Error al listar capacitaciones: {str(e)}")
+            return {"datos": [], "total": 0}
+    
     def registrar_asistente(self, datos: Dict) -> bool:
         """Registra un asistente a una capacitación"""
         try:
@@ -181,6 +336,26 @@ class SupabaseClient:
             st.error(f"Error al registrar asistente: {str(e)}")
             return False
     
+    def listar_asistentes_capacitacion(self, filtros: Optional[Dict] = None) -> List[Dict]:
+        """Lista asistentes con los datos del trabajador y de la capacitación"""
+        try:
+            query = self.client.table("asistentes_capacitacion").select(
+                "*, usuario:usuario_id(nombre_completo, email, cargo, area), "
+                "capacitacion:capacitacion_id(codigo, titulo, tipo, instructor, fecha_programada, fecha_realizada, duracion_horas, estado)"
+            )
+            
+            if filtros:
+                if "capacitacion_id" in filtros:
+                    query = query.eq("capacitacion_id", filtros["capacitacion_id"])
+                if "asistio" in filtros:
+                    query = query.eq("asistio", filtros["asistio"])
+            
+            response = query.order("fecha_registro").execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al listar asistentes: {str(e)}")
+            return []
+    
     # ==================== INCIDENTES ====================
     
     def crear_incidente(self, datos: Dict) -> Optional[Dict]:
@@ -192,6 +367,15 @@ class SupabaseClient:
             st.error(f"Error al crear incidente: {str(e)}")
             return None
     
+    def actualizar_incidente(self, incidente_id: str, datos: Dict) -> bool:
+        """Actualiza un incidente"""
+        try:
+            self.client.table("incidentes").update(datos).eq("id", incidente_id).execute()
+            return True
+        except Exception as e:
+            st.error(f"Error al actualizar incidente: {str(e)}")
+            return False
+    
     def listar_incidentes(self, filtros: Optional[Dict] = None) -> List[Dict]:
         """Lista incidentes"""
         try:
@@ -211,6 +395,51 @@ class SupabaseClient:
             st.error(f"Error al listar incidentes: {str(e)}")
             return []
     
+    def listar_incidentes_paginado(self, filtros: Optional[Dict] = None,
+                                   pagina: int = 1, tamano_pagina: int = 50) -> Dict:
+        """Lista una página de incidentes con el total de registros"""
+        try:
+            query = self.client.table("incidentes").select(
+                "*, reportador:reportado_por(nombre_completo)", count="exact"
+            )
+            
+            if filtros:
+                if "tipo" in filtros:
+                    query = query.eq("tipo", filtros["tipo"])
+                if "estado" in filtros:
+                    query = query.eq("estado", filtros["estado"])
+                if "area" in filtros:
+                    query = query.eq("area", filtros["area"])
+                if "fecha_desde" in filtros:
+                    query = query.gte("fecha_hora", filtros["fecha_desde"])
+            
+            return self._pagina(query.order("fecha_hora", desc=True), pagina, tamano_pagina)
+        except Exception as e:
+            st.error(f"Error al listar incidentes: {str(e)}")
+            return {"datos": [], "total": 0}
+    
+    def listar_incidentes_actualizados(self, desde: Optional[str] = None,
+                                       tamano: int = 1000) -> Optional[List[Dict]]:
+        """
+        Lista incidentes creados o modificados desde una fecha_actualizacion (inclusive),
+        en bloques para no quedar truncada por el límite de filas de PostgREST
+    
+        Returns:
+            list: Todas las filas, o None si algún bloque falló
+        """
+        filas, cursor = [], None
+        while True:
+            bloque = self.listar_cambios(
+                "incidentes", desde, cursor=cursor, tamano=tamano,
+                columnas="*, reportador:reportado_por(nombre_completo)"
+            )
+            if bloque is None:
+                return None
+            filas.extend(bloque)
+            if len(bloque) < tamano:
+                return filas
+            cursor = (bloque[-1]["fecha_actualizacion"], bloque[-1]["id"])
+    
     def crear_accion_correctiva(self, datos: Dict) -> Optional[Dict]:
         """Crea una acción correctiva"""
         try:
@@ -252,6 +481,27 @@ class SupabaseClient:
             st.error(f"Error al asignar EPP: {str(e)}")
             return None
     
+    def listar_epp_asignaciones(self, filtros: Optional[Dict] = None) -> List[Dict]:
+        """Lista asignaciones de EPP con el equipo, el trabajador y quien entregó"""
+        try:
+            query = self.client.table("epp_asignaciones").select(
+                "*, epp:epp_id(codigo, nombre, tipo, marca, modelo), "
+                "usuario:usuario_id(nombre_completo, email, cargo, area), "
+                "entregador:entregado_por(nombre_completo)"
+            )
+            
+            if filtros:
+                if "estado" in filtros:
+                    query = query.eq("estado", filtros["estado"])
+                if "usuario_id" in filtros:
+                    query = query.eq("usuario_id", filtros["usuario_id"])
+            
+            response = query.order("fecha_asignacion", desc=True).execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al listar asignaciones de EPP: {str(e)}")
+            return []
+    
     def obtener_epp_vencimientos(self) -> List[Dict]:
         """Obtiene EPPs próximos a vencer"""
         try:
@@ -289,6 +539,272 @@ class SupabaseClient:
             st.error(f"Error al listar documentos: {str(e)}")
             return []
     
+    def listar_documentos_paginado(self, filtros: Optional[Dict] = None,
+                                   pagina: int = 1, tamano_pagina: int = 50) -> Dict:
+        """Lista una página de documentos con el total de registros"""
+        try:
+            query = self.client.table("documentos").select("*", count="exact")
+            
+            if filtros:
+                if "tipo" in filtros:
+                    query = query.eq("tipo", filtros["tipo"])
+                if "estado" in filtros:
+                    query = query.eq("estado", filtros["estado"])
+            
+            return self._pagina(query.order("fecha_creacion", desc=True), pagina, tamano_pagina)
+        except Exception as e:
+            st.error(f"Error al listar documentos: {str(e)}")
+            return {"datos": [], "total": 0}
+    
+    def actualizar_documento(self, documento_id: str, datos: Dict) -> bool:
+        """Actualiza un documento"""
+        try:
+            self.client.table("documentos").update(datos).eq("id", documento_id).execute()
+            return True
+        except Exception as e:
+            st.error(f"Error al actualizar documento: {str(e)}")
+            return False
+    
+    def fragmentos_existentes(self, hashes: List[str], tamano_lote: int = 200) -> Optional[set]:
+        """Retorna cuáles de los hashes ya están almacenados como fragmentos"""
+        try:
+            existentes = set()
+            for inicio in range(0, len(hashes), tamano_lote):
+                response = self.client.table("documento_fragmentos").select("hash").in_(
+                    "hash", hashes[inicio:inicio + tamano_lote]
+                ).execute()
+                existentes.update(f["hash"] for f in response.data)
+            return existentes
+        except Exception as e:
+            st.error(f"Error al consultar fragmentos: {str(e)}")
+            return None
+    
+    def registrar_fragmentos(self, fragmentos: List[Dict]) -> bool:
+        """Registra fragmentos subidos (los ya registrados se ignoran)"""
+        try:
+            if fragmentos:
+                self.client.table("documento_fragmentos").upsert(
+                    fragmentos, on_conflict="hash", ignore_duplicates=True
+                ).execute()
+            return True
+        except Exception as e:
+            st.error(f"Error al registrar fragmentos: {str(e)}")
+            return False
+    
+    def crear_version_documento(self, datos: Dict) -> Optional[Dict]:
+        """Registra una versión en el historial de un documento"""
+        try:
+            response = self.client.table("historial_versiones").insert(datos).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            st.error(f"Error al registrar versión: {str(e)}")
+            return None
+    
+    def actualizar_version_documento(self, version_id: str, datos: Dict) -> bool:
+        """Actualiza un registro del historial de versiones"""
+        try:
+            self.client.table("historial_versiones").update(datos).eq("id", version_id).execute()
+            return True
+        except Exception as e:
+            st.error(f"Error al actualizar versión: {str(e)}")
+            return False
+    
+    def listar_versiones_documento(self, documento_id: str) -> List[Dict]:
+        """Lista el historial de versiones de un documento (sin la lista de fragmentos)"""
+        try:
+            response = self.client.table("historial_versiones").select(
+                "id, version, nombre_archivo, tamano_bytes, cambios_realizados, fecha_modificacion, "
+                "modificador:modificado_por(nombre_completo)"
+            ).eq("documento_id", documento_id).order("fecha_modificacion", desc=True).execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al listar versiones: {str(e)}")
+            return []
+    
+    def obtener_version_documento(self, documento_id: str, version: Optional[str] = None) -> Optional[Dict]:
+        """Obtiene una versión del documento (la más reciente si version es None)"""
+        try:
+            response = self.client.rpc(
+                "obtener_version_documento", {"p_documento_id": documento_id, "p_version": version}
+            ).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            st.error(f"Error al obtener versión: {str(e)}")
+            return None
+    
+    def guardar_texto_documento(self, documento_id: str, contenido: str) -> bool:
+        """Guarda (o reemplaza) el texto extraído de un documento"""
+        try:
+            self.client.table("documentos_texto").upsert({
+                "documento_id": documento_id,
+                "contenido": contenido,
+                "fecha_indexacion": datetime.now().isoformat()
+            }, on_conflict="documento_id").execute()
+            return True
+        except Exception as e:
+            st.error(f"Error al guardar texto del documento: {str(e)}")
+            return False
+    
+    def listar_documentos_sin_indexar(self, limite: int = 50) -> List[Dict]:
+        """Lista documentos sin texto indexado o modificados después de indexarse"""
+        try:
+            response = self.client.table("v_documentos_sin_indexar").select("*").limit(limite).execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al listar documentos sin indexar: {str(e)}")
+            return []
+    
+    def buscar_documentos(self, consulta: str, limite: int = 20) -> List[Dict]:
+        """Búsqueda por contenido con ranking y fragmento resaltado"""
+        try:
+            response = self.client.rpc(
+                "buscar_documentos", {"p_consulta": consulta, "p_limite": limite}
+            ).execute()
+            return response.data or []
+        except Exception as e:
+            st.error(f"Error al buscar documentos: {str(e)}")
+            return []
+    
+    # ==================== HORAS HOMBRE ====================
+    
+    def listar_horas_hombre(self, filtros: Optional[Dict] = None) -> List[Dict]:
+        """Lista las horas-hombre registradas por área y mes"""
+        try:
+            query = self.client.table("horas_hombre").select("*")
+    
+            if filtros:
+                if "area" in filtros:
+                    query = query.eq("area", filtros["area"])
+                if "periodo_desde" in filtros:
+                    query = query.gte("periodo", filtros["periodo_desde"])
+                if "periodo_hasta" in filtros:
+                    query = query.lte("periodo", filtros["periodo_hasta"])
+    
+            response = query.order("periodo", desc=True).execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al listar horas-hombre: {str(e)}")
+            return []
+    
+    def importar_horas_hombre(self, registros: List[Dict], tamano_lote: int = 500) -> int:
+        """
+        Inserta o actualiza horas-hombre en lote (clave: área + periodo)
+    
+        Returns:
+            int: Cantidad de registros guardados
+        """
+        guardados = 0
+        try:
+            for inicio in range(0, len(registros), tamano_lote):
+                lote = registros[inicio:inicio + tamano_lote]
+                response = self.client.table("horas_hombre").upsert(
+                    lote, on_conflict="area,periodo"
+                ).execute()
+                guardados += len(response.data or [])
+            return guardados
+        except Exception as e:
+            st.error(f"Error al importar horas-hombre: {str(e)}")
+            return guardados
+    
+    def listar_indices_seguridad(self, filtros: Optional[Dict] = None) -> List[Dict]:
+        """Lista el consolidado mensual de incidentes y horas-hombre por área"""
+        try:
+            query = self.client.table("v_indices_seguridad").select("*")
+    
+            if filtros:
+                if "area" in filtros:
+                    query = query.eq("area", filtros["area"])
+                if "periodo_desde" in filtros:
+                    query = query.gte("periodo", filtros["periodo_desde"])
+                if "periodo_hasta" in filtros:
+                    query = query.lte("periodo", filtros["periodo_hasta"])
+    
+            response = query.order("periodo").execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al obtener índices de seguridad: {str(e)}")
+            return []
+    
+    # ==================== SNAPSHOTS DE REPORTES ====================
+    
+    def obtener_marca_agua(self, tabla: str) -> Dict:
+        """
+        Obtiene la marca de agua de una tabla: máxima fecha_actualizacion y
+        total de filas (el total detecta eliminaciones)
+        """
+        try:
+            response = self.client.table(tabla).select("fecha_actualizacion", count="exact").order(
+                "fecha_actualizacion", desc=True, nullsfirst=False
+            ).limit(1).execute()
+            maximo = response.data[0]["fecha_actualizacion"] if response.data else None
+            return {"tabla": tabla, "max_fecha_actualizacion": maximo, "total": response.count or 0}
+        except Exception as e:
+            st.error(f"Error al obtener marca de agua de {tabla}: {str(e)}")
+            return {"tabla": tabla, "max_fecha_actualizacion": None, "total": None}
+    
+    def obtener_snapshot(self, clave: str) -> Optional[Dict]:
+        """Obtiene un snapshot de reporte por su clave"""
+        try:
+            response = self.client.table("reportes_snapshots").select("*").eq("clave", clave).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            st.error(f"Error al obtener snapshot: {str(e)}")
+            return None
+    
+    def crear_snapshot(self, datos: Dict) -> Optional[Dict]:
+        """Registra un snapshot de reporte"""
+        try:
+            response = self.client.table("reportes_snapshots").insert(datos).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            st.error(f"Error al registrar snapshot: {str(e)}")
+            return None
+    
+    # ==================== SINCRONIZACIÓN ====================
+    
+    def listar_cambios(self, tabla: str, desde: Optional[str] = None,
+                       cursor: Optional[Tuple[str, str]] = None, tamano: int = 1000,
+                       columnas: str = "*") -> Optional[List[Dict]]:
+        """
+        Lista un bloque de filas de una tabla con fecha_actualizacion >= desde (inclusive),
+        ordenadas por fecha_actualizacion e id para paginar de forma estable
+
+        Args:
+            cursor: (fecha_actualizacion, id) de la última fila del bloque anterior; el
+                    bloque empieza después de ella (paginación por clave, sin OFFSET)
+
+        Returns:
+            list: Filas del bloque, o None si la consulta falló
+        """
+        try:
+            query = self.client.table(tabla).select(columnas)
+            
+            if cursor:
+                fecha, ultimo_id = cursor
+                query = query.or_(
+                    f'fecha_actualizacion.gt."{fecha}",'
+                    f'and(fecha_actualizacion.eq."{fecha}",id.gt.{ultimo_id})'
+                )
+            elif desde:
+                query = query.gte("fecha_actualizacion", desde)
+            
+            response = query.order("fecha_actualizacion").order("id").limit(tamano).execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al sincronizar {tabla}: {str(e)}")
+            return None
+    
+    def listar_eliminaciones(self, desde_id: int = 0, tamano: int = 1000) -> Optional[List[Dict]]:
+        """Lista los tombstones de registros_eliminados posteriores a un id"""
+        try:
+            response = self.client.table("registros_eliminados").select("*").gt(
+                "id", desde_id
+            ).order("id").limit(tamano).execute()
+            return response.data
+        except Exception as e:
+            st.error(f"Error al sincronizar eliminaciones: {str(e)}")
+            return None
+    
     # ==================== STORAGE ====================
     
     def subir_archivo(self, bucket: str, ruta: str, archivo) -> Optional[str]:
@@ -303,6 +819,14 @@ class SupabaseClient:
             st.error(f"Error al subir archivo: {str(e)}")
             return None
     
+    def descargar_archivo(self, bucket: str, ruta: str) -> Optional[bytes]:
+        """Descarga un archivo de Supabase Storage"""
+        try:
+            return self.client.storage.from_(bucket).download(ruta)
+        except Exception as e:
+            st.error(f"Error al descargar archivo: {str(e)}")
+            return None
+    
     def eliminar_archivo(self, bucket: str, ruta: str) -> bool:
         """Elimina un archivo de Supabase Storage"""
         try:
@@ -311,6 +835,42 @@ class SupabaseClient:
         except Exception as e:
             st.error(f"Error al eliminar archivo: {str(e)}")
             return False
+    
+    def buscar_contenido(self, bucket: str, hash_contenido: str) -> Optional[Dict]:
+        """Busca un archivo ya almacenado por su hash; None si el contenido es nuevo"""
+        try:
+            response = self.client.rpc(
+                "buscar_contenido", {"p_bucket": bucket, "p_hash": hash_contenido}
+            ).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            st.error(f"Error al buscar archivo por contenido: {str(e)}")
+            return None
+    
+    def registrar_contenido(self, bucket: str, hash_contenido: str, ruta: str,
+                            tamano: Optional[int], tipo_contenido: str) -> Optional[Dict]:
+        """Registra un archivo subido (sin referencias hasta que un registro guarde su URL)"""
+        try:
+            response = self.client.rpc("registrar_contenido", {
+                "p_bucket": bucket,
+                "p_hash": hash_contenido,
+                "p_ruta": ruta,
+                "p_tamano": tamano,
+                "p_tipo": tipo_contenido
+            }).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            st.error(f"Error al registrar archivo: {str(e)}")
+            return None
+    
+    def purgar_contenido_sin_referencias(self, limite: int = 500) -> List[Dict]:
+        """Quita del registro los archivos sin uso; retorna [{"bucket", "ruta"}] para borrarlos"""
+        try:
+            response = self.client.rpc("purgar_contenido_sin_referencias", {"p_limite": limite}).execute()
+            return response.data or []
+        except Exception as e:
+            st.error(f"Error al purgar archivos sin uso: {str(e)}")
+            return []
 
 
 # Instancia global del cliente (sin caché temporal para forzar SERVICE_KEY)
@@ -0,0 +1,73 @@
+"""
+URLs firmadas para archivos de buckets privados
+
+Los registros guardan la URL pública del archivo como identificador; al
+mostrarlo se cambia por una URL firmada. Las firmas se piden por lote (una
+llamada por bucket, no una por archivo) y se reutilizan entre reruns y
+sesiones hasta poco antes de que venzan.
+"""
+from typing import Dict, Iterable, Optional, Tuple
+import threading
+import time
+import sys
+import os
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.almacenamiento import get_almacenamiento
+from config.settings import BUCKETS_PRIVADOS, URL_FIRMADA_EXPIRACION
+
+
+# Una URL se vuelve a firmar cuando le quedan menos de estos segundos
+MARGEN_RENOVACION = 300
+
+# {(bucket, ruta): (url firmada, instante de vencimiento)}
+_firmadas: Dict[Tuple[str, str], Tuple[str, float]] = {}
+_bloqueo = threading.Lock()
+
+
+def _vigente(clave: Tuple[str, str], ahora: float) -> Optional[str]:
+    firmada = _firmadas.get(clave)
+    if firmada and firmada[1] - ahora > MARGEN_RENOVACION:
+        return firmada[0]
+    return None
+
+
+def firmar(urls: Iterable[Optional[str]]) -> Dict[str, str]:
+    """
+    Resuelve un conjunto de URLs almacenadas a URLs que el navegador puede abrir
+
+    Las de buckets privados se firman (todas las que falten, en una llamada por
+    bucket); las demás se retornan sin cambios.
+
+    Returns:
+        dict: {url almacenada: url para mostrar}; las que no se pudieron firmar no aparecen
+    """
+    almacenamiento = get_almacenamiento()
+    ahora = time.time()
+    resultado, pendientes = {}, {}
+
+    with _bloqueo:
+        for url in filter(None, urls):
+            ubicacion = almacenamiento.ubicacion(url)
+            if ubicacion is None or ubicacion[0] not in BUCKETS_PRIVADOS:
+                resultado[url] = url
+                continue
+            firmada = _vigente(ubicacion, ahora)
+            if firmada:
+                resultado[url] = firmada
+            else:
+                pendientes.setdefault(ubicacion[0], {})[ubicacion[1]] = url
+
+    for bucket, rutas in pendientes.items():
+        firmadas = almacenamiento.urls_descarga(bucket, list(rutas), URL_FIRMADA_EXPIRACION)
+        vence = ahora + URL_FIRMADA_EXPIRACION
+        with _bloqueo:
+            for clave in [c for c, (_, v) in _firmadas.items() if v <= ahora]:
+                del _firmadas[clave]
+            for ruta, firmada in firmadas.items():
+                _firmadas[(bucket, ruta)] = (firmada, vence)
+                resultado[rutas[ruta]] = firmada
+
+    return resultado
+
@@ -0,0 +1,241 @@
+"""
+Versionado de documentos con fragmentos deduplicados
+
+La versión vigente de un documento es su archivo completo (archivo_url), que
+es lo que se descarga e indexa. Cuando una versión se reemplaza, se archiva:
+se corta en fragmentos definidos por contenido (hash rodante "gear") y el
+archivo completo se libera. Una edición solo cambia los fragmentos que la
+contienen, así que el historial crece con lo que cambió y no con el tamaño de
+cada versión. Los fragmentos se identifican por SHA-256 y se guardan una sola
+vez; historial_versiones conserva la lista ordenada de cada versión.
+
+DOCX y XLSX son ZIP comprimidos con deflate: una palabra cambiada altera casi
+todo el archivo comprimido. Por eso se fragmenta el contenido descomprimido de
+sus partes y se vuelve a empaquetar al recuperar la versión (el ZIP resultante
+tiene el mismo contenido, aunque no los mismos bytes que el original).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Optional, Tuple
+import hashlib
+import zipfile
+import random
+import sys
+import os
+import io
+
+# Agregar el directorio padre al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils.supabase_client import get_supabase_client
+from utils.almacenamiento import get_almacenamiento, subir_varios
+from config.settings import STORAGE_BUCKETS
+
+
+# Fragmentos de 4 a 64 KB, 16 KB en promedio
+TAMANO_MINIMO = 4 * 1024
+TAMANO_MAXIMO = 64 * 1024
+# Bits altos del hash: dependen de los últimos 32 bytes. Los bajos solo de los
+# últimos 14, que en XML repetitivo casi nunca dan un corte y los fragmentos
+# terminaban cortados por posición en TAMANO_MAXIMO
+MASCARA_CORTE = ((1 << 14) - 1) << 18
+
+DESCARGAS_CONCURRENTES = 8
+
+# Formatos OOXML: se fragmentan sus partes descomprimidas
+FORMATOS_ZIP = {".docx", ".xlsx"}
+
+# Tabla fija del hash gear: cambiarla invalidaría la deduplicación con fragmentos ya guardados
+_GEAR = [random.Random(29783 + i).getrandbits(32) for i in range(256)]
+
+
+def fragmentar(datos: bytes) -> List[bytes]:
+    """Corta un contenido en fragmentos cuyos bordes dependen del contenido, no de la posición"""
+    fragmentos, inicio, total = [], 0, len(datos)
+    gear = _GEAR
+    while inicio < total:
+        fin = min(inicio + TAMANO_MAXIMO, total)
+        i, h = inicio + TAMANO_MINIMO, 0
+        while i < fin:
+            h = ((h << 1) + gear[datos[i]]) & 0xFFFFFFFF
+            i += 1
+            if h & MASCARA_CORTE == 0:
+                break
+        corte = min(i, fin)
+        fragmentos.append(datos[inicio:corte])
+        inicio = corte
+    return fragmentos
+
+
+def desempaquetar(datos: bytes, nombre: str) -> Tuple[bytes, Optional[List[Dict]]]:
+    """
+    Contenido a fragmentar: las partes descomprimidas de un DOCX/XLSX, concatenadas
+    en orden, o el archivo tal cual
+
+    Returns:
+        tuple: (contenido, partes [{"nombre", "tamano", "compresion", "fecha"}] o None)
+    """
+    if os.path.splitext(nombre)[1].lower() not in FORMATOS_ZIP:
+        return datos, None
+    try:
+        with zipfile.ZipFile(io.BytesIO(datos)) as zf:
+            partes, contenidos = [], []
+            for info in zf.infolist():
+                contenido = zf.read(info)
+                partes.append({
+                    "nombre": info.filename,
+                    "tamano": len(contenido),
+                    "compresion": info.compress_type,
+                    "fecha": list(info.date_time)
+                })
+                contenidos.append(contenido)
+    except (zipfile.BadZipFile, NotImplementedError):
+        return datos, None
+    return b"".join(contenidos), partes
+
+
+def empaquetar(contenido: bytes, partes: Optional[List[Dict]]) -> bytes:
+    """Inverso de desempaquetar: vuelve a comprimir las partes en el mismo orden"""
+    if not partes:
+        return contenido
+    salida, inicio = io.BytesIO(), 0
+    with zipfile.ZipFile(salida, "w") as zf:
+        for parte in partes:
+            info = zipfile.ZipInfo(parte["nombre"], tuple(parte["fecha"]))
+            info.compress_type = parte["compresion"]
+            zf.writestr(info, contenido[inicio:inicio + parte["tamano"]])
+            inicio += parte["tamano"]
+    return salida.getvalue()
+
+
+def ruta_fragmento(hash_fragmento: str) -> str:
+    return f"fragmentos/{hash_fragmento[:2]}/{hash_fragmento}"
+
+
+def _subir_fragmentos(contenido: bytes) -> Optional[Tuple[List[str], Dict[str, bytes]]]:
+    """Fragmenta un contenido y sube los fragmentos que aún no existen; (hashes, nuevos)"""
+    supabase = get_supabase_client()
+    bucket = STORAGE_BUCKETS["documentos"]
+
+    fragmentos = fragmentar(contenido)
+    hashes = [hashlib.sha256(f).hexdigest() for f in fragmentos]
+
+    existentes = supabase.fragmentos_existentes(list(set(hashes)))
+    if existentes is None:
+        return None
+
+    nuevos = {h: f for h, f in zip(hashes, fragmentos) if h not in existentes}
+    if nuevos:
+        urls = subir_varios([
+            {"bucket": bucket, "ruta": ruta_fragmento(h), "origen": f,
+             "tipo_contenido": "application/octet-stream"}
+            for h, f in nuevos.items()
+        ], mostrar_progreso=False)
+        if not all(urls):
+            return None
+        if not supabase.registrar_fragmentos([
+            {"hash": h, "ruta": ruta_fragmento(h), "tamano_bytes": len(f)} for h, f in nuevos.items()
+        ]):
+            return None
+    return hashes, nuevos
+
+
+def guardar_version(documento_id: str, archivo: BinaryIO, nombre: str, version: str, archivo_url: str,
+                    tipo_contenido: Optional[str] = None, cambios: Optional[str] = None,
+                    usuario_id: Optional[str] = None) -> Optional[Dict]:
+    """
+    Registra la versión vigente de un documento, que apunta a su archivo completo
+
+    Returns:
+        dict: Versión registrada o None si falló
+    """
+    archivo.seek(0)
+    datos = archivo.read()
+    return get_supabase_client().crear_version_documento({
+        "documento_id": documento_id,
+        "version": version,
+        "archivo_url": archivo_url,
+        "nombre_archivo": nombre,
+        "tipo_contenido": tipo_contenido,
+        "hash_contenido": hashlib.sha256(datos).hexdigest(),
+        "tamano_bytes": len(datos),
+        "cambios_realizados": cambios,
+        "modificado_por": usuario_id
+    })
+
+
+def archivar_version(doc: Dict) -> Optional[Dict]:
+    """
+    Pasa la versión vigente de un documento a fragmentos antes de reemplazarla;
+    después de esto su archivo completo se puede liberar
+
+    Returns:
+        dict: {"fragmentos_nuevos", "bytes_nuevos"}; None si falló (la versión queda intacta)
+    """
+    supabase = get_supabase_client()
+    almacenamiento = get_almacenamiento()
+
+    registro = supabase.obtener_version_documento(doc["id"], doc["version"])
+    if registro and registro.get("fragmentos"):
+        return {"fragmentos_nuevos": 0, "bytes_nuevos": 0}
+
+    ubicacion = almacenamiento.ubicacion(doc.get("archivo_url") or "")
+    datos = almacenamiento.descargar(*ubicacion) if ubicacion else None
+    if not datos:
+        return None
+
+    nombre = (registro or {}).get("nombre_archivo") or os.path.basename(ubicacion[1])
+    contenido, partes = desempaquetar(datos, nombre)
+    subidos = _subir_fragmentos(contenido)
+    if subidos is None:
+        return None
+    hashes, nuevos = subidos
+
+    archivado = {
+        "archivo_url": None,
+        "nombre_archivo": nombre,
+        "hash_contenido": hashlib.sha256(datos).hexdigest(),
+        "tamano_bytes": len(datos),
+        "fragmentos": hashes,
+        "partes": partes
+    }
+    if registro:
+        guardado = supabase.actualizar_version_documento(registro["id"], archivado)
+    else:
+        # Documentos registrados antes del historial: su versión vigente no tenía registro
+        guardado = supabase.crear_version_documento(
+            {"documento_id": doc["id"], "version": doc["version"], **archivado}
+        ) is not None
+    if not guardado:
+        return None
+    return {"fragmentos_nuevos": len(nuevos), "bytes_nuevos": sum(len(f) for f in nuevos.values())}
+
+
+def reconstruir_version(documento_id: str, version: Optional[str] = None) -> Optional[Tuple[Dict, bytes]]:
+    """
+    Recupera el contenido de una versión (la más reciente si version es None)
+
+    Returns:
+        tuple: (registro de la versión, contenido) o None si no existe o está incompleta
+    """
+    registro = get_supabase_client().obtener_version_documento(documento_id, version)
+    if not registro:
+        return None
+
+    almacenamiento = get_almacenamiento()
+    if not registro.get("fragmentos"):
+        # Versión vigente: archivo completo
+        ubicacion = almacenamiento.ubicacion(registro.get("archivo_url") or "")
+        datos = almacenamiento.descargar(*ubicacion) if ubicacion else None
+        return (registro, datos) if datos else None
+
+    bucket = STORAGE_BUCKETS["documentos"]
+    unicos = list(dict.fromkeys(h.strip() for h in registro["fragmentos"]))
+    with ThreadPoolExecutor(max_workers=DESCARGAS_CONCURRENTES) as ejecutor:
+        contenidos = dict(zip(unicos, ejecutor.map(
+            lambda h: almacenamiento.descargar(bucket, ruta_fragmento(h)), unicos
+        )))
+    # Cada fragmento se verifica contra su hash (el ZIP reempaquetado no conserva el hash del original)
+    if not all(c and hashlib.sha256(c).hexdigest() == h for h, c in contenidos.items()):
+        return None
+
+    datos = empaquetar(b"".join(contenidos[h.strip()] for h in registro["fragmentos"]), registro.get("partes"))
+    return registro, datos
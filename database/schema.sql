@@ -36,6 +36,33 @@ CREATE TABLE IF NOT EXISTS usuarios (
     auth_user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE
 );
 
+-- =====================================================
+-- TABLA: matrices_riesgo (umbrales versionados de clasificación)
+-- =====================================================
+-- Única fuente de los umbrales: la usan el trigger de riesgos, el lote de
+-- reclasificación y la aplicación (que los lee desde aquí)
+CREATE TABLE IF NOT EXISTS matrices_riesgo (
+    version SERIAL PRIMARY KEY,
+    limite_bajo INTEGER NOT NULL,
+    limite_medio INTEGER NOT NULL,
+    limite_alto INTEGER NOT NULL,
+    activa BOOLEAN DEFAULT false,
+    descripcion TEXT,
+    creado_por UUID REFERENCES usuarios(id),
+    fecha_creacion TIMESTAMP DEFAULT NOW(),
+    fecha_actualizacion TIMESTAMP DEFAULT NOW(),
+    CHECK (1 <= limite_bajo AND limite_bajo < limite_medio AND limite_medio < limite_alto AND limite_alto < 25)
+);
+
+-- Solo una matriz activa
+CREATE UNIQUE INDEX IF NOT EXISTS idx_matrices_riesgo_activa ON matrices_riesgo(activa) WHERE activa;
+
+INSERT INTO matrices_riesgo (version, limite_bajo, limite_medio, limite_alto, activa, descripcion)
+VALUES (1, 4, 12, 16, true, 'Matriz 5x5 inicial')
+ON CONFLICT (version) DO NOTHING;
+
+SELECT setval(pg_get_serial_sequence('matrices_riesgo', 'version'), (SELECT MAX(version) FROM matrices_riesgo));
+
 -- =====================================================
 -- TABLA: riesgos (Art. 26-28)
 -- =====================================================
@@ -52,14 +79,9 @@ CREATE TABLE IF NOT EXISTS riesgos (
     probabilidad INTEGER NOT NULL CHECK (probabilidad BETWEEN 1 AND 5),
     severidad INTEGER NOT NULL CHECK (severidad BETWEEN 1 AND 5),
     nivel_riesgo INTEGER GENERATED ALWAYS AS (probabilidad * severidad) STORED,
-    clasificacion VARCHAR(20) GENERATED ALWAYS AS (
-        CASE 
-            WHEN (probabilidad * severidad) <= 4 THEN 'Bajo'
-            WHEN (probabilidad * severidad) <= 12 THEN 'Medio'
-            WHEN (probabilidad * severidad) <= 16 THEN 'Alto'
-            ELSE 'Crítico'
-        END
-    ) STORED,
+    -- Asignadas por trigger_clasificar_riesgo según la matriz activa
+    clasificacion VARCHAR(20),
+    matriz_version INTEGER REFERENCES matrices_riesgo(version),
     medidas_control TEXT,
     responsable_id UUID REFERENCES usuarios(id),
     estado VARCHAR(50) DEFAULT 'identificado' CHECK (estado IN ('identificado', 'en_control', 'controlado', 'cerrado')),
@@ -70,6 +92,11 @@ CREATE TABLE IF NOT EXISTS riesgos (
     fecha_actualizacion TIMESTAMP DEFAULT NOW()
 );
 
+-- Bases creadas con la clasificación generada: pasa a columna normal
+-- conservando los valores (sin reescribir la tabla)
+ALTER TABLE riesgos ALTER COLUMN clasificacion DROP EXPRESSION IF EXISTS;
+ALTER TABLE riesgos ADD COLUMN IF NOT EXISTS matriz_version INTEGER REFERENCES matrices_riesgo(version);
+
 -- =====================================================
 -- TABLA: checklists
 -- =====================================================
@@ -107,10 +134,14 @@ CREATE TABLE IF NOT EXISTS inspecciones (
         CASE WHEN puntaje_total > 0 THEN (puntaje_obtenido / puntaje_total) * 100 ELSE 0 END
     ) STORED,
     creado_por UUID REFERENCES usuarios(id),
+    ultima_captura VARCHAR(64),
     fecha_creacion TIMESTAMP DEFAULT NOW(),
     fecha_actualizacion TIMESTAMP DEFAULT NOW()
 );
 
+-- Bases creadas antes de los reintentos idempotentes de la captura en campo
+ALTER TABLE inspecciones ADD COLUMN IF NOT EXISTS ultima_captura VARCHAR(64);
+
 -- =====================================================
 -- TABLA: hallazgos
 -- =====================================================
@@ -131,6 +162,26 @@ CREATE TABLE IF NOT EXISTS hallazgos (
     fecha_actualizacion TIMESTAMP DEFAULT NOW()
 );
 
+-- =====================================================
+-- TABLA: respuestas_inspeccion (respuesta a cada ítem del checklist)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS respuestas_inspeccion (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    inspeccion_id UUID REFERENCES inspecciones(id) ON DELETE CASCADE,
+    indice_item INTEGER NOT NULL,
+    pregunta TEXT NOT NULL,
+    respuesta VARCHAR(10) NOT NULL CHECK (respuesta IN ('si', 'no', 'na')),
+    es_critico BOOLEAN DEFAULT false,
+    peso DECIMAL(5,2) DEFAULT 1,
+    observacion TEXT,
+    fecha_creacion TIMESTAMP DEFAULT NOW(),
+    fecha_actualizacion TIMESTAMP DEFAULT NOW(),
+    UNIQUE (inspeccion_id, indice_item)
+);
+
+-- Bases creadas antes del puntaje ponderado por ítem
+ALTER TABLE respuestas_inspeccion ADD COLUMN IF NOT EXISTS peso DECIMAL(5,2) DEFAULT 1;
+
 -- =====================================================
 -- TABLA: capacitaciones (Art. 27, 35)
 -- =====================================================
@@ -172,9 +223,13 @@ CREATE TABLE IF NOT EXISTS asistentes_capacitacion (
     puntaje_evaluacion DECIMAL(5,2),
     certificado_url TEXT,
     observaciones TEXT,
-    fecha_registro TIMESTAMP DEFAULT NOW()
+    fecha_registro TIMESTAMP DEFAULT NOW(),
+    fecha_actualizacion TIMESTAMP DEFAULT NOW()
 );
 
+-- Bases creadas antes de la sincronización incremental
+ALTER TABLE asistentes_capacitacion ADD COLUMN IF NOT EXISTS fecha_actualizacion TIMESTAMP DEFAULT NOW();
+
 -- =====================================================
 -- TABLA: incidentes (Art. 82-88)
 -- =====================================================
@@ -201,6 +256,9 @@ CREATE TABLE IF NOT EXISTS incidentes (
     investigador_id UUID REFERENCES usuarios(id),
     fecha_investigacion DATE,
     evidencias_url TEXT[],
+    evidencias_miniaturas TEXT[],
+    estado_evidencias VARCHAR(20) CHECK (estado_evidencias IN ('procesando', 'completas', 'incompletas')),
+    evidencias_fallidas TEXT[],
     estado VARCHAR(50) DEFAULT 'reportado' CHECK (estado IN ('reportado', 'en_investigacion', 'investigado', 'cerrado')),
     notificado_sunafil BOOLEAN DEFAULT false,
     fecha_notificacion_sunafil DATE,
@@ -209,6 +267,14 @@ CREATE TABLE IF NOT EXISTS incidentes (
     fecha_actualizacion TIMESTAMP DEFAULT NOW()
 );
 
+-- Bases creadas antes de las miniaturas de evidencias
+ALTER TABLE incidentes ADD COLUMN IF NOT EXISTS evidencias_miniaturas TEXT[];
+
+-- Bases creadas antes del procesamiento de fotos en segundo plano
+ALTER TABLE incidentes ADD COLUMN IF NOT EXISTS estado_evidencias VARCHAR(20)
+    CHECK (estado_evidencias IN ('procesando', 'completas', 'incompletas'));
+ALTER TABLE incidentes ADD COLUMN IF NOT EXISTS evidencias_fallidas TEXT[];
+
 -- =====================================================
 -- TABLA: acciones_correctivas
 -- =====================================================
@@ -308,16 +374,121 @@ CREATE TABLE IF NOT EXISTS documentos (
 -- =====================================================
 -- TABLA: historial_versiones
 -- =====================================================
+-- La versión vigente apunta a su archivo completo (archivo_url). Al reemplazarse
+-- se guarda como la lista ordenada de sus fragmentos (ver documento_fragmentos);
+-- las versiones consecutivas comparten los que no cambiaron. En DOCX/XLSX los
+-- fragmentos son del contenido descomprimido y "partes" describe el ZIP
 CREATE TABLE IF NOT EXISTS historial_versiones (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     documento_id UUID REFERENCES documentos(id) ON DELETE CASCADE,
     version VARCHAR(20) NOT NULL,
-    archivo_url TEXT NOT NULL,
+    archivo_url TEXT,
+    nombre_archivo VARCHAR(255),
+    tipo_contenido VARCHAR(255),
+    hash_contenido CHAR(64),
+    tamano_bytes BIGINT,
+    fragmentos CHAR(64)[],
+    partes JSONB,
     cambios_realizados TEXT,
     modificado_por UUID REFERENCES usuarios(id),
     fecha_modificacion TIMESTAMP DEFAULT NOW()
 );
 
+-- Bases creadas antes del versionado por fragmentos
+ALTER TABLE historial_versiones ALTER COLUMN archivo_url DROP NOT NULL;
+ALTER TABLE historial_versiones ADD COLUMN IF NOT EXISTS nombre_archivo VARCHAR(255);
+ALTER TABLE historial_versiones ADD COLUMN IF NOT EXISTS tipo_contenido VARCHAR(255);
+ALTER TABLE historial_versiones ADD COLUMN IF NOT EXISTS hash_contenido CHAR(64);
+ALTER TABLE historial_versiones ADD COLUMN IF NOT EXISTS tamano_bytes BIGINT;
+ALTER TABLE historial_versiones ADD COLUMN IF NOT EXISTS fragmentos CHAR(64)[];
+ALTER TABLE historial_versiones ADD COLUMN IF NOT EXISTS partes JSONB;
+
+-- =====================================================
+-- TABLA: documento_fragmentos (fragmentos deduplicados de las versiones)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS documento_fragmentos (
+    hash CHAR(64) PRIMARY KEY,
+    ruta TEXT NOT NULL,
+    tamano_bytes INTEGER NOT NULL,
+    fecha_creacion TIMESTAMP DEFAULT NOW()
+);
+
+-- =====================================================
+-- TABLA: documentos_texto (texto extraído para la búsqueda por contenido)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS documentos_texto (
+    documento_id UUID PRIMARY KEY REFERENCES documentos(id) ON DELETE CASCADE,
+    contenido TEXT NOT NULL DEFAULT '',
+    busqueda TSVECTOR GENERATED ALWAYS AS (setweight(to_tsvector('spanish', contenido), 'C')) STORED,
+    fecha_indexacion TIMESTAMP DEFAULT NOW()
+);
+
+-- =====================================================
+-- TABLA: horas_hombre (Estadísticas de seguridad)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS horas_hombre (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    area VARCHAR(150) NOT NULL,
+    periodo DATE NOT NULL CHECK (EXTRACT(DAY FROM periodo) = 1),
+    horas_trabajadas DECIMAL(14,2) NOT NULL CHECK (horas_trabajadas >= 0),
+    numero_trabajadores INTEGER CHECK (numero_trabajadores >= 0),
+    observaciones TEXT,
+    registrado_por UUID REFERENCES usuarios(id),
+    fecha_creacion TIMESTAMP DEFAULT NOW(),
+    fecha_actualizacion TIMESTAMP DEFAULT NOW(),
+    UNIQUE (area, periodo)
+);
+
+-- =====================================================
+-- TABLA: reportes_snapshots (reportes generados inmutables)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS reportes_snapshots (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    clave CHAR(64) UNIQUE NOT NULL,
+    tipo VARCHAR(100) NOT NULL,
+    parametros JSONB NOT NULL DEFAULT '{}'::jsonb,
+    marca_agua JSONB NOT NULL,
+    formato VARCHAR(10) NOT NULL,
+    bucket VARCHAR(100) NOT NULL,
+    ruta TEXT NOT NULL,
+    tamano_bytes BIGINT,
+    generado_por UUID REFERENCES usuarios(id),
+    fecha_creacion TIMESTAMP DEFAULT NOW()
+);
+
+-- =====================================================
+-- TABLA: registros_eliminados (tombstones para la sincronización incremental)
+-- =====================================================
+CREATE TABLE IF NOT EXISTS registros_eliminados (
+    id BIGSERIAL PRIMARY KEY,
+    tabla VARCHAR(100) NOT NULL,
+    registro_id UUID NOT NULL,
+    fecha_eliminacion TIMESTAMP DEFAULT NOW()
+);
+
+-- =====================================================
+-- TABLA: archivos_contenido (archivos direccionados por contenido)
+-- =====================================================
+-- Un archivo se guarda una sola vez por bucket bajo su hash SHA-256; referencias
+-- cuenta los registros que lo usan y la mantienen los triggers de esas tablas
+-- (ajustar_referencias_contenido). Un archivo sin referencias desde hace más de
+-- un día (fecha_uso) lo elimina purgar_contenido_sin_referencias
+CREATE TABLE IF NOT EXISTS archivos_contenido (
+    bucket VARCHAR(100) NOT NULL,
+    hash CHAR(64) NOT NULL,
+    ruta TEXT NOT NULL,
+    tamano_bytes BIGINT,
+    tipo_contenido VARCHAR(255),
+    referencias INTEGER NOT NULL DEFAULT 0 CHECK (referencias >= 0),
+    fecha_creacion TIMESTAMP DEFAULT NOW(),
+    fecha_uso TIMESTAMP DEFAULT NOW(),
+    PRIMARY KEY (bucket, hash)
+);
+
+-- Bases creadas antes de las referencias por trigger
+ALTER TABLE archivos_contenido ALTER COLUMN referencias SET DEFAULT 0;
+ALTER TABLE archivos_contenido ADD COLUMN IF NOT EXISTS fecha_uso TIMESTAMP DEFAULT NOW();
+
 -- =====================================================
 -- VISTAS ÚTILES
 -- =====================================================
@@ -379,6 +550,74 @@ WHERE c.estado = 'programada'
 GROUP BY c.id, c.codigo, c.titulo, c.tipo, c.fecha_programada, c.duracion_horas, c.instructor, c.estado
 ORDER BY c.fecha_programada;
 
+-- Índices de seguridad (IF, IS, IA) por área y mes, cruzando incidentes
+-- con las horas-hombre registradas
+CREATE OR REPLACE VIEW v_indices_seguridad AS
+WITH incidentes_mes AS (
+    SELECT
+        area,
+        date_trunc('month', fecha_hora)::date AS periodo,
+        COUNT(*) AS total_incidentes,
+        COUNT(*) FILTER (WHERE tipo = 'Accidente Incapacitante') AS accidentes_incapacitantes,
+        COALESCE(SUM(dias_descanso_medico), 0) AS dias_perdidos
+    FROM incidentes
+    GROUP BY area, date_trunc('month', fecha_hora)::date
+)
+SELECT
+    COALESCE(hh.area, im.area) AS area,
+    COALESCE(hh.periodo, im.periodo) AS periodo,
+    hh.horas_trabajadas,
+    hh.numero_trabajadores,
+    COALESCE(im.total_incidentes, 0) AS total_incidentes,
+    COALESCE(im.accidentes_incapacitantes, 0) AS accidentes_incapacitantes,
+    COALESCE(im.dias_perdidos, 0) AS dias_perdidos,
+    CASE WHEN hh.horas_trabajadas > 0
+        THEN COALESCE(im.accidentes_incapacitantes, 0) * 1000000.0 / hh.horas_trabajadas
+    END AS indice_frecuencia,
+    CASE WHEN hh.horas_trabajadas > 0
+        THEN COALESCE(im.dias_perdidos, 0) * 1000000.0 / hh.horas_trabajadas
+    END AS indice_severidad
+FROM horas_hombre hh
+FULL OUTER JOIN incidentes_mes im
+    ON hh.area = im.area AND hh.periodo = im.periodo;
+
+-- Documentos sin texto indexado o modificados después de indexarse
+CREATE OR REPLACE VIEW v_documentos_sin_indexar AS
+SELECT d.id, d.codigo, d.archivo_url, d.fecha_actualizacion
+FROM documentos d
+LEFT JOIN documentos_texto t ON t.documento_id = d.id
+WHERE t.documento_id IS NULL OR t.fecha_indexacion < d.fecha_actualizacion;
+
+-- Tendencia de cumplimiento de inspecciones completadas por área, checklist y mes.
+-- El cumplimiento ponderado suma puntajes (una inspección con más ítems aplicables
+-- pesa más); el promedio trata a todas por igual
+CREATE OR REPLACE VIEW v_cumplimiento_inspecciones AS
+WITH criticos AS (
+    SELECT inspeccion_id, COUNT(*) AS criticos_no_conformes
+    FROM respuestas_inspeccion
+    WHERE respuesta = 'no' AND es_critico
+    GROUP BY inspeccion_id
+)
+SELECT
+    i.area,
+    i.checklist_id,
+    c.nombre AS checklist,
+    date_trunc('month', i.fecha_realizada)::date AS periodo,
+    COUNT(*) AS inspecciones,
+    SUM(i.puntaje_total) AS puntaje_total,
+    SUM(i.puntaje_obtenido) AS puntaje_obtenido,
+    ROUND(AVG(i.porcentaje_cumplimiento), 2) AS cumplimiento_promedio,
+    ROUND(SUM(i.puntaje_obtenido) * 100 / NULLIF(SUM(i.puntaje_total), 0), 2) AS cumplimiento_ponderado,
+    MIN(i.porcentaje_cumplimiento) AS cumplimiento_minimo,
+    COALESCE(SUM(cr.criticos_no_conformes), 0) AS criticos_no_conformes
+FROM inspecciones i
+JOIN checklists c ON c.id = i.checklist_id
+LEFT JOIN criticos cr ON cr.inspeccion_id = i.id
+WHERE i.estado = 'completada'
+  AND i.fecha_realizada IS NOT NULL
+  AND i.puntaje_total IS NOT NULL
+GROUP BY i.area, i.checklist_id, c.nombre, date_trunc('month', i.fecha_realizada)::date;
+
 -- =====================================================
 -- TRIGGERS
 -- =====================================================
@@ -415,6 +654,423 @@ CREATE TRIGGER trigger_actualizar_epp_catalogo
     BEFORE UPDATE ON epp_catalogo
     FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
 
+CREATE TRIGGER trigger_actualizar_horas_hombre
+    BEFORE UPDATE ON horas_hombre
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_checklists
+    BEFORE UPDATE ON checklists
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_inspecciones
+    BEFORE UPDATE ON inspecciones
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_hallazgos
+    BEFORE UPDATE ON hallazgos
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_asistentes_capacitacion
+    BEFORE UPDATE ON asistentes_capacitacion
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_acciones_correctivas
+    BEFORE UPDATE ON acciones_correctivas
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_epp_asignaciones
+    BEFORE UPDATE ON epp_asignaciones
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_matrices_riesgo
+    BEFORE UPDATE ON matrices_riesgo
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+CREATE TRIGGER trigger_actualizar_respuestas_inspeccion
+    BEFORE UPDATE ON respuestas_inspeccion
+    FOR EACH ROW EXECUTE FUNCTION actualizar_fecha_actualizacion();
+
+-- Clasificación de un nivel según una versión de la matriz
+CREATE OR REPLACE FUNCTION clasificar_nivel_riesgo(p_nivel INTEGER, p_version INTEGER)
+RETURNS VARCHAR AS $$
+    SELECT CASE
+        WHEN p_nivel <= m.limite_bajo THEN 'Bajo'
+        WHEN p_nivel <= m.limite_medio THEN 'Medio'
+        WHEN p_nivel <= m.limite_alto THEN 'Alto'
+        ELSE 'Crítico'
+    END
+    FROM matrices_riesgo m
+    WHERE m.version = p_version;
+$$ LANGUAGE sql STABLE;
+
+-- Riesgos nuevos o reevaluados: clasificación con la matriz activa
+CREATE OR REPLACE FUNCTION asignar_clasificacion_riesgo()
+RETURNS TRIGGER AS $$
+BEGIN
+    SELECT version INTO NEW.matriz_version FROM matrices_riesgo WHERE activa;
+    NEW.clasificacion = clasificar_nivel_riesgo(NEW.probabilidad * NEW.severidad, NEW.matriz_version);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_clasificar_riesgo ON riesgos;
+CREATE TRIGGER trigger_clasificar_riesgo
+    BEFORE INSERT OR UPDATE OF probabilidad, severidad ON riesgos
+    FOR EACH ROW EXECUTE FUNCTION asignar_clasificacion_riesgo();
+
+-- Activa una versión de la matriz (desactiva la anterior en la misma transacción)
+CREATE OR REPLACE FUNCTION activar_matriz_riesgo(p_version INTEGER)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE matrices_riesgo SET activa = false WHERE activa AND version <> p_version;
+    UPDATE matrices_riesgo SET activa = true WHERE version = p_version;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Reclasificación por lotes (RPC): actualiza a lo sumo p_limite riesgos con otra
+-- versión de matriz; SKIP LOCKED omite filas en edición en vez de esperarlas
+CREATE OR REPLACE FUNCTION reclasificar_riesgos_lote(p_version INTEGER, p_limite INTEGER DEFAULT 1000)
+RETURNS INTEGER AS $$
+DECLARE
+    v_actualizados INTEGER;
+BEGIN
+    -- Solo con la matriz activa (-1 si otra la reemplazó); el bloqueo compartido
+    -- hace que una activación espere a que termine el lote en curso
+    PERFORM 1 FROM matrices_riesgo WHERE version = p_version AND activa FOR SHARE;
+    IF NOT FOUND THEN
+        RETURN -1;
+    END IF;
+
+    WITH lote AS (
+        SELECT id FROM riesgos
+        WHERE matriz_version IS DISTINCT FROM p_version
+        LIMIT p_limite
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE riesgos r
+    SET clasificacion = clasificar_nivel_riesgo(r.probabilidad * r.severidad, p_version),
+        matriz_version = p_version
+    FROM lote
+    WHERE r.id = lote.id;
+
+    GET DIAGNOSTICS v_actualizados = ROW_COUNT;
+    RETURN v_actualizados;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Tombstones: el espejo local replica las eliminaciones leyendo registros_eliminados
+CREATE OR REPLACE FUNCTION registrar_eliminacion()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO registros_eliminados (tabla, registro_id) VALUES (TG_TABLE_NAME, OLD.id);
+    RETURN OLD;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'usuarios', 'riesgos', 'checklists', 'inspecciones', 'hallazgos',
+        'capacitaciones', 'asistentes_capacitacion', 'incidentes', 'acciones_correctivas',
+        'epp_catalogo', 'epp_asignaciones', 'documentos', 'horas_hombre'
+    ] LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS trigger_eliminacion_%1$s ON %1$I', t);
+        EXECUTE format(
+            'CREATE TRIGGER trigger_eliminacion_%1$s AFTER DELETE ON %1$I '
+            'FOR EACH ROW EXECUTE FUNCTION registrar_eliminacion()', t
+        );
+    END LOOP;
+END $$;
+
+-- Busca un archivo ya almacenado y marca su uso: la referencia la suma el
+-- trigger del registro que lo guarde; fecha_uso lo protege de la purga mientras tanto
+CREATE OR REPLACE FUNCTION buscar_contenido(p_bucket VARCHAR, p_hash CHAR(64))
+RETURNS SETOF archivos_contenido AS $$
+BEGIN
+    RETURN QUERY
+    UPDATE archivos_contenido SET fecha_uso = NOW()
+    WHERE bucket = p_bucket AND hash = p_hash
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Registra un archivo recién subido (sin referencias hasta que un registro lo use);
+-- dos subidas simultáneas del mismo contenido escriben la misma ruta
+CREATE OR REPLACE FUNCTION registrar_contenido(p_bucket VARCHAR, p_hash CHAR(64), p_ruta TEXT,
+                                               p_tamano BIGINT, p_tipo VARCHAR)
+RETURNS SETOF archivos_contenido AS $$
+BEGIN
+    RETURN QUERY
+    INSERT INTO archivos_contenido (bucket, hash, ruta, tamano_bytes, tipo_contenido)
+    VALUES (p_bucket, p_hash, p_ruta, p_tamano, p_tipo)
+    ON CONFLICT (bucket, hash) DO UPDATE SET fecha_uso = NOW()
+    RETURNING *;
+END;
+$$ LANGUAGE plpgsql;
+
+-- (bucket, hash) de las URLs de contenido (…/<bucket>/contenido/<hh>/<hash>.<ext>)
+-- guardadas en las columnas indicadas de una fila; admite TEXT y TEXT[]
+CREATE OR REPLACE FUNCTION urls_contenido(p_fila JSONB, p_columnas TEXT[])
+RETURNS TABLE (bucket VARCHAR, hash CHAR(64)) AS $$
+    SELECT m[1]::varchar, m[2]::char(64)
+    FROM unnest(p_columnas) AS c(columna)
+    CROSS JOIN LATERAL jsonb_array_elements_text(
+        CASE jsonb_typeof(p_fila->c.columna)
+            WHEN 'array' THEN p_fila->c.columna
+            WHEN 'string' THEN jsonb_build_array(p_fila->c.columna)
+            ELSE '[]'::jsonb
+        END
+    ) AS u(url)
+    CROSS JOIN LATERAL regexp_match(u.url, '([^/]+)/contenido/[0-9a-f]{2}/([0-9a-f]{64})') AS m
+    WHERE m IS NOT NULL;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- Ajusta referencias según las URLs de contenido que una fila agrega o quita
+-- (TG_ARGV: columnas con URLs). Solo cuenta registros que existen: si el INSERT
+-- falla, la referencia no se toma
+CREATE OR REPLACE FUNCTION ajustar_referencias_contenido()
+RETURNS TRIGGER AS $$
+DECLARE
+    v_nueva JSONB := CASE WHEN TG_OP <> 'DELETE' THEN to_jsonb(NEW) END;
+    v_anterior JSONB := CASE WHEN TG_OP <> 'INSERT' THEN to_jsonb(OLD) END;
+BEGIN
+    UPDATE archivos_contenido a SET
+        referencias = GREATEST(a.referencias + d.neto, 0),
+        fecha_uso = NOW()
+    FROM (
+        SELECT u.bucket, u.hash, SUM(u.signo) AS neto
+        FROM (
+            SELECT n.bucket, n.hash, 1 AS signo FROM urls_contenido(v_nueva, TG_ARGV) n
+            UNION ALL
+            SELECT o.bucket, o.hash, -1 FROM urls_contenido(v_anterior, TG_ARGV) o
+        ) u
+        GROUP BY u.bucket, u.hash
+        HAVING SUM(u.signo) <> 0
+    ) d
+    WHERE a.bucket = d.bucket AND a.hash = d.hash;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Elimina los archivos sin referencias desde hace más de un día y retorna sus
+-- rutas para que el cliente borre los objetos
+CREATE OR REPLACE FUNCTION purgar_contenido_sin_referencias(p_limite INTEGER DEFAULT 500)
+RETURNS TABLE (bucket VARCHAR, ruta TEXT) AS $$
+    DELETE FROM archivos_contenido a
+    WHERE (a.bucket, a.hash) IN (
+        SELECT c.bucket, c.hash FROM archivos_contenido c
+        WHERE c.referencias = 0 AND c.fecha_uso < NOW() - INTERVAL '1 day'
+        LIMIT p_limite
+    )
+    RETURNING a.bucket, a.ruta;
+$$ LANGUAGE sql;
+
+-- Versión de un documento (RPC): la indicada o, sin p_version, la más reciente;
+-- una sola búsqueda por índice (documento_id, version) o (documento_id, fecha)
+CREATE OR REPLACE FUNCTION obtener_version_documento(p_documento_id UUID, p_version VARCHAR DEFAULT NULL)
+RETURNS SETOF historial_versiones AS $$
+    SELECT * FROM historial_versiones
+    WHERE documento_id = p_documento_id
+      AND (p_version IS NULL OR version = p_version)
+    ORDER BY fecha_modificacion DESC
+    LIMIT 1;
+$$ LANGUAGE sql STABLE;
+
+-- Búsqueda de documentos por contenido (RPC): título y descripción pesan más que el
+-- texto; los candidatos salen de los índices GIN y el fragmento resaltado
+-- (ts_headline, costoso) se calcula solo para los p_limite mejores
+CREATE OR REPLACE FUNCTION buscar_documentos(p_consulta TEXT, p_limite INTEGER DEFAULT 20)
+RETURNS TABLE (
+    id UUID, codigo VARCHAR, titulo VARCHAR, tipo VARCHAR, version VARCHAR, estado VARCHAR,
+    archivo_url TEXT, rango REAL, fragmento TEXT
+) AS $$
+    WITH q AS (
+        SELECT websearch_to_tsquery('spanish', p_consulta) AS consulta
+    ),
+    candidatos AS (
+        SELECT d.id FROM documentos d, q
+        WHERE to_tsvector('spanish', d.titulo || ' ' || COALESCE(d.descripcion, '')) @@ q.consulta
+        UNION
+        SELECT t.documento_id FROM documentos_texto t, q
+        WHERE t.busqueda @@ q.consulta
+    ),
+    mejores AS (
+        SELECT d.id, d.codigo, d.titulo, d.tipo, d.version, d.estado, d.archivo_url, d.descripcion,
+               t.contenido,
+               ts_rank(
+                   setweight(to_tsvector('spanish', d.titulo), 'A')
+                   || setweight(to_tsvector('spanish', COALESCE(d.descripcion, '')), 'B')
+                   || COALESCE(t.busqueda, ''::tsvector),
+                   q.consulta
+               ) AS rango
+        FROM candidatos c
+        JOIN documentos d ON d.id = c.id
+        LEFT JOIN documentos_texto t ON t.documento_id = d.id
+        CROSS JOIN q
+        ORDER BY rango DESC
+        LIMIT p_limite
+    )
+    SELECT m.id, m.codigo, m.titulo, m.tipo, m.version, m.estado, m.archivo_url, m.rango,
+           ts_headline(
+               'spanish', COALESCE(NULLIF(m.contenido, ''), m.descripcion, ''), q.consulta,
+               'StartSel=**, StopSel=**, MaxFragments=2, MaxWords=30, MinWords=10, FragmentDelimiter=" … "'
+           )
+    FROM mejores m CROSS JOIN q
+    ORDER BY m.rango DESC;
+$$ LANGUAGE sql STABLE;
+
+-- Sincronización de capturas de inspección hechas sin conexión (RPC): un lote
+-- completo en una sola llamada. Cada captura se aplica solo si la inspección no
+-- cambió desde que se capturó (fecha_actualizacion = fecha_base) o si se fuerza;
+-- las respuestas se reemplazan por ítem y los hallazgos traen su id, así que
+-- reintentar un lote no duplica nada
+CREATE OR REPLACE FUNCTION sincronizar_capturas_inspeccion(p_capturas JSONB)
+RETURNS TABLE (captura UUID, resultado TEXT) AS $$
+DECLARE
+    c JSONB;
+    v_id UUID;
+BEGIN
+    FOR c IN SELECT value FROM jsonb_array_elements(p_capturas) LOOP
+        v_id := (c->>'inspeccion_id')::uuid;
+        captura := v_id;
+
+        -- Reintento de una captura ya aplicada (se perdió la respuesta): no es un conflicto
+        IF EXISTS (SELECT 1 FROM inspecciones WHERE id = v_id AND ultima_captura = c->>'captura') THEN
+            resultado := 'sincronizada';
+            RETURN NEXT;
+            CONTINUE;
+        END IF;
+
+        UPDATE inspecciones i SET
+            ultima_captura = c->>'captura',
+            estado = COALESCE(c->'inspeccion'->>'estado', i.estado),
+            fecha_realizada = COALESCE((c->'inspeccion'->>'fecha_realizada')::date, i.fecha_realizada),
+            observaciones = COALESCE(c->'inspeccion'->>'observaciones', i.observaciones),
+            puntaje_total = COALESCE((c->'inspeccion'->>'puntaje_total')::numeric, i.puntaje_total),
+            puntaje_obtenido = COALESCE((c->'inspeccion'->>'puntaje_obtenido')::numeric, i.puntaje_obtenido)
+        WHERE i.id = v_id
+          AND (COALESCE((c->>'forzar')::boolean, false)
+               OR i.fecha_actualizacion = (c->>'fecha_base')::timestamp);
+
+        IF NOT FOUND THEN
+            resultado := CASE WHEN EXISTS (SELECT 1 FROM inspecciones WHERE id = v_id)
+                              THEN 'conflicto' ELSE 'no_existe' END;
+            RETURN NEXT;
+            CONTINUE;
+        END IF;
+
+        INSERT INTO respuestas_inspeccion (inspeccion_id, indice_item, pregunta, respuesta, es_critico, peso, observacion)
+        SELECT v_id, r.indice_item, r.pregunta, r.respuesta, COALESCE(r.es_critico, false),
+               COALESCE(r.peso, 1), r.observacion
+        FROM jsonb_to_recordset(COALESCE(c->'respuestas', '[]'::jsonb))
+            AS r(indice_item INTEGER, pregunta TEXT, respuesta VARCHAR, es_critico BOOLEAN,
+                 peso NUMERIC, observacion TEXT)
+        ON CONFLICT (inspeccion_id, indice_item) DO UPDATE SET
+            pregunta = EXCLUDED.pregunta,
+            respuesta = EXCLUDED.respuesta,
+            es_critico = EXCLUDED.es_critico,
+            peso = EXCLUDED.peso,
+            observacion = EXCLUDED.observacion;
+
+        INSERT INTO hallazgos (id, inspeccion_id, descripcion, tipo, severidad, ubicacion,
+                               evidencia_url, accion_correctiva, responsable_id, fecha_limite)
+        SELECT h.id, v_id, h.descripcion, h.tipo, h.severidad, h.ubicacion,
+               h.evidencia_url, h.accion_correctiva, h.responsable_id, h.fecha_limite
+        FROM jsonb_to_recordset(COALESCE(c->'hallazgos', '[]'::jsonb))
+            AS h(id UUID, descripcion TEXT, tipo VARCHAR, severidad VARCHAR, ubicacion VARCHAR,
+                 evidencia_url TEXT, accion_correctiva TEXT, responsable_id UUID, fecha_limite DATE)
+        ON CONFLICT (id) DO UPDATE SET
+            descripcion = EXCLUDED.descripcion,
+            tipo = EXCLUDED.tipo,
+            severidad = EXCLUDED.severidad,
+            ubicacion = EXCLUDED.ubicacion,
+            evidencia_url = COALESCE(EXCLUDED.evidencia_url, hallazgos.evidencia_url),
+            accion_correctiva = EXCLUDED.accion_correctiva,
+            responsable_id = EXCLUDED.responsable_id,
+            fecha_limite = EXCLUDED.fecha_limite
+        WHERE hallazgos.inspeccion_id = v_id;
+
+        -- Hallazgos generados por ítems que ya no son no conformes
+        DELETE FROM hallazgos
+        WHERE inspeccion_id = v_id
+          AND id IN (
+              SELECT value::uuid
+              FROM jsonb_array_elements_text(COALESCE(c->'hallazgos_retirados', '[]'::jsonb))
+          );
+
+        resultado := 'sincronizada';
+        RETURN NEXT;
+    END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Los snapshots de reportes no se modifican: un cambio de datos genera otra clave
+CREATE OR REPLACE FUNCTION impedir_modificacion_snapshot()
+RETURNS TRIGGER AS $$
+BEGIN
+    RAISE EXCEPTION 'Los snapshots de reportes son inmutables';
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trigger_snapshot_inmutable ON reportes_snapshots;
+CREATE TRIGGER trigger_snapshot_inmutable
+    BEFORE UPDATE ON reportes_snapshots
+    FOR EACH ROW EXECUTE FUNCTION impedir_modificacion_snapshot();
+
+-- Referencias a archivos_contenido de los registros que guardan URLs de archivos
+DROP TRIGGER IF EXISTS trigger_referencias_incidentes ON incidentes;
+CREATE TRIGGER trigger_referencias_incidentes
+    AFTER INSERT OR DELETE OR UPDATE OF evidencias_url, evidencias_miniaturas ON incidentes
+    FOR EACH ROW EXECUTE FUNCTION ajustar_referencias_contenido('evidencias_url', 'evidencias_miniaturas');
+
+DROP TRIGGER IF EXISTS trigger_referencias_acciones_correctivas ON acciones_correctivas;
+CREATE TRIGGER trigger_referencias_acciones_correctivas
+    AFTER INSERT OR DELETE OR UPDATE OF evidencia_implementacion_url ON acciones_correctivas
+    FOR EACH ROW EXECUTE FUNCTION ajustar_referencias_contenido('evidencia_implementacion_url');
+
+DROP TRIGGER IF EXISTS trigger_referencias_capacitaciones ON capacitaciones;
+CREATE TRIGGER trigger_referencias_capacitaciones
+    AFTER INSERT OR DELETE OR UPDATE OF material_url, evidencia_url ON capacitaciones
+    FOR EACH ROW EXECUTE FUNCTION ajustar_referencias_contenido('material_url', 'evidencia_url');
+
+DROP TRIGGER IF EXISTS trigger_referencias_hallazgos ON hallazgos;
+CREATE TRIGGER trigger_referencias_hallazgos
+    AFTER INSERT OR DELETE OR UPDATE OF evidencia_url ON hallazgos
+    FOR EACH ROW EXECUTE FUNCTION ajustar_referencias_contenido('evidencia_url');
+
+DROP TRIGGER IF EXISTS trigger_referencias_documentos ON documentos;
+CREATE TRIGGER trigger_referencias_documentos
+    AFTER INSERT OR DELETE OR UPDATE OF archivo_url ON documentos
+    FOR EACH ROW EXECUTE FUNCTION ajustar_referencias_contenido('archivo_url');
+
+DROP TRIGGER IF EXISTS trigger_referencias_historial_versiones ON historial_versiones;
+CREATE TRIGGER trigger_referencias_historial_versiones
+    AFTER INSERT OR DELETE OR UPDATE OF archivo_url ON historial_versiones
+    FOR EACH ROW EXECUTE FUNCTION ajustar_referencias_contenido('archivo_url');
+
+-- Bases creadas antes de las referencias por trigger: recuento desde los registros
+WITH usos AS (
+    SELECT u.bucket, u.hash FROM incidentes t,
+        urls_contenido(to_jsonb(t), ARRAY['evidencias_url', 'evidencias_miniaturas']) u
+    UNION ALL
+    SELECT u.bucket, u.hash FROM acciones_correctivas t,
+        urls_contenido(to_jsonb(t), ARRAY['evidencia_implementacion_url']) u
+    UNION ALL
+    SELECT u.bucket, u.hash FROM capacitaciones t,
+        urls_contenido(to_jsonb(t), ARRAY['material_url', 'evidencia_url']) u
+    UNION ALL
+    SELECT u.bucket, u.hash FROM hallazgos t, urls_contenido(to_jsonb(t), ARRAY['evidencia_url']) u
+    UNION ALL
+    SELECT u.bucket, u.hash FROM documentos t, urls_contenido(to_jsonb(t), ARRAY['archivo_url']) u
+    UNION ALL
+    SELECT u.bucket, u.hash FROM historial_versiones t, urls_contenido(to_jsonb(t), ARRAY['archivo_url']) u
+)
+UPDATE archivos_contenido a SET referencias = (
+    SELECT COUNT(*) FROM usos WHERE usos.bucket = a.bucket AND usos.hash = a.hash
+);
+
 -- =====================================================
 -- CONFIGURACIÓN PARA DESARROLLO
 -- =====================================================
@@ -435,6 +1091,14 @@ ALTER TABLE historial_versiones DISABLE ROW LEVEL SECURITY;
 ALTER TABLE checklists DISABLE ROW LEVEL SECURITY;
 ALTER TABLE inspecciones DISABLE ROW LEVEL SECURITY;
 ALTER TABLE hallazgos DISABLE ROW LEVEL SECURITY;
+ALTER TABLE horas_hombre DISABLE ROW LEVEL SECURITY;
+ALTER TABLE reportes_snapshots DISABLE ROW LEVEL SECURITY;
+ALTER TABLE registros_eliminados DISABLE ROW LEVEL SECURITY;
+ALTER TABLE matrices_riesgo DISABLE ROW LEVEL SECURITY;
+ALTER TABLE archivos_contenido DISABLE ROW LEVEL SECURITY;
+ALTER TABLE documento_fragmentos DISABLE ROW LEVEL SECURITY;
+ALTER TABLE documentos_texto DISABLE ROW LEVEL SECURITY;
+ALTER TABLE respuestas_inspeccion DISABLE ROW LEVEL SECURITY;
 
 -- Configurar buckets de storage como públicos (SOLO DESARROLLO)
 -- Ejecutar desde el panel de Supabase o usar SQL:
@@ -442,6 +1106,11 @@ UPDATE storage.buckets
 SET public = true 
 WHERE name IN ('documentos', 'incidentes', 'capacitaciones', 'inspecciones');
 
+-- Evidencias de incidentes (lesiones): privadas, la aplicación las sirve con URLs firmadas
+UPDATE storage.buckets
+SET public = false
+WHERE name IN ('incidentes-sst', 'evidencias-sst');
+
 -- Políticas para storage (permitir todas las operaciones)
 CREATE POLICY IF NOT EXISTS "Allow all inserts" 
 ON storage.objects 
@@ -480,6 +1149,8 @@ CREATE INDEX IF NOT EXISTS idx_incidentes_tipo ON incidentes(tipo);
 CREATE INDEX IF NOT EXISTS idx_incidentes_area ON incidentes(area);
 CREATE INDEX IF NOT EXISTS idx_incidentes_fecha ON incidentes(fecha_hora);
 CREATE INDEX IF NOT EXISTS idx_incidentes_estado ON incidentes(estado);
+-- Sondeo incremental del dashboard (fecha_actualizacion > última vista)
+CREATE INDEX IF NOT EXISTS idx_incidentes_actualizacion ON incidentes(fecha_actualizacion);
 
 CREATE INDEX IF NOT EXISTS idx_capacitaciones_fecha ON capacitaciones(fecha_programada);
 CREATE INDEX IF NOT EXISTS idx_capacitaciones_estado ON capacitaciones(estado);
@@ -489,6 +1160,29 @@ CREATE INDEX IF NOT EXISTS idx_epp_asignaciones_estado ON epp_asignaciones(estad
 
 CREATE INDEX IF NOT EXISTS idx_documentos_tipo ON documentos(tipo);
 CREATE INDEX IF NOT EXISTS idx_documentos_estado ON documentos(estado);
+-- Búsqueda de texto completo (la expresión debe coincidir con la de buscar_documentos)
+CREATE INDEX IF NOT EXISTS idx_documentos_busqueda ON documentos
+    USING GIN (to_tsvector('spanish', titulo || ' ' || COALESCE(descripcion, '')));
+CREATE INDEX IF NOT EXISTS idx_documentos_texto_busqueda ON documentos_texto USING GIN (busqueda);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_historial_versiones_version ON historial_versiones(documento_id, version);
+CREATE INDEX IF NOT EXISTS idx_historial_versiones_fecha ON historial_versiones(documento_id, fecha_modificacion DESC);
+
+CREATE INDEX IF NOT EXISTS idx_horas_hombre_periodo ON horas_hombre(periodo);
+
+CREATE INDEX IF NOT EXISTS idx_reportes_snapshots_tipo ON reportes_snapshots(tipo, fecha_creacion);
+
+-- Sincronización incremental del espejo local
+CREATE INDEX IF NOT EXISTS idx_riesgos_actualizacion ON riesgos(fecha_actualizacion);
+CREATE INDEX IF NOT EXISTS idx_riesgos_matriz_version ON riesgos(matriz_version);
+CREATE INDEX IF NOT EXISTS idx_inspecciones_actualizacion ON inspecciones(fecha_actualizacion);
+CREATE INDEX IF NOT EXISTS idx_capacitaciones_actualizacion ON capacitaciones(fecha_actualizacion);
+CREATE INDEX IF NOT EXISTS idx_asistentes_actualizacion ON asistentes_capacitacion(fecha_actualizacion);
+CREATE INDEX IF NOT EXISTS idx_epp_asignaciones_actualizacion ON epp_asignaciones(fecha_actualizacion);
+CREATE INDEX IF NOT EXISTS idx_registros_eliminados_fecha ON registros_eliminados(fecha_eliminacion);
+
+-- Tendencia de cumplimiento (v_cumplimiento_inspecciones)
+CREATE INDEX IF NOT EXISTS idx_inspecciones_cumplimiento ON inspecciones(area, checklist_id, fecha_realizada)
+    WHERE estado = 'completada';
 
 -- =====================================================
 -- FIN DEL SCHEMA